@@ -3,7 +3,8 @@ Configuration management using pydantic-settings.
 Loads environment variables from .env file.
 """
 
-from functools import lru_cache
+from functools import cached_property
+from typing import Optional
 from pydantic_settings import BaseSettings, SettingsConfigDict
 
 
@@ -27,11 +28,15 @@ class Settings(BaseSettings):
     # ChromaDB Configuration
     chroma_db_path: str = "./chroma_db"
     dream_knowledge_zip: str = "dream_knowledge_db.zip"
+    chroma_prefetch_max_bytes: int = 256 * 1024 * 1024  # Page-cache warm-up budget at startup (0 = off)
     
     # Server Configuration
     host: str = "0.0.0.0"
     port: int = 8000
     debug: bool = True
+    log_level: str = "INFO"  # DEBUG also emits per-request success messages
+    log_external_rotation: bool = False  # app.log rotated by logrotate instead of in-process
+    log_file_format: str = "text"  # "binary": compact app.log.bin records (scripts/decode_binary_log.py)
     
     # CORS Configuration (comma-separated origins)
     allowed_origins: str = "http://localhost:3000,http://127.0.0.1:3000"
@@ -45,12 +50,35 @@ class Settings(BaseSettings):
     
     # Cache Configuration (seconds)
     cache_ttl: int = 3600  # 1 hour
-    cache_max_size: int = 100
+    cache_max_bytes: int = 8 * 1024 * 1024  # Total serialized size of cached analyses
+    # Deprecated: entry count replaced by cache_max_bytes. Still declared (and
+    # ignored) so existing .env files with CACHE_MAX_SIZE don't fail validation
+    cache_max_size: Optional[int] = None
+    
+    # Semantic cache for the Analysis Triangle (reuse results for near-identical dreams).
+    # Process-wide and shared by all users, so off by default; never used by /triangle-tiered
+    semantic_cache_enabled: bool = False
+    semantic_cache_threshold: float = 0.92  # Minimum cosine similarity for a hit
+    semantic_cache_size: int = 512
+    semantic_cache_ttl: int = 24 * 3600
+    
+    # Analysis Triangle generation: one concurrent LLM call per lens + a synthesis
+    # call (lower latency, slightly more tokens) instead of one combined call
+    triangle_parallel_lenses: bool = True
     
     # Supabase Configuration (for Auth & Database)
     supabase_url: str = ""
     supabase_key: str = ""  # anon/public key for client-side auth
     supabase_jwt_secret: str = ""  # JWT secret for local token verification
+    token_cache_size: int = 4096  # Verified tokens remembered in-process
+    token_cache_ttl: int = 300  # Upper bound; entries also expire with the JWT's exp
+    profile_cache_size: int = 10_000  # Cached user profiles (tier, daily_usage)
+    profile_cache_ttl: int = 60
+    
+    # Supabase HTTP connection pool (reused keep-alive TLS connections)
+    supabase_max_connections: int = 60
+    supabase_max_keepalive: int = 40
+    supabase_keepalive_expiry: float = 60.0
     
     # API Security (Static API Key for Client Verification)
     api_secret_key: str = ""  # Required for all requests - blocks unauthorized clients
@@ -62,15 +90,40 @@ class Settings(BaseSettings):
     app_name: str = "Dream Interpretation API"
     app_version: str = "1.0.0"
     
-    def get_allowed_origins_list(self) -> list[str]:
-        """Parse comma-separated origins into a list."""
+    @cached_property
+    def allowed_origins_list(self) -> list[str]:
+        """Parse comma-separated origins into a list (computed once)."""
         return [origin.strip() for origin in self.allowed_origins.split(",") if origin.strip()]
+    
+    @cached_property
+    def allowed_origins_set(self) -> frozenset[bytes]:
+        """Allowed origins pre-encoded for O(1) lookup against raw ASGI headers."""
+        return frozenset(origin.encode() for origin in self.allowed_origins_list)
+    
+    @cached_property
+    def api_secret_key_bytes(self) -> bytes:
+        """API secret key pre-encoded for constant-time comparison."""
+        return self.api_secret_key.encode()
+    
+    @cached_property
+    def cron_secret_bytes(self) -> bytes:
+        """Cron secret pre-encoded for constant-time comparison."""
+        return self.cron_secret.encode()
+
+
+# Module-level singleton: settings are loaded exactly once at import
+SETTINGS = Settings()
 
 
-@lru_cache()
 def get_settings() -> Settings:
     """
-    Get cached application settings.
-    Uses lru_cache to ensure settings are only loaded once.
+    Get the application settings singleton.
+    Returns the module-level instance directly (no lru_cache wrapper on the hot path).
     """
-    return Settings()
+    return SETTINGS
+
+
+# Hot-path settings bound once at import (plain globals avoid attribute lookups per request)
+API_KEY_B = SETTINGS.api_secret_key_bytes
+CRON_SECRET_B = SETTINGS.cron_secret_bytes
+RATE_LIMIT_SPEC = f"{SETTINGS.rate_limit_requests}/{SETTINGS.rate_limit_window}"
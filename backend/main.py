@@ -5,21 +5,30 @@ Production-hardened with rate limiting, CORS, and error handling.
 
 from contextlib import asynccontextmanager
 
-from fastapi import FastAPI, Request
-from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
-from slowapi import Limiter, _rate_limit_exceeded_handler
-from slowapi.util import get_remote_address
-from slowapi.errors import RateLimitExceeded
-
-from config import get_settings
+from fastapi import FastAPI
+from fastapi.responses import ORJSONResponse
+
+from config import API_KEY_B, RATE_LIMIT_SPEC, get_settings
+from middleware.api_key import APIKeyASGIMiddleware
+from middleware.cors import CORSASGIMiddleware
+from middleware.error_shield import ErrorShieldMiddleware
+from middleware.rate_limit import RateLimitASGIMiddleware, parse_rate_limit
 from routers import dreams, admin
+from services.analyze_service import analyze_dream_service
+from services.db_service import get_supabase_client, close_supabase_client
 from utils.db_loader import initialize_database
 
 settings = get_settings()
 
-# Initialize rate limiter
-limiter = Limiter(key_func=get_remote_address)
+# Endpoints that call the LLM and are rate limited per client IP
+RATE_LIMITED_PATHS = (
+    "/api/dreams/analyze",
+    "/api/dreams/triangle",
+    "/api/dreams/triangle-tiered",
+)
+
+# Parsed once at import so a malformed RATE_LIMIT_* setting fails at startup
+RATE_LIMIT = parse_rate_limit(RATE_LIMIT_SPEC)
 
 
 @asynccontextmanager
@@ -27,8 +36,11 @@ async def lifespan(app: FastAPI):
     """Application lifespan handler for startup/shutdown."""
     # Startup
     initialize_database()
+    await get_supabase_client()  # Eager init so the first request doesn't pay it
     yield
-    # Shutdown (cleanup if needed)
+    # Shutdown
+    await analyze_dream_service.close()
+    await close_supabase_client()
 
 
 app = FastAPI(
@@ -36,41 +48,36 @@ app = FastAPI(
     version=settings.app_version,
     description="AI-powered dream interpretation using LangChain and ChromaDB",
     lifespan=lifespan,
+    default_response_class=ORJSONResponse,
 )
 
-# Attach limiter to app state
-app.state.limiter = limiter
+# Graceful 503 for unhandled exceptions (pure ASGI)
+app.add_middleware(ErrorShieldMiddleware)
 
-# Register rate limit exceeded handler
-app.add_exception_handler(RateLimitExceeded, _rate_limit_exceeded_handler)
+# Per-IP token-bucket rate limiting (pure ASGI)
+app.add_middleware(
+    RateLimitASGIMiddleware,
+    limit=RATE_LIMIT,
+    paths=RATE_LIMITED_PATHS,
+)
 
-# CORS Configuration (from environment variable)
+# X-API-Key verification for all /api/dreams routes
 app.add_middleware(
-    CORSMiddleware,
-    allow_origins=settings.get_allowed_origins_list(),
+    APIKeyASGIMiddleware,
+    api_key=API_KEY_B,
+    protected_prefix="/api/dreams",
+)
+
+# CORS Configuration (from environment variable, outermost so 403/503 carry CORS headers)
+app.add_middleware(
+    CORSASGIMiddleware,
+    allow_origins=settings.allowed_origins_set,
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
 )
 
 
-# Global exception handler for graceful 503 responses
-@app.exception_handler(Exception)
-async def global_exception_handler(request: Request, exc: Exception):
-    """Catch unhandled exceptions and return graceful 503."""
-    # Log the error (in production, use proper logging)
-    print(f"⚠️ Unhandled exception: {type(exc).__name__}: {exc}")
-    
-    # Return graceful error response
-    return JSONResponse(
-        status_code=503,
-        content={
-            "detail": "The Oracle is meditating (Service busy). Please try again.",
-            "error_type": type(exc).__name__,
-        }
-    )
-
-
 # Include routers
 app.include_router(dreams.router, prefix="/api/dreams", tags=["Dreams"])
 app.include_router(admin.router, prefix="/api", tags=["Admin"])
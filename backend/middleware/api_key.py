@@ -0,0 +1,68 @@
+"""
+API Key Middleware (pure ASGI)
+Verifies the static X-API-Key header for protected path prefixes directly
+on the ASGI scope, replacing the per-route `Depends(verify_api_key)`.
+"""
+
+import hmac
+
+from utils.logger import log_warning
+
+_MISSING_KEY_BODY = b'{"detail":"API key required. Please provide X-API-Key header."}'
+_INVALID_KEY_BODY = b'{"detail":"Invalid API key."}'
+
+
+class APIKeyASGIMiddleware:
+    """
+    Blocks requests under `protected_prefix` that do not carry the
+    expected X-API-Key header, answering with a canned 403 JSON body.
+
+    If no API key is configured, verification is skipped (development mode).
+    """
+
+    def __init__(self, app, api_key: bytes, protected_prefix: str = "/api/dreams") -> None:
+        self.app = app
+        self._expected = api_key
+        self._prefix = protected_prefix
+
+        if not self._expected:
+            log_warning("API_SECRET_KEY not configured - skipping API key verification")
+
+    async def __call__(self, scope, receive, send) -> None:
+        if (
+            scope["type"] != "http"
+            or not self._expected
+            or not scope["path"].startswith(self._prefix)
+        ):
+            await self.app(scope, receive, send)
+            return
+
+        provided = None
+        for key, value in scope["headers"]:
+            if key == b"x-api-key":
+                provided = value
+                break
+
+        if not provided:
+            log_warning("Request blocked: Missing X-API-Key header")
+            await self._forbidden(send, _MISSING_KEY_BODY)
+            return
+
+        if not hmac.compare_digest(provided, self._expected):
+            log_warning("Request blocked: Invalid API key provided")
+            await self._forbidden(send, _INVALID_KEY_BODY)
+            return
+
+        await self.app(scope, receive, send)
+
+    @staticmethod
+    async def _forbidden(send, body: bytes) -> None:
+        await send({
+            "type": "http.response.start",
+            "status": 403,
+            "headers": [
+                (b"content-type", b"application/json"),
+                (b"content-length", str(len(body)).encode()),
+            ],
+        })
+        await send({"type": "http.response.body", "body": body})
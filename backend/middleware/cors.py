@@ -0,0 +1,151 @@
+"""
+CORS Middleware (pure ASGI)
+Drop-in replacement for Starlette's CORSMiddleware that works directly on
+the ASGI scope, so no Request/Response objects are allocated per request.
+All header values are joined and encoded once at startup.
+"""
+
+from typing import Iterable
+
+ALL_METHODS = ("DELETE", "GET", "HEAD", "OPTIONS", "PATCH", "POST", "PUT")
+PREFLIGHT_MAX_AGE = b"600"
+
+
+class CORSASGIMiddleware:
+    """
+    Adds CORS headers to HTTP responses and answers preflight requests.
+
+    Semantics follow Starlette's CORSMiddleware:
+    - Preflight (OPTIONS + Access-Control-Request-Method) is short-circuited
+      with a canned 200 response, or 400 if the origin/method is not allowed.
+    - Simple requests from an allowed origin get Access-Control-Allow-Origin
+      appended to their `http.response.start` message.
+    """
+
+    def __init__(
+        self,
+        app,
+        allow_origins: Iterable[str | bytes] = (),
+        allow_methods: Iterable[str] = ("GET",),
+        allow_headers: Iterable[str] = (),
+        allow_credentials: bool = False,
+    ) -> None:
+        self.app = app
+
+        # Origins may arrive pre-encoded (see Settings.allowed_origins_set)
+        self._allow_origins = frozenset(
+            o if isinstance(o, bytes) else o.encode() for o in allow_origins
+        )
+        allow_methods = list(allow_methods)
+        allow_headers = list(allow_headers)
+
+        self._allow_all_origins = b"*" in self._allow_origins
+        self._allow_all_headers = "*" in allow_headers
+
+        if "*" in allow_methods:
+            allow_methods = list(ALL_METHODS)
+        self._allow_methods = frozenset(m.encode() for m in allow_methods)
+        self._allow_headers = frozenset(h.lower().encode() for h in allow_headers)
+
+        # Pre-encoded header values reused on every request
+        self._allow_methods_b = ", ".join(allow_methods).encode()
+        self._allow_headers_b = ", ".join(sorted(allow_headers)).encode()
+
+        # Echo the request origin when credentials are allowed or origins are explicit
+        self._echo_origin = allow_credentials or not self._allow_all_origins
+
+        self._simple_headers: list[tuple[bytes, bytes]] = []
+        if allow_credentials:
+            self._simple_headers.append((b"access-control-allow-credentials", b"true"))
+
+        self._preflight_headers: list[tuple[bytes, bytes]] = [
+            (b"access-control-allow-methods", self._allow_methods_b),
+            (b"access-control-max-age", PREFLIGHT_MAX_AGE),
+        ]
+        if allow_headers and not self._allow_all_headers:
+            self._preflight_headers.append((b"access-control-allow-headers", self._allow_headers_b))
+        if allow_credentials:
+            self._preflight_headers.append((b"access-control-allow-credentials", b"true"))
+
+    def _is_allowed_origin(self, origin: bytes) -> bool:
+        return self._allow_all_origins or origin in self._allow_origins
+
+    def _origin_headers(self, origin: bytes) -> list[tuple[bytes, bytes]]:
+        if self._echo_origin:
+            return [(b"access-control-allow-origin", origin), (b"vary", b"Origin")]
+        return [(b"access-control-allow-origin", b"*")]
+
+    async def __call__(self, scope, receive, send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        origin = None
+        request_method = None
+        request_headers = None
+        for key, value in scope["headers"]:
+            if key == b"origin":
+                origin = value
+            elif key == b"access-control-request-method":
+                request_method = value
+            elif key == b"access-control-request-headers":
+                request_headers = value
+
+        if origin is None:
+            await self.app(scope, receive, send)
+            return
+
+        if scope["method"] == "OPTIONS" and request_method is not None:
+            await self._preflight_response(origin, request_method, request_headers, send)
+            return
+
+        if not self._is_allowed_origin(origin):
+            await self.app(scope, receive, send)
+            return
+
+        extra_headers = self._origin_headers(origin) + self._simple_headers
+
+        async def send_with_cors(message) -> None:
+            if message["type"] == "http.response.start":
+                # Copy rather than mutate: the header list may belong to a shared Response
+                message = {**message, "headers": [*message.get("headers", ()), *extra_headers]}
+            await send(message)
+
+        await self.app(scope, receive, send_with_cors)
+
+    async def _preflight_response(
+        self,
+        origin: bytes,
+        request_method: bytes,
+        request_headers: bytes | None,
+        send,
+    ) -> None:
+        failures = []
+        headers = list(self._preflight_headers)
+        if self._is_allowed_origin(origin):
+            headers[:0] = self._origin_headers(origin)
+        else:
+            failures.append("origin")
+        if request_method not in self._allow_methods:
+            failures.append("method")
+
+        if request_headers:
+            if self._allow_all_headers:
+                headers.append((b"access-control-allow-headers", request_headers))
+            else:
+                requested = {h.strip().lower() for h in request_headers.split(b",")}
+                if not requested <= self._allow_headers:
+                    failures.append("headers")
+
+        if failures:
+            status = 400
+            body = f"Disallowed CORS {', '.join(failures)}".encode()
+        else:
+            status = 200
+            body = b"OK"
+
+        headers.append((b"content-type", b"text/plain; charset=utf-8"))
+        headers.append((b"content-length", str(len(body)).encode()))
+
+        await send({"type": "http.response.start", "status": status, "headers": headers})
+        await send({"type": "http.response.body", "body": body})
@@ -0,0 +1,56 @@
+"""
+Error Shield Middleware (pure ASGI)
+Catches unhandled exceptions and returns a graceful 503 instead of a raw 500.
+Replaces the global `@app.exception_handler(Exception)` handler.
+"""
+
+from utils.logger import log_error
+
+ORACLE_BUSY_DETAIL = "The Oracle is meditating (Service busy). Please try again."
+
+# Pre-encoded body pieces; only the exception class name varies per error
+_BODY_PREFIX = b'{"detail":"' + ORACLE_BUSY_DETAIL.encode() + b'","error_type":"'
+_BODY_SUFFIX = b'"}'
+
+
+class ErrorShieldMiddleware:
+    """
+    Wraps the downstream app in a try/except and emits a canned JSON 503
+    when an exception escapes. If the response has already started
+    streaming, the exception is re-raised since the status can't change.
+    """
+
+    def __init__(self, app) -> None:
+        self.app = app
+
+    async def __call__(self, scope, receive, send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        response_started = False
+
+        async def send_tracking(message) -> None:
+            nonlocal response_started
+            if message["type"] == "http.response.start":
+                response_started = True
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_tracking)
+        except Exception as exc:
+            log_error("Unhandled exception: %s: %s", type(exc).__name__, exc, exc_info=True)
+            if response_started:
+                raise
+
+            # Exception class names are identifiers, so they are JSON-safe as-is
+            body = _BODY_PREFIX + type(exc).__name__.encode() + _BODY_SUFFIX
+            await send({
+                "type": "http.response.start",
+                "status": 503,
+                "headers": [
+                    (b"content-type", b"application/json"),
+                    (b"content-length", str(len(body)).encode()),
+                ],
+            })
+            await send({"type": "http.response.body", "body": body})
@@ -0,0 +1,114 @@
+"""
+Rate Limit Middleware (pure ASGI)
+In-memory token-bucket limiter keyed by client IP, replacing slowapi.
+The limit string is parsed once at import (see parse_rate_limit); per
+request the cost is a dict lookup and a little float arithmetic.
+"""
+
+import math
+import time
+from typing import Iterable, NamedTuple
+
+_WINDOW_UNITS = {
+    "second": 1,
+    "minute": 60,
+    "hour": 3600,
+    "day": 86400,
+}
+
+# Upper bound on tracked (path, ip) buckets to keep memory flat under IP churn
+MAX_BUCKETS = 10_000
+
+
+def _parse_window(window: str) -> float:
+    """Parse a window such as '1 minute', '30 seconds' or 'hour' into seconds."""
+    parts = window.strip().lower().split()
+    if len(parts) == 1:
+        amount, unit = 1, parts[0]
+    elif len(parts) == 2:
+        amount, unit = int(parts[0]), parts[1]
+    else:
+        raise ValueError(f"Invalid rate limit window: {window!r}")
+
+    unit = unit.rstrip("s")
+    if unit not in _WINDOW_UNITS:
+        raise ValueError(f"Invalid rate limit unit: {window!r}")
+    return float(amount * _WINDOW_UNITS[unit])
+
+
+class RateLimit(NamedTuple):
+    """A parsed rate limit, e.g. '5/1 minute' -> RateLimit(5, '1 minute', 60.0)."""
+    requests: int
+    window_text: str
+    window_seconds: float
+
+
+def parse_rate_limit(limit: str) -> RateLimit:
+    """Parse a limit such as '5/1 minute'. Raises ValueError on a malformed spec."""
+    requests, _, window = limit.partition("/")
+    return RateLimit(int(requests), window.strip(), _parse_window(window))
+
+
+class RateLimitASGIMiddleware:
+    """
+    Token-bucket rate limiter applied to an explicit set of paths.
+
+    Each (path, client IP) pair gets a bucket holding `capacity` tokens that
+    refills continuously over the window. Requests without a token receive
+    a canned 429 JSON response.
+    """
+
+    def __init__(self, app, limit: RateLimit, paths: Iterable[str]) -> None:
+        self.app = app
+        self.capacity, window_text, self.window = limit
+        self._refill_rate = self.capacity / self.window
+        self._paths = frozenset(paths)
+        self._buckets: dict[tuple[str, str], tuple[float, float]] = {}
+
+        self._body = (
+            f'{{"error":"Rate limit exceeded: {self.capacity} per {window_text}"}}'
+        ).encode()
+
+    def _prune(self, now: float) -> None:
+        """Drop buckets that have fully refilled, then the oldest if still too many."""
+        stale = [key for key, (_, last) in self._buckets.items() if now - last >= self.window]
+        for key in stale:
+            del self._buckets[key]
+        while len(self._buckets) >= MAX_BUCKETS:
+            del self._buckets[next(iter(self._buckets))]
+
+    async def __call__(self, scope, receive, send) -> None:
+        if scope["type"] != "http" or scope["path"] not in self._paths:
+            await self.app(scope, receive, send)
+            return
+
+        client = scope.get("client")
+        key = (scope["path"], client[0] if client else "127.0.0.1")
+        now = time.monotonic()
+
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            if len(self._buckets) >= MAX_BUCKETS:
+                self._prune(now)
+            tokens = self.capacity
+        else:
+            tokens, last = bucket
+            tokens = min(self.capacity, tokens + (now - last) * self._refill_rate)
+
+        if tokens < 1:
+            self._buckets[key] = (tokens, now)
+            retry_after = math.ceil((1 - tokens) / self._refill_rate)
+            await send({
+                "type": "http.response.start",
+                "status": 429,
+                "headers": [
+                    (b"content-type", b"application/json"),
+                    (b"content-length", str(len(self._body)).encode()),
+                    (b"retry-after", str(retry_after).encode()),
+                ],
+            })
+            await send({"type": "http.response.body", "body": self._body})
+            return
+
+        self._buckets[key] = (tokens - 1, now)
+        await self.app(scope, receive, send)
@@ -0,0 +1,23 @@
+-- =============================================================================
+-- DreamSight AI - Single-Round-Trip Usage Increment
+-- Run this SQL in Supabase SQL Editor after 001_tiered_system.sql
+-- =============================================================================
+
+-- increment_daily_usage now returns the new counter, so the backend needs
+-- exactly one RPC per quota consumption (no SELECT + UPDATE read-modify-write).
+-- The return type changes (void -> INTEGER), so the old function is dropped first.
+DROP FUNCTION IF EXISTS increment_daily_usage(UUID);
+
+CREATE OR REPLACE FUNCTION increment_daily_usage(p_user_id UUID)
+RETURNS INTEGER AS $$
+DECLARE
+  new_usage INTEGER;
+BEGIN
+  UPDATE profiles 
+  SET daily_usage = daily_usage + 1
+  WHERE id = p_user_id
+  RETURNING daily_usage INTO new_usage;
+  
+  RETURN new_usage;  -- NULL if the profile row does not exist
+END;
+$$ LANGUAGE plpgsql;
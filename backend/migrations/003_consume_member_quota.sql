@@ -0,0 +1,43 @@
+-- =============================================================================
+-- DreamSight AI - Atomic Member Quota Consumption
+-- Run this SQL in Supabase SQL Editor after 002_increment_daily_usage_returning.sql
+-- =============================================================================
+
+-- Check-and-increment in one round-trip. The profile row is locked with
+-- FOR UPDATE so concurrent requests cannot both pass the limit check.
+-- Master tier is unlimited and is never incremented (remaining = -1).
+CREATE OR REPLACE FUNCTION consume_member_quota(p_user_id UUID, p_daily_limit INTEGER DEFAULT 3)
+RETURNS TABLE(allowed BOOLEAN, remaining INTEGER, tier TEXT) AS $$
+DECLARE
+  v_tier TEXT;
+  v_usage INTEGER;
+BEGIN
+  SELECT p.tier, p.daily_usage INTO v_tier, v_usage
+  FROM profiles p WHERE p.id = p_user_id
+  FOR UPDATE;
+  
+  -- New user without a profile row yet: create it with fresh quota
+  IF NOT FOUND THEN
+    INSERT INTO profiles (id) VALUES (p_user_id)
+    ON CONFLICT (id) DO NOTHING;
+    v_tier := 'free';
+    v_usage := 0;
+  END IF;
+  
+  IF v_tier = 'master' THEN
+    RETURN QUERY SELECT TRUE, -1, v_tier;
+    RETURN;
+  END IF;
+  
+  IF COALESCE(v_usage, 0) >= p_daily_limit THEN
+    RETURN QUERY SELECT FALSE, 0, COALESCE(v_tier, 'free');
+    RETURN;
+  END IF;
+  
+  UPDATE profiles p
+  SET daily_usage = COALESCE(p.daily_usage, 0) + 1
+  WHERE p.id = p_user_id;
+  
+  RETURN QUERY SELECT TRUE, p_daily_limit - COALESCE(v_usage, 0) - 1, COALESCE(v_tier, 'free');
+END;
+$$ LANGUAGE plpgsql;
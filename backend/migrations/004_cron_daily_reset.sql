@@ -0,0 +1,30 @@
+-- =============================================================================
+-- DreamSight AI - Single-Call Daily Cron Reset
+-- Run this SQL in Supabase SQL Editor after 003_consume_member_quota.sql
+-- =============================================================================
+
+-- Runs the three daily maintenance statements in one transaction and returns
+-- only the affected-row counts, so the admin endpoint no longer pulls every
+-- reset/deleted row (including dream JSONB) over the wire just to count it.
+CREATE OR REPLACE FUNCTION cron_daily_reset()
+RETURNS JSONB AS $$
+  WITH p AS (
+    UPDATE profiles
+    SET daily_usage = 0, last_reset_date = CURRENT_DATE
+    WHERE daily_usage <> 0
+    RETURNING 1
+  ), g AS (
+    DELETE FROM guest_usage
+    WHERE usage_date < CURRENT_DATE
+    RETURNING 1
+  ), d AS (
+    DELETE FROM dreams
+    WHERE created_at < NOW() - INTERVAL '30 days'
+    RETURNING 1
+  )
+  SELECT jsonb_build_object(
+    'profiles_reset', (SELECT count(*) FROM p),
+    'guests_cleaned', (SELECT count(*) FROM g),
+    'old_dreams_deleted', (SELECT count(*) FROM d)
+  );
+$$ LANGUAGE sql;
@@ -0,0 +1,21 @@
+-- =============================================================================
+-- DreamSight AI - Batched Guest Quota Check
+-- Run this SQL in Supabase SQL Editor after 004_cron_daily_reset.sql
+-- =============================================================================
+
+-- Checks and consumes guest quota for a burst of IPs in one round-trip.
+-- IPs are processed in array order through check_guest_quota(), so a
+-- duplicate IP within one batch is allowed at most once. Rows are keyed by
+-- the 1-based array position (idx) rather than by IP for the same reason.
+CREATE OR REPLACE FUNCTION check_guest_quota_batch(guest_ips TEXT[])
+RETURNS TABLE(idx INTEGER, allowed BOOLEAN) AS $$
+DECLARE
+  i INTEGER;
+BEGIN
+  FOR i IN 1 .. COALESCE(array_length(guest_ips, 1), 0) LOOP
+    idx := i;
+    allowed := check_guest_quota(guest_ips[i]);
+    RETURN NEXT;
+  END LOOP;
+END;
+$$ LANGUAGE plpgsql;
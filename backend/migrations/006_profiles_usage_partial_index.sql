@@ -0,0 +1,14 @@
+-- =============================================================================
+-- DreamSight AI - Partial Index for the Daily Usage Reset
+-- Run this SQL in Supabase SQL Editor after 005_check_guest_quota_batch.sql
+-- =============================================================================
+
+-- cron_daily_reset() only touches profiles WHERE daily_usage <> 0. A partial
+-- index on exactly that predicate lets the reset find the few active users
+-- without a full scan of profiles, and stays tiny since most rows are 0.
+-- Prefer CONCURRENTLY on a live database (it cannot run inside a transaction,
+-- so execute it on its own):
+--   CREATE INDEX CONCURRENTLY IF NOT EXISTS profiles_usage_nz ON profiles (daily_usage) WHERE daily_usage <> 0;
+CREATE INDEX IF NOT EXISTS profiles_usage_nz
+  ON profiles (daily_usage)
+  WHERE daily_usage <> 0;
@@ -0,0 +1,14 @@
+-- =============================================================================
+-- DreamSight AI - Insert Dream Returning Only the ID
+-- Run this SQL in Supabase SQL Editor after 006_profiles_usage_partial_index.sql
+-- =============================================================================
+
+-- A plain PostgREST insert echoes the whole row back, including the analysis
+-- JSONB the backend just uploaded. This returns only the new id. It runs with
+-- the caller's privileges, so the same RLS policies as a direct insert apply.
+CREATE OR REPLACE FUNCTION insert_dream(p_user_id UUID, p_content TEXT, p_analysis JSONB)
+RETURNS BIGINT AS $$
+  INSERT INTO dreams (user_id, content, analysis)
+  VALUES (p_user_id, p_content, p_analysis)
+  RETURNING id;
+$$ LANGUAGE sql;
@@ -0,0 +1,40 @@
+-- =============================================================================
+-- DreamSight AI - Member Quota as One Conditional UPDATE
+-- Run this SQL in Supabase SQL Editor after 007_insert_dream.sql
+-- =============================================================================
+
+-- Replaces the SELECT ... FOR UPDATE version from 003. The limit check lives
+-- in the UPDATE's WHERE clause, so check and consume are a single atomic
+-- statement: concurrent requests serialize on the row and re-evaluate the
+-- predicate, and an over-quota request matches no row and changes nothing.
+-- Same signature and result shape as 003, so the backend is unchanged.
+CREATE OR REPLACE FUNCTION consume_member_quota(p_user_id UUID, p_daily_limit INTEGER DEFAULT 3)
+RETURNS TABLE(allowed BOOLEAN, remaining INTEGER, tier TEXT) AS $$
+DECLARE
+  v_usage INTEGER;
+  v_tier TEXT;
+BEGIN
+  -- New user without a profile row yet: create it with fresh quota
+  -- (same transaction, no extra round-trip)
+  INSERT INTO profiles (id) VALUES (p_user_id)
+  ON CONFLICT (id) DO NOTHING;
+  
+  -- Master is unlimited and never incremented
+  UPDATE profiles p
+  SET daily_usage = COALESCE(p.daily_usage, 0)
+                    + CASE WHEN p.tier = 'master' THEN 0 ELSE 1 END
+  WHERE p.id = p_user_id
+    AND (p.tier = 'master' OR COALESCE(p.daily_usage, 0) < p_daily_limit)
+  RETURNING p.daily_usage, COALESCE(p.tier, 'free') INTO v_usage, v_tier;
+  
+  IF NOT FOUND THEN
+    -- Over quota: the predicate matched no row and nothing was consumed
+    SELECT COALESCE(p.tier, 'free') INTO v_tier FROM profiles p WHERE p.id = p_user_id;
+    RETURN QUERY SELECT FALSE, 0, COALESCE(v_tier, 'free');
+  ELSIF v_tier = 'master' THEN
+    RETURN QUERY SELECT TRUE, -1, v_tier;
+  ELSE
+    RETURN QUERY SELECT TRUE, p_daily_limit - v_usage, v_tier;
+  END IF;
+END;
+$$ LANGUAGE plpgsql;
@@ -0,0 +1,23 @@
+-- =============================================================================
+-- DreamSight AI - Refund a Consumed Member Request
+-- Run this SQL in Supabase SQL Editor after 008_consume_member_quota_conditional_update.sql
+-- =============================================================================
+
+-- consume_member_quota charges the request before the analysis runs; when the
+-- analysis then fails, the backend gives the unit back with this RPC.
+-- Master is never incremented, and the counter never drops below zero.
+CREATE OR REPLACE FUNCTION refund_member_quota(p_user_id UUID)
+RETURNS INTEGER AS $$
+DECLARE
+  new_usage INTEGER;
+BEGIN
+  UPDATE profiles
+  SET daily_usage = daily_usage - 1
+  WHERE id = p_user_id
+    AND COALESCE(tier, 'free') <> 'master'
+    AND daily_usage > 0
+  RETURNING daily_usage INTO new_usage;
+  
+  RETURN new_usage;  -- NULL if nothing was refunded
+END;
+$$ LANGUAGE plpgsql;
@@ -0,0 +1,126 @@
+"""
+Analysis Triangle Schemas
+Pydantic models for the structured Psychology / Tarot / I Ching output.
+"""
+
+from datetime import datetime
+from typing import Dict, List
+
+from pydantic import BaseModel, ConfigDict, Field
+
+from models.schemas import utc_now
+
+
+class _AnalysisModel(BaseModel):
+    """Base for analysis output: validated once from LLM JSON, then read-only."""
+    model_config = ConfigDict(frozen=True, extra="ignore", validate_assignment=False)
+
+
+class PsychologyDetailed(_AnalysisModel):
+    """Detailed 4-layer psychology analysis (Freud + Jung)."""
+    
+    # Layer 1: Emotional Labeling
+    core_emotion: str = Field(description="Cảm xúc chủ đạo cụ thể (Ví dụ: Lo âu, Bi thương, Dồn nén, Giải phóng)")
+    emotion_intensity: int = Field(ge=0, le=100, description="Mức độ cảm xúc (0-100%)")
+    
+    # Layer 2: Freudian Analysis (Id vs Superego conflict)
+    hidden_desire: str = Field(description="Dục vọng/bản năng (Id) đang bị kìm nén - Cái bạn thực sự muốn")
+    inner_conflict: str = Field(description="Xung đột giữa Id và Superego (áp lực xã hội/đạo đức)")
+    
+    # Layer 3: Jungian Archetype & Shadow
+    archetype: str = Field(description="Cổ mẫu xuất hiện (Shadow/Persona/Child/Hero/Anima/Animus...)")
+    shadow_aspect: str = Field(description="Phần Bóng âm - phần tính cách bạn đang chối bỏ hoặc giấu đi")
+    
+    # Layer 4: Therapeutic Action
+    therapy_type: str = Field(description="Loại liệu pháp đề xuất (CBT/Mindfulness/Shadow Work/Journaling...)")
+    actionable_exercise: str = Field(description="Bài tập cụ thể để thực hiện (Ví dụ: Grounding 5-4-3-2-1, Box Breathing...)")
+
+class TarotDetailed(_AnalysisModel):
+    """Detailed 3-layer Tarot Deep Reading model."""
+    
+    # Card Identity
+    card_name: str = Field(description="Tên lá bài tiếng Anh (Ví dụ: The Tower, The Moon, Ace of Cups)")
+    card_number: int = Field(ge=0, le=77, description="Số thứ tự lá bài (0=The Fool, 1-21=Major Arcana, 22-77=Minor Arcana)")
+    
+    # Layer 1: Orientation (Upright/Reversed)
+    is_reversed: bool = Field(description="True nếu lá bài ngược (Reversed), False nếu xuôi (Upright)")
+    orientation_reason: str = Field(description="Lý do chọn chiều xuôi/ngược dựa trên tone cảm xúc của giấc mơ")
+    
+    # Layer 2: Elemental Energy
+    suit: str = Field(description="Bộ bài (Major Arcana/Wands-Fire/Cups-Water/Swords-Air/Pentacles-Earth)")
+    element: str = Field(description="Nguyên tố chính (Lửa/Nước/Gió/Đất/Spirit)")
+    energy_analysis: str = Field(description="Phân tích năng lượng: giấc mơ đang thừa hay thiếu nguyên tố gì")
+    
+    # Layer 3: Visual Bridge
+    visual_bridge: str = Field(description="Cầu nối hình ảnh: sự tương đồng giữa giấc mơ và hình vẽ trên lá bài")
+    
+    # Prediction
+    prediction: str = Field(description="Lời tiên tri và hướng dẫn hành động bằng tiếng Việt")
+
+
+class IChingDetailed(_AnalysisModel):
+    """Detailed I Ching analysis with specific advice for different life areas."""
+    hexagram_name: str = Field(description="Tên quẻ Hán-Việt (Ví dụ: Thủy Thiên Nhu)")
+    structure: str = Field(description="Cấu trúc quẻ (Ví dụ: Thượng Khảm (Nước) - Hạ Càn (Trời))")
+    judgment_summary: str = Field(description="Lời Thoán: Tổng quan Cát/Hung/Bình")
+    image_meaning: str = Field(description="Lời Tượng: Ý nghĩa hình tượng thiên nhiên")
+    advice_career: str = Field(description="Lời khuyên cụ thể cho Công việc/Sự nghiệp dựa trên quẻ")
+    advice_relationship: str = Field(description="Lời khuyên cụ thể cho Tình cảm/Gia đạo")
+    actionable_step: str = Field(description="Một hành động cụ thể người dùng nên làm ngay")
+
+
+class LuckyNumber(_AnalysisModel):
+    """A single lucky number with its source and meaning."""
+    number: str = Field(description="Con số (Ví dụ: '17', '03', '32-72')")
+    source: str = Field(description="Nguồn gốc (Ví dụ: 'Lá bài The Star', 'Quẻ Truân', 'Sổ Mơ: Thấy rắn')")
+    meaning: str = Field(description="Giải thích ngắn gọn tại sao lại có số này")
+
+
+class FinalSynthesis(_AnalysisModel):
+    """Final synthesis combining all analyses and lucky numbers."""
+    core_message: str = Field(description="Tổng hợp lời khuyên từ Tâm lý, Tarot và Kinh Dịch thành một thông điệp nhất quán (3-4 câu)")
+    numbers: List[LuckyNumber] = Field(description="3 con số may mắn từ Tarot, Kinh Dịch, và Sổ Mơ Dân Gian")
+
+
+class SynthesisOutput(_AnalysisModel):
+    """Synthesis call output when the three lenses are generated separately."""
+    synthesis: FinalSynthesis = Field(
+        description="Final synthesis with core message and 3 lucky numbers"
+    )
+    art_prompt: str = Field(
+        description="Highly detailed English prompt for Stable Diffusion image generation"
+    )
+
+
+class DreamAnalysis(_AnalysisModel):
+    """Complete dream analysis output structure."""
+    psychology: PsychologyDetailed = Field(
+        description="4-layer psychology analysis (Emotion, Freud, Jung, Therapy)"
+    )
+    tarot: TarotDetailed = Field(
+        description="3-layer Tarot Deep Reading (Orientation, Element, Visual Bridge)"
+    )
+    iching: IChingDetailed = Field(
+        description="Detailed I Ching analysis with hexagram structure and specific advice"
+    )
+    synthesis: FinalSynthesis = Field(
+        description="Final synthesis with core message and 3 lucky numbers"
+    )
+    art_prompt: str = Field(
+        description="Highly detailed English prompt for Stable Diffusion image generation"
+    )
+
+
+class TriangleAnalysisResponse(_AnalysisModel):
+    """Full response from the Analysis Triangle service."""
+    # Built once from validated submodels and never mutated
+    model_config = ConfigDict(arbitrary_types_allowed=True)
+    
+    id: str = Field(description="Unique analysis ID")
+    user_dream: str = Field(description="Original dream text")
+    analysis: DreamAnalysis = Field(description="The three-lens analysis")
+    sources: Dict[str, List[str]] = Field(
+        default_factory=dict,
+        description="Retrieved context sources for each lens"
+    )
+    created_at: datetime = Field(default_factory=utc_now)
@@ -2,10 +2,19 @@
 Pydantic schemas for request/response validation.
 """
 
-from datetime import datetime
-from typing import Optional, List
+from datetime import datetime, timezone
+from typing import Annotated, Optional, List
+
+import msgspec
 from pydantic import BaseModel, Field
 
+_UTC = timezone.utc
+
+
+def utc_now() -> datetime:
+    """Timezone-aware UTC timestamp (replaces deprecated datetime.utcnow)."""
+    return datetime.now(_UTC)
+
 
 class DreamInterpretationRequest(BaseModel):
     """Request model for dream interpretation."""
@@ -55,7 +64,7 @@ class DreamInterpretationResponse(BaseModel):
         description="The primary emotional theme of the dream"
     )
     created_at: datetime = Field(
-        default_factory=datetime.utcnow,
+        default_factory=utc_now,
         description="Timestamp of the interpretation"
     )
 
@@ -116,21 +125,28 @@ class AnalysisMode(str, Enum):
     PSYCHOLOGICAL = "psychological"
     MYSTICAL = "mystical"
 
+    # Format as the raw value so members can be logged/interpolated without `.value`
+    __str__ = str.__str__
+
 
-class AnalyzeDreamRequest(BaseModel):
-    """Request model for RAG-based dream analysis."""
+class AnalyzeDreamRequest(msgspec.Struct, frozen=True):
+    """
+    Request model for RAG-based dream analysis.
     
-    user_dream: str = Field(
-        ...,
-        min_length=10,
-        max_length=500,  # Reduced to save tokens (production limit)
-        description="The dream narrative provided by the user (max 500 chars)",
-        examples=["I dreamt I was walking through an endless forest of mirrors"]
-    )
-    mode: AnalysisMode = Field(
-        default=AnalysisMode.MYSTICAL,
-        description="Analysis mode: 'psychological' for Jungian analysis, 'mystical' for esoteric interpretation"
-    )
+    A msgspec Struct rather than a Pydantic model: the hot /analyze endpoint
+    decodes and validates the JSON body in a single C pass.
+    """
+    
+    user_dream: Annotated[
+        str,
+        msgspec.Meta(
+            min_length=10,
+            max_length=500,  # Reduced to save tokens (production limit)
+            description="The dream narrative provided by the user (max 500 chars)",
+            examples=["I dreamt I was walking through an endless forest of mirrors"],
+        ),
+    ]
+    mode: AnalysisMode = AnalysisMode.MYSTICAL
 
 
 class SourceMetadata(BaseModel):
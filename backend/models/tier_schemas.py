@@ -4,8 +4,16 @@ Defines tier levels and content masking models for monetization.
 """
 
 from enum import Enum
-from typing import Optional, List, Union
-from pydantic import BaseModel, Field
+from typing import Dict, Optional, List, Union
+from pydantic import BaseModel, ConfigDict, Field
+
+from models.analysis_schemas import (
+    PsychologyDetailed,
+    TarotDetailed,
+    IChingDetailed,
+    FinalSynthesis,
+    LuckyNumber,
+)
 
 
 class UserTier(str, Enum):
@@ -14,9 +22,15 @@ class UserTier(str, Enum):
     MEMBER = "free"      # Logged in, free tier (maps to DB 'free')
     MASTER = "master"    # Premium tier (full access)
 
+    # Format as the raw value so members can be logged/interpolated without `.value`
+    __str__ = str.__str__
+
 
 class LockedContent(BaseModel):
     """Placeholder for locked premium content."""
+    # Immutable so a single shared instance can stand in for every locked section
+    model_config = ConfigDict(frozen=True)
+    
     is_locked: bool = True
     message: str = "🔒 Nâng cấp lên Cao Thủ để mở khóa"
     upgrade_hint: str = "Tarot, Kinh Dịch, Số May Mắn & Lời Khuyên Chi Tiết"
@@ -28,7 +42,17 @@ class TieredTriangleResponse(BaseModel):
     
     - Guest/Member: Only see `psychology` (full)
     - Master: See everything (full access)
+    
+    The router assembles it with `model_construct` from the already-validated
+    analysis submodels, so nothing is copied or re-validated before the single
+    JSON serialization.
     """
+    model_config = ConfigDict(
+        arbitrary_types_allowed=True,
+        extra="ignore",
+        validate_assignment=False,
+    )
+    
     id: str = Field(..., description="Unique analysis ID")
     user_dream: str = Field(..., description="Original dream text")
     user_tier: UserTier = Field(..., description="User's current tier")
@@ -38,28 +62,28 @@ class TieredTriangleResponse(BaseModel):
     )
     
     # Psychology: Always visible (Full Access for all tiers)
-    psychology: dict = Field(..., description="Full 4-layer psychology analysis")
+    psychology: PsychologyDetailed = Field(..., description="Full 4-layer psychology analysis")
     
     # Premium content: Locked for Guest/Member, Full for Master
-    tarot: Union[dict, LockedContent] = Field(
+    tarot: Union[TarotDetailed, LockedContent] = Field(
         ..., 
         description="Tarot reading (locked for non-Master)"
     )
-    iching: Union[dict, LockedContent] = Field(
+    iching: Union[IChingDetailed, LockedContent] = Field(
         ..., 
         description="I Ching hexagram analysis (locked for non-Master)"
     )
-    synthesis: Union[dict, LockedContent] = Field(
+    synthesis: Union[FinalSynthesis, LockedContent] = Field(
         ..., 
         description="Final synthesis and advice (locked for non-Master)"
     )
-    lucky_numbers: Union[List[dict], LockedContent] = Field(
+    lucky_numbers: Union[List[LuckyNumber], LockedContent] = Field(
         ..., 
         description="Lucky numbers from Tarot/I Ching/Sổ Mơ (locked for non-Master)"
     )
     
     # Metadata (always visible)
-    sources: dict = Field(default_factory=dict, description="Retrieved context sources")
+    sources: Dict[str, List[str]] = Field(default_factory=dict, description="Retrieved context sources")
     created_at: str = Field(..., description="ISO timestamp of analysis")
 
 
@@ -5,13 +5,16 @@ Designed to work with external cron services (cron-job.org, GitHub Actions)
 as a fallback for Supabase Free tier where pg_cron may be unavailable.
 """
 
+import hmac
+
 from fastapi import APIRouter, Header, HTTPException, status
 from typing import Optional
 
-from config import get_settings
+from config import CRON_SECRET_B
+from services.analyze_service import get_cache_stats
+from services.db_service import execute_cron_reset
 from utils.logger import log_info, log_warning, log_error
 
-settings = get_settings()
 router = APIRouter(prefix="/admin", tags=["Admin"])
 
 
@@ -44,14 +47,16 @@ async def manual_reset_usage(
     Protected by CRON_SECRET env variable.
     """
     # Verify cron secret
-    if not settings.cron_secret:
+    if not CRON_SECRET_B:
         log_warning("CRON_SECRET not configured - endpoint disabled")
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
             detail="Cron endpoint not configured"
         )
     
-    if x_cron_secret != settings.cron_secret:
+    if not x_cron_secret or not hmac.compare_digest(
+        x_cron_secret.encode(), CRON_SECRET_B
+    ):
         log_warning("Invalid cron secret provided")
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
@@ -61,12 +66,9 @@ async def manual_reset_usage(
     log_info("Manual cron reset triggered via admin endpoint")
     
     try:
-        # Import here to avoid circular imports
-        from services.db_service import execute_cron_reset
-        
         result = await execute_cron_reset()
         
-        log_info(f"Cron reset completed: {result}")
+        log_info("Cron reset completed: %s", result)
         return {
             "status": "ok",
             "message": "Daily reset and cleanup completed",
@@ -74,7 +76,7 @@ async def manual_reset_usage(
         }
         
     except Exception as e:
-        log_error(f"Cron reset failed: {e}", exc_info=True)
+        log_error("Cron reset failed: %s", e, exc_info=True)
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Reset failed: {str(e)}"
@@ -84,8 +86,8 @@ async def manual_reset_usage(
 @router.get(
     "/health",
     summary="Admin health check",
-    description="Simple health check for monitoring services."
+    description="Simple health check for monitoring services, including analysis cache counters."
 )
 async def admin_health():
     """Basic health check for admin endpoints."""
-    return {"status": "ok", "endpoint": "admin"}
+    return {"status": "ok", "endpoint": "admin", "analysis_cache": get_cache_stats()}
@@ -4,14 +4,13 @@ API endpoints for dream interpretation and symbol search.
 Production-hardened with rate limiting, auth, API key security, and structured logging.
 """
 
+import msgspec
+import orjson
 from typing import Optional
 from pydantic import BaseModel, Field
 
-from fastapi import APIRouter, Depends, Header, HTTPException, Request, status
-from slowapi import Limiter
-from slowapi.util import get_remote_address
+from fastapi import APIRouter, BackgroundTasks, Depends, Header, HTTPException, Request, Response, status
 
-from config import get_settings
 from models.schemas import (
     DreamInterpretationRequest,
     DreamInterpretationResponse,
@@ -21,64 +20,86 @@ from models.schemas import (
     AnalyzeDreamRequest,
     AnalyzeDreamResponse,
 )
-from services.dream_service import analysis_triangle_service, TriangleAnalysisResponse
+from services.dream_service import get_analysis_triangle_service, DreamAnalysis, TriangleAnalysisResponse
 from services.analyze_service import analyze_dream_service
 from services.db_service import (
     verify_user_token, 
     save_dream_to_db, 
     get_user_dreams,
-    get_user_profile,
+    get_dream_detail,
     check_guest_quota,
-    check_member_quota,
-    increment_member_usage,
+    consume_member_quota,
+    refund_member_quota,
 )
 from models.tier_schemas import UserTier, LockedContent, TieredTriangleResponse, TIER_QUOTAS
+from middleware.error_shield import ORACLE_BUSY_DETAIL
 from utils.logger import log_info, log_error, log_warning
 
-settings = get_settings()
 router = APIRouter()
 
-# Initialize limiter (attached to app in main.py)
-limiter = Limiter(key_func=get_remote_address)
+# Reusable msgspec decoder for the hot /analyze request body
+_analyze_request_decoder = msgspec.json.Decoder(AnalyzeDreamRequest)
 
 
-# ============================================
-# API Key Verification Dependency
-# ============================================
-
-async def verify_api_key(
-    x_api_key: Optional[str] = Header(None, alias="X-API-Key"),
-) -> str:
+def _msgspec_request_body(struct_type: type) -> dict:
     """
-    Verify the static API key from X-API-Key header.
-    This runs for ALL requests to prevent unauthorized access.
-    
-    Raises:
-        HTTPException 403: If API key is missing or invalid
+    OpenAPI requestBody for a msgspec Struct decoded by hand from the raw
+    Request (FastAPI can't see it). Nested schemas (e.g. enums) are inlined.
     """
-    # Check if API key is configured
-    if not settings.api_secret_key:
-        # API key not set in config - skip verification (development mode)
-        log_warning("API_SECRET_KEY not configured - skipping API key verification")
-        return "dev_mode"
-    
-    # Check if header is provided
-    if not x_api_key:
-        log_warning("Request blocked: Missing X-API-Key header")
-        raise HTTPException(
-            status_code=status.HTTP_403_FORBIDDEN,
-            detail="API key required. Please provide X-API-Key header.",
-        )
-    
-    # Verify the key
-    if x_api_key != settings.api_secret_key:
-        log_warning(f"Request blocked: Invalid API key provided")
-        raise HTTPException(
-            status_code=status.HTTP_403_FORBIDDEN,
-            detail="Invalid API key.",
-        )
-    
-    return x_api_key
+    (schema,), components = msgspec.json.schema_components([struct_type], ref_template="{name}")
+    
+    def inline(node):
+        if isinstance(node, dict):
+            if "$ref" in node:
+                extra = {key: value for key, value in node.items() if key != "$ref"}
+                return {**inline(components[node["$ref"]]), **extra}
+            return {key: inline(value) for key, value in node.items()}
+        if isinstance(node, list):
+            return [inline(value) for value in node]
+        return node
+    
+    return {"content": {"application/json": {"schema": inline(schema)}}, "required": True}
+
+# Fields of AnalyzeDreamResponse persisted to the dreams history table
+_HISTORY_FIELDS = {
+    "interpretation": True,
+    "image_prompt": True,
+    "mode": True,
+    "sources": {"__all__": {"source_type", "title", "relevance_score"}},
+}
+
+# Static reference data, serialized once at import
+COMMON_SYMBOLS = [
+    {"name": "Water", "category": "Nature", "meaning": "Emotions, subconscious"},
+    {"name": "Flying", "category": "Action", "meaning": "Freedom, ambition"},
+    {"name": "Falling", "category": "Action", "meaning": "Loss of control, anxiety"},
+    {"name": "House", "category": "Place", "meaning": "Self, psyche"},
+    {"name": "Snake", "category": "Animal", "meaning": "Transformation, fear"},
+    {"name": "Death", "category": "Event", "meaning": "Endings, new beginnings"},
+    {"name": "Teeth", "category": "Body", "meaning": "Confidence, appearance"},
+    {"name": "Chase", "category": "Action", "meaning": "Avoidance, pressure"},
+    {"name": "Fire", "category": "Element", "meaning": "Passion, destruction"},
+    {"name": "Baby", "category": "Person", "meaning": "New beginnings, vulnerability"},
+]
+_COMMON_SYMBOLS_BYTES = orjson.dumps({"symbols": COMMON_SYMBOLS})
+
+# Placeholder served in place of premium sections for non-Master tiers
+_LOCKED_CONTENT = LockedContent()
+
+# Canned 503 bodies, returned in place of raising HTTPException with a fixed detail.
+# Only the bytes are shared: FastAPI mutates a returned Response (e.g. attaches
+# background tasks), so each return builds its own via _service_unavailable()
+_ORACLE_BUSY_BYTES = orjson.dumps({"detail": ORACLE_BUSY_DETAIL})
+_ORACLE_MEDITATING_BYTES = orjson.dumps({"detail": "The Oracle is meditating. Please try again."})
+
+
+def _service_unavailable(body: bytes) -> Response:
+    """Fresh 503 JSON response around a pre-encoded body."""
+    return Response(
+        content=body,
+        status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+        media_type="application/json",
+    )
 
 
 # ============================================
@@ -99,13 +120,29 @@ def extract_token_from_header(authorization: Optional[str]) -> Optional[str]:
         return None
     
     # Expected format: "Bearer <token>"
-    parts = authorization.split(" ")
-    if len(parts) == 2 and parts[0].lower() == "bearer":
-        return parts[1]
+    scheme, sep, token = authorization.partition(" ")
+    if sep and token and scheme.lower() == "bearer" and " " not in token:
+        return token
     
     return None
 
 
+async def parse_analyze_request(request: Request) -> AnalyzeDreamRequest:
+    """
+    Decode and validate the /analyze JSON body with msgspec.
+    
+    Raises:
+        HTTPException 422: If the body is not valid JSON or fails validation
+    """
+    try:
+        return _analyze_request_decoder.decode(await request.body())
+    except msgspec.DecodeError as e:
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail=str(e),
+        )
+
+
 # ============================================
 # Endpoints
 # ============================================
@@ -121,7 +158,6 @@ def extract_token_from_header(authorization: Optional[str]) -> Optional[str]:
     },
     summary="Interpret a dream",
     description="Analyze and interpret a dream using AI and the dream knowledge base.",
-    dependencies=[Depends(verify_api_key)],
 )
 async def interpret_dream(request: DreamInterpretationRequest):
     """
@@ -131,24 +167,21 @@ async def interpret_dream(request: DreamInterpretationRequest):
     - **include_symbols**: Whether to include symbol analysis
     - **language**: Response language (default: en)
     """
-    log_info(f"Interpret request received - length: {len(request.dream_text)} chars")
+    log_info("Interpret request received - length: %d chars", len(request.dream_text))
     
     try:
         result = await dream_service.interpret_dream(request)
         log_info("Interpret request completed successfully")
         return result
     except ValueError as e:
-        log_error(f"Validation error: {e}")
+        log_error("Validation error: %s", e)
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail=str(e),
         )
     except Exception as e:
-        log_error(f"Interpret service error: {e}", exc_info=True)
-        raise HTTPException(
-            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
-            detail="The Oracle is meditating (Service busy). Please try again.",
-        )
+        log_error("Interpret service error: %s", e, exc_info=True)
+        return _service_unavailable(_ORACLE_BUSY_BYTES)
 
 
 @router.post(
@@ -161,7 +194,6 @@ async def interpret_dream(request: DreamInterpretationRequest):
     },
     summary="Search dream symbols",
     description="Search the dream knowledge base for symbol meanings.",
-    dependencies=[Depends(verify_api_key)],
 )
 async def search_symbols(request: DreamSearchRequest):
     """
@@ -170,54 +202,39 @@ async def search_symbols(request: DreamSearchRequest):
     - **query**: Search query for dream symbols
     - **limit**: Maximum number of results (1-20)
     """
-    log_info(f"Search request: '{request.query}'")
+    log_info("Search request: '%s'", request.query)
     
     try:
         result = await dream_service.search_symbols(request)
-        log_info(f"Search completed - {len(result.results)} results")
+        log_info("Search completed - %d results", len(result.results))
         return result
     except ValueError as e:
-        log_error(f"Search validation error: {e}")
+        log_error("Search validation error: %s", e)
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail=str(e),
         )
     except Exception as e:
-        log_error(f"Search service error: {e}", exc_info=True)
-        raise HTTPException(
-            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
-            detail="The Oracle is meditating (Service busy). Please try again.",
-        )
+        log_error("Search service error: %s", e, exc_info=True)
+        return _service_unavailable(_ORACLE_BUSY_BYTES)
 
 
 @router.get(
     "/symbols/common",
     summary="Get common dream symbols",
     description="Get a list of commonly analyzed dream symbols.",
-    dependencies=[Depends(verify_api_key)],
 )
-async def get_common_symbols():
+async def get_common_symbols() -> Response:
     """Get a list of common dream symbols for reference."""
     log_info("Common symbols request")
-    return {
-        "symbols": [
-            {"name": "Water", "category": "Nature", "meaning": "Emotions, subconscious"},
-            {"name": "Flying", "category": "Action", "meaning": "Freedom, ambition"},
-            {"name": "Falling", "category": "Action", "meaning": "Loss of control, anxiety"},
-            {"name": "House", "category": "Place", "meaning": "Self, psyche"},
-            {"name": "Snake", "category": "Animal", "meaning": "Transformation, fear"},
-            {"name": "Death", "category": "Event", "meaning": "Endings, new beginnings"},
-            {"name": "Teeth", "category": "Body", "meaning": "Confidence, appearance"},
-            {"name": "Chase", "category": "Action", "meaning": "Avoidance, pressure"},
-            {"name": "Fire", "category": "Element", "meaning": "Passion, destruction"},
-            {"name": "Baby", "category": "Person", "meaning": "New beginnings, vulnerability"},
-        ]
-    }
+    return Response(content=_COMMON_SYMBOLS_BYTES, media_type="application/json")
 
 
 @router.post(
     "/analyze",
     response_model=AnalyzeDreamResponse,
+    # The body is decoded by parse_analyze_request, so document it explicitly
+    openapi_extra={"requestBody": _msgspec_request_body(AnalyzeDreamRequest)},
     responses={
         400: {"model": ErrorResponse, "description": "Invalid request"},
         403: {"model": ErrorResponse, "description": "Invalid API key"},
@@ -236,12 +253,9 @@ a rich interpretation based on dream dictionaries, Tarot, and I Ching wisdom.
 
 Also generates a Surrealist/Dalí-style image prompt to visualize the dream.
     """,
-    dependencies=[Depends(verify_api_key)],
 )
-@limiter.limit(f"{settings.rate_limit_requests}/{settings.rate_limit_window}")
 async def analyze_dream(
-    dream_request: AnalyzeDreamRequest,
-    request: Request,  # Required for slowapi - MUST be named 'request'
+    dream_request: AnalyzeDreamRequest = Depends(parse_analyze_request),
     authorization: Optional[str] = Header(None, description="Bearer token for authenticated users"),
 ) -> AnalyzeDreamResponse:
     """
@@ -262,54 +276,43 @@ async def analyze_dream(
         try:
             user_id = await verify_user_token(token)
             if user_id:
-                log_info(f"Analyzing dream for user: {user_id[:8]}...")
+                log_info("Analyzing dream for user: %.8s...", user_id)
             else:
                 log_info("Analyzing dream for guest (invalid token provided)")
         except Exception as auth_error:
-            log_warning(f"Auth verification failed (non-fatal): {auth_error}")
+            log_warning("Auth verification failed (non-fatal): %s", auth_error)
             user_id = None
     else:
         log_info("Analyzing dream for guest (no auth token)")
     
+    # Short id reused by every log line below
+    short_uid = user_id[:8] if user_id else "Guest"
+    
     # Step 2: Perform AI dream analysis
     try:
         result = await analyze_dream_service.analyze_dream(dream_request)
-        log_info(f"Analysis successful - mode: {dream_request.mode.value}, user: {user_id[:8] if user_id else 'Guest'}")
+        log_info("Analysis successful - mode: %s, user: %s", result.mode, short_uid)
     except ValueError as e:
-        log_error(f"Configuration error: {e}")
+        log_error("Configuration error: %s", e)
         raise HTTPException(
             status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
             detail=str(e),
         )
     except RuntimeError as e:
-        log_error(f"LLM service error: {e}", exc_info=True)
-        raise HTTPException(
-            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
-            detail="The Oracle is meditating (Service busy). Please try again.",
-        )
+        log_error("LLM service error: %s", e, exc_info=True)
+        return _service_unavailable(_ORACLE_BUSY_BYTES)
     except Exception as e:
-        log_error(f"Unexpected error during analysis: {e}", exc_info=True)
-        raise HTTPException(
-            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
-            detail="The Oracle is meditating (Service busy). Please try again.",
-        )
+        log_error("Unexpected error during analysis: %s", e, exc_info=True)
+        return _service_unavailable(_ORACLE_BUSY_BYTES)
     
     # Step 3: Save to database if user is authenticated
     if user_id:
         try:
-            analysis_data = {
-                "interpretation": result.interpretation,
-                "image_prompt": result.image_prompt,
-                "mode": result.mode.value,
-                "sources": [
-                    {
-                        "source_type": s.source_type,
-                        "title": s.title,
-                        "relevance_score": s.relevance_score,
-                    }
-                    for s in result.sources
-                ],
-            }
+            # Single Pydantic v2 dump of exactly the fields stored as history
+            analysis_data = result.model_dump(
+                include=_HISTORY_FIELDS,
+                mode="json",
+            )
             
             dream_id = await save_dream_to_db(
                 user_id=user_id,
@@ -318,12 +321,12 @@ async def analyze_dream(
             )
             
             if dream_id:
-                log_info(f"Dream saved to DB - user: {user_id[:8]}..., id: {dream_id}")
+                log_info("Dream saved to DB - user: %s..., id: %s", short_uid, dream_id)
             else:
-                log_warning(f"Dream not saved - DB returned None for user: {user_id[:8]}...")
+                log_warning("Dream not saved - DB returned None for user: %s...", short_uid)
                 
         except Exception as db_error:
-            log_error(f"Failed to save dream to DB: {db_error}")
+            log_error("Failed to save dream to DB: %s", db_error)
     
     # Step 4: Return the analysis result
     return result
@@ -364,39 +367,35 @@ Also generates a Surrealist art prompt for image generation (English).
 **Security**: Requires X-API-Key header.
 **Rate Limited**: 5 requests per minute per IP.
     """,
-    dependencies=[Depends(verify_api_key)],
 )
-@limiter.limit(f"{settings.rate_limit_requests}/{settings.rate_limit_window}")
 async def analyze_dream_triangle(
     triangle_request: TriangleRequest,
-    request: Request,  # Required for slowapi
-) -> TriangleAnalysisResponse:
+) -> Response:
     """
     Analyze a dream using the Analysis Triangle architecture.
     
     Returns structured analysis from three perspectives plus an art prompt.
     """
-    log_info(f"Triangle analysis request received ({len(triangle_request.user_dream)} chars)")
-    
     try:
-        result = await analysis_triangle_service.analyze_dream_triangle(
+        result = await get_analysis_triangle_service().analyze_dream_triangle(
             triangle_request.user_dream
         )
-        log_info(f"Triangle analysis complete (id: {result.id[:8]}...)")
-        return result
+        log_info(
+            "Triangle analysis complete (id: %.8s..., %d chars)",
+            result.id, len(triangle_request.user_dream),
+        )
+        # Serialize once in pydantic-core; response_model only documents the schema
+        return Response(content=result.model_dump_json(), media_type="application/json")
         
     except ValueError as e:
-        log_error(f"Configuration error: {e}")
+        log_error("Configuration error: %s", e)
         raise HTTPException(
             status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
             detail=str(e),
         )
     except Exception as e:
-        log_error(f"Triangle analysis error: {e}", exc_info=True)
-        raise HTTPException(
-            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
-            detail="The Oracle is meditating. Please try again.",
-        )
+        log_error("Triangle analysis error: %s", e, exc_info=True)
+        return _service_unavailable(_ORACLE_MEDITATING_BYTES)
 
 
 # =============================================================================
@@ -413,29 +412,27 @@ def mask_content_for_tier(
     
     - Guest/Member: Only see psychology (full access)
     - Master: See everything
-    """
-    locked = LockedContent()
     
+    Submodels are referenced by attribute, not dumped: the analysis is already
+    validated, so the response is assembled with `model_construct`.
+    """
     is_master = user_tier == UserTier.MASTER
+    analysis = full_analysis.analysis
     
-    # Extract lucky_numbers from synthesis
-    analysis_dict = full_analysis.analysis.model_dump()
-    lucky_numbers = analysis_dict.get("synthesis", {}).get("numbers", [])
-    
-    return TieredTriangleResponse(
+    return TieredTriangleResponse.model_construct(
         id=full_analysis.id,
         user_dream=full_analysis.user_dream,
         user_tier=user_tier,
         remaining_quota=remaining_quota if remaining_quota >= 0 else None,
         
         # Psychology: Always visible
-        psychology=analysis_dict.get("psychology", {}),
+        psychology=analysis.psychology,
         
         # Premium content: Masked for non-Master
-        tarot=analysis_dict.get("tarot", {}) if is_master else locked,
-        iching=analysis_dict.get("iching", {}) if is_master else locked,
-        synthesis=analysis_dict.get("synthesis", {}) if is_master else locked,
-        lucky_numbers=lucky_numbers if is_master else locked,
+        tarot=analysis.tarot if is_master else _LOCKED_CONTENT,
+        iching=analysis.iching if is_master else _LOCKED_CONTENT,
+        synthesis=analysis.synthesis if is_master else _LOCKED_CONTENT,
+        lucky_numbers=analysis.synthesis.numbers if is_master else _LOCKED_CONTENT,
         
         # Metadata
         sources=full_analysis.sources,
@@ -443,6 +440,25 @@ def mask_content_for_tier(
     )
 
 
+async def persist_tiered_analysis(
+    user_id: str,
+    content: str,
+    analysis: DreamAnalysis,
+) -> None:
+    """
+    Background task: save the analysis to history. Usage was already
+    consumed by the quota RPC. Failures are non-fatal.
+    """
+    try:
+        await save_dream_to_db(
+            user_id=user_id,
+            content=content,
+            analysis_data=analysis.model_dump()
+        )
+    except Exception as db_error:
+        log_warning("Post-analysis DB error (non-fatal): %s", db_error)
+
+
 @router.post(
     "/triangle-tiered",
     response_model=TieredTriangleResponse,
@@ -468,21 +484,19 @@ Non-Master users will receive locked placeholders for premium content.
 **Security**: Requires X-API-Key header.
 **Rate Limited**: 5 requests per minute per IP.
     """,
-    dependencies=[Depends(verify_api_key)],
 )
-@limiter.limit(f"{settings.rate_limit_requests}/{settings.rate_limit_window}")
 async def analyze_dream_triangle_tiered(
     triangle_request: TriangleRequest,
     request: Request,
+    background_tasks: BackgroundTasks,
     authorization: Optional[str] = Header(None, description="Bearer token for authenticated users"),
-) -> TieredTriangleResponse:
+) -> Response:
     """
     Tiered triangle analysis with quota management and content masking.
     """
-    client_ip = get_remote_address(request)
-    log_info(f"Tiered triangle request from IP: {client_ip[:8]}...")
+    client_ip = request.client.host if request.client else "127.0.0.1"
     
-    # Step 1: Identify user tier
+    # Step 1: Identify user, then tier + quota in a single round-trip
     user_id: Optional[str] = None
     user_tier = UserTier.GUEST
     remaining_quota = 0
@@ -490,84 +504,75 @@ async def analyze_dream_triangle_tiered(
     token = extract_token_from_header(authorization)
     if token:
         user_id = await verify_user_token(token)
-        if user_id:
-            # Get user profile to determine tier
-            profile = await get_user_profile(user_id)
-            if profile:
-                db_tier = profile.get("tier", "free")
-                user_tier = UserTier.MASTER if db_tier == "master" else UserTier.MEMBER
-            else:
-                user_tier = UserTier.MEMBER  # New user, default to Member
-    
-    log_info(f"User tier: {user_tier.value}, user_id: {user_id[:8] if user_id else 'guest'}...")
     
-    # Step 2: Check quota
-    quota_allowed = False
+    # Short id reused by every log line below
+    uid_prefix = user_id[:8] if user_id else "guest"
     
-    if user_tier == UserTier.MASTER:
-        quota_allowed = True
-        remaining_quota = -1  # Unlimited
-        
-    elif user_tier == UserTier.MEMBER:
-        quota_allowed, remaining_quota = await check_member_quota(user_id)
+    # Step 2: Check (and consume) quota
+    if user_id:
+        # Logged in: the RPC returns the DB tier and atomically consumes one
+        # Member request; Master is unlimited (remaining = -1)
+        quota_allowed, remaining_quota, db_tier, quota_consumed = await consume_member_quota(
+            user_id, daily_limit=TIER_QUOTAS[UserTier.MEMBER]
+        )
+        user_tier = UserTier.MASTER if db_tier == "master" else UserTier.MEMBER
         
     else:  # GUEST
         quota_allowed, remaining_quota = await check_guest_quota(client_ip)
+        quota_consumed = False
     
     if not quota_allowed:
         tier_name = "Cao Thủ" if user_tier == UserTier.MEMBER else "Member"
-        log_warning(f"Quota exceeded for {user_tier.value}: {user_id or client_ip}")
+        log_warning("Quota exceeded for %s: %s", user_tier, uid_prefix if user_id else client_ip)
         raise HTTPException(
             status_code=status.HTTP_402_PAYMENT_REQUIRED,
             detail={
                 "error": "Đã hết lượt sử dụng hôm nay",
                 "message": f"Nâng cấp lên {tier_name} để có thêm lượt giải mã",
-                "tier": user_tier.value,
+                "tier": user_tier,
                 "upgrade_url": "/pricing"
             }
         )
     
     # Step 3: Execute analysis (always full, masking happens later)
     try:
-        full_result = await analysis_triangle_service.analyze_dream_triangle(
-            triangle_request.user_dream
+        # No semantic cache: results are saved to the user's own history
+        full_result = await get_analysis_triangle_service().analyze_dream_triangle(
+            triangle_request.user_dream, use_cache=False
+        )
+        # One record per request instead of separate received/tier/complete lines
+        log_info(
+            "Tiered triangle analysis complete (id: %.8s..., tier: %s, user: %s, ip: %.8s...)",
+            full_result.id, user_tier, uid_prefix, client_ip,
         )
-        log_info(f"Triangle analysis complete (id: {full_result.id[:8]}...)")
         
     except ValueError as e:
-        log_error(f"Configuration error: {e}")
+        log_error("Configuration error: %s", e)
+        if quota_consumed:
+            await refund_member_quota(user_id)
         raise HTTPException(
             status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
             detail=str(e),
         )
     except Exception as e:
-        log_error(f"Triangle analysis error: {e}", exc_info=True)
-        raise HTTPException(
-            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
-            detail="The Oracle is meditating. Please try again.",
-        )
+        log_error("Triangle analysis error: %s", e, exc_info=True)
+        # Failed analyses are not billed: give back the unit consumed in Step 2
+        if quota_consumed:
+            await refund_member_quota(user_id)
+        return _service_unavailable(_ORACLE_MEDITATING_BYTES)
     
-    # Step 4: Post-analysis actions (save history, increment usage)
+    # Step 4: Save history after the response is sent (usage already consumed in Step 2)
     if user_tier in [UserTier.MEMBER, UserTier.MASTER] and user_id:
-        try:
-            # Save to history
-            await save_dream_to_db(
-                user_id=user_id,
-                content=triangle_request.user_dream,
-                analysis_data=full_result.analysis.model_dump()
-            )
-            
-            # Increment usage for Member (not Master - unlimited)
-            if user_tier == UserTier.MEMBER:
-                await increment_member_usage(user_id)
-                
-        except Exception as db_error:
-            log_warning(f"Post-analysis DB error (non-fatal): {db_error}")
+        background_tasks.add_task(
+            persist_tiered_analysis,
+            user_id=user_id,
+            content=triangle_request.user_dream,
+            analysis=full_result.analysis,
+        )
     
-    # Step 5: Mask content and return
+    # Step 5: Mask content and serialize once (response_model documents the shape only)
     tiered_response = mask_content_for_tier(full_result, user_tier, remaining_quota)
-    
-    return tiered_response
+    return Response(content=tiered_response.model_dump_json(), media_type="application/json")
 
 @router.get(
     "/history",
@@ -578,7 +583,6 @@ async def analyze_dream_triangle_tiered(
         403: {"model": ErrorResponse, "description": "Invalid API key"},
         503: {"model": ErrorResponse, "description": "Service unavailable"},
     },
-    dependencies=[Depends(verify_api_key)],
 )
 async def get_dream_history(
     authorization: Optional[str] = Header(None, description="Bearer token (required)"),
@@ -590,7 +594,8 @@ async def get_dream_history(
     - **Authorization** (Header): Required Bearer token from Supabase Auth
     - **limit**: Maximum number of dreams to return (default: 10)
     
-    Returns list of dreams with content and analysis data.
+    Returns list of dreams (id, content, created_at). Fetch the full analysis
+    of one dream with `GET /history/{dream_id}`.
     """
     # Step 1: Validate authorization header
     if not authorization:
@@ -613,11 +618,8 @@ async def get_dream_history(
     try:
         user_id = await verify_user_token(token)
     except Exception as e:
-        log_error(f"Token verification failed: {e}")
-        raise HTTPException(
-            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
-            detail="The Oracle is meditating (Service busy). Please try again.",
-        )
+        log_error("Token verification failed: %s", e)
+        return _service_unavailable(_ORACLE_BUSY_BYTES)
     
     if not user_id:
         log_warning("History request blocked - invalid token")
@@ -627,15 +629,65 @@ async def get_dream_history(
         )
     
     # Step 3: Fetch dream history from database
-    log_info(f"Fetching history for user: {user_id[:8]}... (limit: {limit})")
+    log_info("Fetching history for user: %.8s... (limit: %d)", user_id, limit)
     
     try:
         history = await get_user_dreams(user_id, limit=limit)
-        log_info(f"History fetched - {len(history)} dreams for user: {user_id[:8]}...")
+        log_info("History fetched - %d dreams for user: %.8s...", len(history), user_id)
         return history
     except Exception as e:
-        log_error(f"Failed to fetch dream history: {e}", exc_info=True)
+        log_error("Failed to fetch dream history: %s", e, exc_info=True)
+        return _service_unavailable(_ORACLE_BUSY_BYTES)
+
+
+@router.get(
+    "/history/{dream_id}",
+    summary="Get one dream from history",
+    description="Fetch a single dream with its full analysis. Requires valid JWT token.",
+    responses={
+        401: {"model": ErrorResponse, "description": "Authentication required"},
+        403: {"model": ErrorResponse, "description": "Invalid API key"},
+        404: {"model": ErrorResponse, "description": "Dream not found"},
+        503: {"model": ErrorResponse, "description": "Service unavailable"},
+    },
+)
+async def get_dream_history_detail(
+    dream_id: int,
+    authorization: Optional[str] = Header(None, description="Bearer token (required)"),
+) -> dict:
+    """
+    Get a single dream of the authenticated user, including the analysis JSONB.
+    
+    - **dream_id** (Path): ID of the dream record
+    - **Authorization** (Header): Required Bearer token from Supabase Auth
+    """
+    token = extract_token_from_header(authorization) if authorization else None
+    
+    if not token:
+        log_warning("History detail request blocked - missing or invalid auth header")
         raise HTTPException(
-            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
-            detail="The Oracle is meditating (Service busy). Please try again.",
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Login required. Use: Authorization: Bearer <token>",
+        )
+    
+    try:
+        user_id = await verify_user_token(token)
+    except Exception as e:
+        log_error("Token verification failed: %s", e)
+        return _service_unavailable(_ORACLE_BUSY_BYTES)
+    
+    if not user_id:
+        log_warning("History detail request blocked - invalid token")
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Invalid or expired token. Please login again.",
+        )
+    
+    dream = await get_dream_detail(user_id, dream_id)
+    if dream is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Dream not found",
         )
+    
+    return dream
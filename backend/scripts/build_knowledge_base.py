@@ -11,7 +11,7 @@ from pathlib import Path
 # Add backend directory to path to allow imports
 sys.path.append(str(Path(__file__).parent.parent))
 
-from utils.db_loader import get_dream_collection
+from utils.db_loader import bulk_add, get_dream_collection
 import chromadb
 from chromadb.utils import embedding_functions
 
@@ -108,6 +108,19 @@ DREAM_DATA = [
     }
 ]
 
+def tag_metadata(tags):
+    """
+    Encode tags for Chroma metadata: a canonical (sorted, de-duplicated)
+    comma-joined string for display, plus one boolean `tag_<name>` key per tag
+    so queries can filter with `where={"tag_<name>": True}` without splitting.
+    """
+    canonical = sorted({tag.strip().lower() for tag in tags if tag.strip()})
+    metadata = {"tags": ",".join(canonical)}
+    for tag in canonical:
+        metadata[f"tag_{tag.replace(' ', '_')}"] = True
+    return metadata
+
+
 def populate_db():
     print("Connecting to ChromaDB...")
     collection = get_dream_collection()
@@ -121,22 +134,18 @@ def populate_db():
 
     print(f"Preparing to ingest {len(DREAM_DATA)} documents...")
     
-    ids = [f"doc_{i}" for i in range(len(DREAM_DATA))]
-    documents = [item["content"] for item in DREAM_DATA]
-    metadatas = [
-        {
+    # Single pass over the data; bulk_add embeds it in as few large batches as possible
+    ids, documents, metadatas = [], [], []
+    for i, item in enumerate(DREAM_DATA):
+        ids.append(f"doc_{i}")
+        documents.append(item["content"])
+        metadatas.append({
             "title": item["title"],
             "source_type": item["source_type"],
-            "tags": ",".join(item["tags"])
-        }
-        for item in DREAM_DATA
-    ]
+            **tag_metadata(item["tags"]),
+        })
 
-    collection.add(
-        ids=ids,
-        documents=documents,
-        metadatas=metadatas
-    )
+    bulk_add(collection, ids, documents, metadatas=metadatas)
     
     print(f"✓ Successfully populated database with {len(DREAM_DATA)} documents!")
 
@@ -0,0 +1,18 @@
+"""
+Build Sổ Mơ Automaton
+Parses data/vietnamese_dream_numbers_full.json and writes the prebuilt keyword
+automaton (data/so_mo_automaton.pkl) that every API worker loads at startup.
+"""
+
+import sys
+from pathlib import Path
+
+# Add backend directory to path to allow imports
+sys.path.append(str(Path(__file__).parent.parent))
+
+from utils.so_mo import SO_MO_AUTOMATON_PATH, save_so_mo_automaton
+
+
+if __name__ == "__main__":
+    automaton = save_so_mo_automaton()
+    print(f"✓ Wrote {len(automaton)} keywords to {SO_MO_AUTOMATON_PATH}")
@@ -0,0 +1,37 @@
+"""
+Decode Binary Log
+Prints app.log.bin (LOG_FILE_FORMAT=binary) or a rotated backup in the same
+layout as the text log.
+"""
+
+import logging
+import sys
+from datetime import datetime
+from pathlib import Path
+
+# Add backend directory to path to allow imports
+sys.path.append(str(Path(__file__).parent.parent))
+
+from utils.logger import BINARY_LOG_FILE, BINARY_NAME_RECORD, BINARY_RECORD_HEADER, LOG_DATE_FORMAT
+
+
+def decode_binary_log(path: Path):
+    """Yield (created, level name, logger name, message) for every record in `path`."""
+    data = path.read_bytes()
+    names = {}
+    offset = 0
+    while offset + BINARY_RECORD_HEADER.size <= len(data):
+        timestamp, level, name_id, length = BINARY_RECORD_HEADER.unpack_from(data, offset)
+        offset += BINARY_RECORD_HEADER.size
+        message = data[offset:offset + length].decode("utf-8", errors="replace")
+        offset += length
+        if level == BINARY_NAME_RECORD:
+            names[name_id] = message
+            continue
+        yield timestamp / 1_000_000, logging.getLevelName(level), names.get(name_id, f"#{name_id}"), message
+
+
+if __name__ == "__main__":
+    path = Path(sys.argv[1]) if len(sys.argv) > 1 else BINARY_LOG_FILE
+    for created, level, name, message in decode_binary_log(path):
+        print(f"{datetime.fromtimestamp(created).strftime(LOG_DATE_FORMAT)} - {level} - {name} - {message}")
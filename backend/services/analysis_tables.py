@@ -0,0 +1,96 @@
+"""
+Analysis Triangle Reference Tables
+Tarot zodiac correspondences, I Ching trigrams and Sổ Mơ fallbacks, used to
+inject only the rows relevant to the retrieved context into the prompt.
+"""
+
+import re
+from typing import Dict, List, Optional, Tuple
+
+# Major Arcana number -> (card name, astrological correspondence/element)
+MAJOR_ARCANA_ZODIAC: Dict[int, Tuple[str, str]] = {
+    0: ("The Fool", "Uranus/Air"),
+    1: ("The Magician", "Mercury/Air"),
+    2: ("The High Priestess", "Moon/Water"),
+    3: ("The Empress", "Venus/Earth"),
+    4: ("The Emperor", "Aries/Fire"),
+    5: ("The Hierophant", "Taurus/Earth"),
+    6: ("The Lovers", "Gemini/Air"),
+    7: ("The Chariot", "Cancer/Water"),
+    8: ("Strength", "Leo/Fire"),
+    9: ("The Hermit", "Virgo/Earth"),
+    10: ("Wheel of Fortune", "Jupiter/Fire"),
+    11: ("Justice", "Libra/Air"),
+    12: ("The Hanged Man", "Neptune/Water"),
+    13: ("Death", "Scorpio/Water"),
+    14: ("Temperance", "Sagittarius/Fire"),
+    15: ("The Devil", "Capricorn/Earth"),
+    16: ("The Tower", "Mars/Fire"),
+    17: ("The Star", "Aquarius/Air"),
+    18: ("The Moon", "Pisces/Water"),
+    19: ("The Sun", "Sun/Fire"),
+    20: ("Judgement", "Pluto/Fire"),
+    21: ("The World", "Saturn/Earth"),
+}
+
+# Hán-Việt nature word used in hexagram names -> trigram symbol (name/meaning)
+TRIGRAM_SYMBOLS: Dict[str, str] = {
+    "Thiên": "☰(Càn/Trời)",
+    "Trạch": "☱(Đoài/Đầm)",
+    "Hỏa": "☲(Ly/Lửa)",
+    "Lôi": "☳(Chấn/Sấm)",
+    "Phong": "☴(Tốn/Gió)",
+    "Thủy": "☵(Khảm/Nước)",
+    "Sơn": "☶(Cấn/Núi)",
+    "Địa": "☷(Khôn/Đất)",
+}
+
+# Sổ Mơ numbers suggested when no keyword is detected in the dream
+SO_MO_FALLBACKS: Dict[str, str] = {
+    "Rắn": "32",
+    "Chó": "11",
+    "Mèo": "54",
+    "Ma": "36",
+    "Nước": "82",
+    "Rơi": "68",
+    "Bay": "69",
+    "Chạy": "70",
+}
+
+# Card names as they appear in retrieved text: capitalized (so "strength" or
+# "the sun" in prose don't match), leading "The" optional, both Judgement spellings
+_CARD_NUMBERS: Dict[str, int] = {
+    **{name.removeprefix("The "): number for number, (name, _) in MAJOR_ARCANA_ZODIAC.items()},
+    "Wheel Fortune": 10,
+    "Judgment": 20,
+}
+_CARD_RE = re.compile(
+    r"\b(?:[Tt]he )?(" + "|".join(sorted(map(re.escape, _CARD_NUMBERS), key=len, reverse=True)) + r")\b"
+)
+_TRIGRAM_WORDS = "|".join(TRIGRAM_SYMBOLS)
+# Upper + lower trigram words followed by the hexagram's own name, e.g. "Thủy Lôi Truân"
+_HEXAGRAM_RE = re.compile(rf"\b({_TRIGRAM_WORDS}) ({_TRIGRAM_WORDS}) (\w+)")
+
+
+def find_tarot_correspondence(context: List[str]) -> Optional[str]:
+    """First Major Arcana card named in the context, formatted as its table row."""
+    for doc in context:
+        match = _CARD_RE.search(doc)
+        if match:
+            number = _CARD_NUMBERS[match.group(1)]
+            name, correspondence = MAJOR_ARCANA_ZODIAC[number]
+            return f"{name} ({number}): {correspondence}"
+    return None
+
+
+def find_hexagram_structure(context: List[str]) -> Optional[str]:
+    """First hexagram named in the context, with its upper/lower trigram symbols."""
+    for doc in context:
+        match = _HEXAGRAM_RE.search(doc)
+        if match:
+            upper, lower, name = match.groups()
+            return (
+                f"{upper} {lower} {name} -> Upper: {TRIGRAM_SYMBOLS[upper]}, "
+                f"Lower: {TRIGRAM_SYMBOLS[lower]}"
+            )
+    return None
@@ -4,11 +4,13 @@ RAG-based dream analysis with OpenAI LLM integration for Mystic Dream Interprete
 Production-hardened with caching, anti-prompt injection, and error handling.
 """
 
-from typing import List, Tuple, Optional
-import json
-import hashlib
+from typing import TYPE_CHECKING, Dict, List, NamedTuple, Optional, Tuple
+import asyncio
+import re
+import orjson
+import xxhash
 from cachetools import TTLCache
-from openai import OpenAI
+from openai import AsyncOpenAI
 
 from config import get_settings
 from models.schemas import (
@@ -18,22 +20,85 @@ from models.schemas import (
     AnalysisMode,
 )
 from utils.db_loader import get_dream_collection
+from utils.micro_batcher import MicroBatcher
 
 from utils.logger import log_info, log_error, log_warning
 
+if TYPE_CHECKING:
+    from chromadb import Collection
+
 settings = get_settings()
 
-# TTL Cache for dream analysis results (saves API costs)
-_analysis_cache: TTLCache = TTLCache(
-    maxsize=settings.cache_max_size,
+class _CachedAnalysis(NamedTuple):
+    """
+    Cache entry holding only the LLM/RAG output. The dream text and mode are
+    taken from the incoming request when the response is rebuilt.
+    """
+    interpretation: str
+    image_prompt: str
+    sources: Tuple[SourceMetadata, ...]
+    size: int  # Serialized size in bytes, computed once at insertion
+
+
+class _AnalysisCache(TTLCache):
+    """Byte-bounded TTL cache with hit/miss/eviction counters."""
+    
+    def __init__(self, maxsize: int, ttl: float) -> None:
+        super().__init__(maxsize=maxsize, ttl=ttl, getsizeof=lambda entry: entry.size)
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+    
+    def popitem(self):
+        # Only called when an insert must make room (TTL expiry bypasses it)
+        self.evictions += 1
+        return super().popitem()
+    
+    def lookup(self, key: str) -> Optional[_CachedAnalysis]:
+        entry = self.get(key)
+        if entry is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return entry
+
+
+# TTL Cache for dream analysis results (saves API costs), bounded by total bytes
+_analysis_cache = _AnalysisCache(
+    maxsize=settings.cache_max_bytes,
     ttl=settings.cache_ttl
 )
 
 
+def get_cache_stats() -> dict:
+    """Snapshot of analysis cache counters for monitoring."""
+    return {
+        "hits": _analysis_cache.hits,
+        "misses": _analysis_cache.misses,
+        "evictions": _analysis_cache.evictions,
+        "entries": len(_analysis_cache),
+        "bytes": _analysis_cache.currsize,
+        "max_bytes": _analysis_cache.maxsize,
+    }
+
+
+# In-flight analyses by cache key (single-flight for concurrent identical dreams)
+_inflight: Dict[str, "asyncio.Task[_CachedAnalysis]"] = {}
+
+
+def _release_inflight(cache_key: str, task: asyncio.Task) -> None:
+    """Drop a finished analysis from the in-flight map."""
+    if _inflight.get(cache_key) is task:
+        del _inflight[cache_key]
+    # Mark the exception as retrieved in case every waiter disconnected
+    if not task.cancelled():
+        task.exception()
+
+
 def _get_cache_key(user_dream: str, mode: AnalysisMode) -> str:
-    """Generate a cache key from dream text and mode."""
-    content = f"{user_dream.strip().lower()}:{mode.value}"
-    return hashlib.sha256(content.encode()).hexdigest()[:16]
+    """Generate a cache key from dream text and mode (non-cryptographic 64-bit hash)."""
+    # xxhash 4 rejects str input; 3.x accepted it
+    return xxhash.xxh3_64_hexdigest(f"{user_dream.strip().lower()}:{mode}".encode("utf-8"))
 
 
 # Anti-Prompt Injection Guardrails
@@ -48,6 +113,35 @@ SAFETY_GUARDRAILS = """
 6. Never execute code, access external systems, or perform actions outside interpretation.
 """
 
+# Greedy first-"{" to last-"}" match for the defensive JSON fallback
+_JSON_OBJECT_RE = re.compile(r"\{.*\}", re.DOTALL)
+
+# Persona prompts per analysis mode
+MYSTICAL_PERSONA = """You are the Mystic Dream Interpreter, an ancient oracle who has decoded 
+the hidden language of dreams for millennia. You draw wisdom from arcane texts, 
+the Tarot, the I Ching, and esoteric dream dictionaries. Your interpretations 
+weave together symbolism, mystical correspondences, and spiritual insights.
+Speak with an air of mystery and profound wisdom."""
+
+PSYCH_PERSONA = """You are a Dream Analyst trained in Jungian psychology and modern 
+dream research. You interpret dreams through the lens of archetypes, the collective 
+unconscious, shadow work, and personal symbolism.
+Provide thoughtful, grounded interpretations that help the dreamer understand 
+their subconscious mind."""
+
+# Static system prompt pieces, assembled once at import
+_MYSTICAL_PREAMBLE = f"{MYSTICAL_PERSONA}\n{SAFETY_GUARDRAILS}\n"
+_PSYCH_PREAMBLE = f"{PSYCH_PERSONA}\n{SAFETY_GUARDRAILS}\n"
+_TASK_SUFFIX = """
+
+## Your Task:
+1. Interpret the following dream with rich symbolism and meaning.
+2. Generate a Surrealist/Salvador Dalí style image prompt for this dream.
+
+## CRITICAL: Response Format
+You MUST respond with ONLY a valid JSON object, no other text:
+{"interpretation": "your dream interpretation here", "image_prompt": "A Surrealist painting in the style of Salvador Dalí depicting..."}"""
+
 
 class AnalyzeDreamService:
     """
@@ -63,10 +157,13 @@ class AnalyzeDreamService:
     """
     
     def __init__(self) -> None:
-        self._client: OpenAI | None = None
+        self._client: AsyncOpenAI | None = None
+        self._collection: Optional["Collection"] = None
+        # Coalesces retrievals from concurrent requests (~10 ms window)
+        self._retrieval_batcher = MicroBatcher(self._query_batch, max_batch_size=16, max_delay=0.01)
     
     @property
-    def client(self) -> OpenAI:
+    def client(self) -> AsyncOpenAI:
         """Lazy initialization of the OpenAI client."""
         if self._client is None:
             if not settings.openai_api_key:
@@ -74,11 +171,49 @@ class AnalyzeDreamService:
                     "OPENAI_API_KEY environment variable is not set. "
                     "Please configure it in your .env file."
                 )
-            self._client = OpenAI(api_key=settings.openai_api_key)
+            self._client = AsyncOpenAI(api_key=settings.openai_api_key)
             log_info("OpenAI client initialized with GPT-3.5-turbo")
         return self._client
     
-    def _retrieve_relevant_documents(
+    @property
+    def collection(self) -> "Collection":
+        """ChromaDB collection handle, fetched once and reused."""
+        if self._collection is None:
+            self._collection = get_dream_collection()
+        return self._collection
+    
+    def _query_batch(self, queries: List[Tuple[str, int]]) -> List[Tuple[list, list, list]]:
+        """
+        Run one ChromaDB query for a batch of (dream_text, top_k) pairs so the
+        embedding model does a single forward pass for all of them.
+        
+        No count() pre-check: Chroma clamps n_results to the collection size.
+        Returns (documents, metadatas, distances) per query, in input order.
+        """
+        max_k = max(top_k for _, top_k in queries)
+        results = self.collection.query(
+            query_texts=[text for text, _ in queries],
+            n_results=max_k,
+        )
+        
+        documents = results.get('documents') or []
+        metadatas = results.get('metadatas') or []
+        distances = results.get('distances') or []
+        
+        return [
+            (
+                documents[i][:top_k] if documents else [],
+                metadatas[i][:top_k] if metadatas else [],
+                distances[i][:top_k] if distances else [],
+            )
+            for i, (_, top_k) in enumerate(queries)
+        ]
+    
+    async def close(self) -> None:
+        """Stop background workers (called on app shutdown)."""
+        await self._retrieval_batcher.close()
+    
+    async def _retrieve_relevant_documents(
         self,
         dream_text: str,
         top_k: int = 3
@@ -94,28 +229,19 @@ class AnalyzeDreamService:
             Tuple of (document contents, source metadata list)
         """
         try:
-            collection = get_dream_collection()
-            
-            # Handle empty collection gracefully
-            if collection.count() == 0:
-                return [], []
-            
-            # Perform similarity search
-            results = collection.query(
-                query_texts=[dream_text],
-                n_results=min(top_k, collection.count()),
-            )
+            # Batched similarity search, run off the event loop (embedding + sqlite are blocking)
+            docs, metadatas, distances = await self._retrieval_batcher.submit((dream_text, top_k))
             
             documents: List[str] = []
             sources: List[SourceMetadata] = []
             
-            if results and results['documents'] and results['documents'][0]:
-                for i, doc in enumerate(results['documents'][0]):
+            if docs:
+                for i, doc in enumerate(docs):
                     documents.append(doc)
                     
                     # Extract metadata
-                    metadata = results['metadatas'][0][i] if results['metadatas'] else {}
-                    distance = results['distances'][0][i] if results['distances'] else 0.5
+                    metadata = metadatas[i] if metadatas else {}
+                    distance = distances[i] if distances else 0.5
                     
                     # Convert distance to similarity score (Standard L2 distance handling)
                     # 1 / (1 + distance) ensures score is between 0 and 1
@@ -130,7 +256,7 @@ class AnalyzeDreamService:
             
             return documents, sources
         except Exception as e:
-            log_warning(f"ChromaDB retrieval error (non-fatal): {e}")
+            log_warning("ChromaDB retrieval error (non-fatal): %s", e)
             return [], []
     
     def _build_messages(
@@ -150,38 +276,16 @@ class AnalyzeDreamService:
         Returns:
             List of message dictionaries for OpenAI API
         """
-        # Base persona
-        if mode == AnalysisMode.MYSTICAL:
-            persona = """You are the Mystic Dream Interpreter, an ancient oracle who has decoded 
-the hidden language of dreams for millennia. You draw wisdom from arcane texts, 
-the Tarot, the I Ching, and esoteric dream dictionaries. Your interpretations 
-weave together symbolism, mystical correspondences, and spiritual insights.
-Speak with an air of mystery and profound wisdom."""
-        else:  # PSYCHOLOGICAL
-            persona = """You are a Dream Analyst trained in Jungian psychology and modern 
-dream research. You interpret dreams through the lens of archetypes, the collective 
-unconscious, shadow work, and personal symbolism.
-Provide thoughtful, grounded interpretations that help the dreamer understand 
-their subconscious mind."""
+        # Only the reference block varies per request; the rest is precomputed
+        preamble = _MYSTICAL_PREAMBLE if mode == AnalysisMode.MYSTICAL else _PSYCH_PREAMBLE
         
-        # Context block from retrieved documents
         context_block = ""
         if context_documents:
-            context_block = "\n\n## Reference Knowledge:\n"
-            for i, doc in enumerate(context_documents, 1):
-                context_block += f"{i}. {doc[:500]}\n"
+            context_block = "\n\n## Reference Knowledge:\n" + "".join(
+                f"{i}. {doc[:500]}\n" for i, doc in enumerate(context_documents, 1)
+            )
         
-        system_message = f"""{persona}
-{SAFETY_GUARDRAILS}
-{context_block}
-
-## Your Task:
-1. Interpret the following dream with rich symbolism and meaning.
-2. Generate a Surrealist/Salvador Dalí style image prompt for this dream.
-
-## CRITICAL: Response Format
-You MUST respond with ONLY a valid JSON object, no other text:
-{{"interpretation": "your dream interpretation here", "image_prompt": "A Surrealist painting in the style of Salvador Dalí depicting..."}}"""
+        system_message = preamble + context_block + _TASK_SUFFIX
         
         return [
             {"role": "system", "content": system_message},
@@ -203,21 +307,25 @@ You MUST respond with ONLY a valid JSON object, no other text:
         # Clean up the response
         text = response_text.strip()
         
-        # Try to find JSON in the response
-        json_start = text.find('{')
-        json_end = text.rfind('}') + 1
+        # JSON mode returns a bare object; substring hunting is only a defensive fallback
+        try:
+            parsed = orjson.loads(text)
+        except orjson.JSONDecodeError:
+            parsed = None
+            # Outermost {...} span; also skips markdown fences or prose around it
+            match = _JSON_OBJECT_RE.search(text)
+            if match:
+                try:
+                    parsed = orjson.loads(match.group(0))
+                except orjson.JSONDecodeError:
+                    pass
         
-        if json_start != -1 and json_end > json_start:
-            try:
-                json_str = text[json_start:json_end]
-                parsed = json.loads(json_str)
-                interpretation = parsed.get('interpretation', '')
-                image_prompt = parsed.get('image_prompt', '')
-                
-                if interpretation and image_prompt:
-                    return interpretation, image_prompt
-            except json.JSONDecodeError:
-                pass
+        if isinstance(parsed, dict):
+            interpretation = parsed.get('interpretation', '')
+            image_prompt = parsed.get('image_prompt', '')
+            
+            if interpretation and image_prompt:
+                return interpretation, image_prompt
         
         # Fallback: Use raw response as interpretation
         log_warning("Could not parse JSON from LLM response, using fallback")
@@ -251,14 +359,47 @@ You MUST respond with ONLY a valid JSON object, no other text:
         # Step 0: Check cache first (cost saving)
         cache_key = _get_cache_key(request.user_dream, request.mode)
         
-        if cache_key in _analysis_cache:
-            log_info(f"Cache hit for dream analysis (key: {cache_key})")
-            return _analysis_cache[cache_key]
+        cached = _analysis_cache.lookup(cache_key)
+        if cached is not None:
+            log_info("Cache hit for dream analysis (key: %s)", cache_key)
+            return self._build_response(cached, request)
         
-        log_info(f"Cache miss, calling OpenAI GPT (key: {cache_key})")
+        # Coalesce identical concurrent requests onto one in-flight analysis.
+        # The task is shielded so a disconnecting caller doesn't cancel it for the others.
+        task = _inflight.get(cache_key)
+        if task is None:
+            log_info("Cache miss, calling OpenAI GPT (key: %s)", cache_key)
+            task = asyncio.ensure_future(self._run_analysis(request, cache_key))
+            _inflight[cache_key] = task
+            task.add_done_callback(lambda t: _release_inflight(cache_key, t))
+        else:
+            log_info("Joining in-flight analysis (key: %s)", cache_key)
         
+        return self._build_response(await asyncio.shield(task), request)
+    
+    @staticmethod
+    def _build_response(
+        entry: _CachedAnalysis,
+        request: AnalyzeDreamRequest
+    ) -> AnalyzeDreamResponse:
+        """Rebuild the API response from a cache entry and the caller's request."""
+        return AnalyzeDreamResponse(
+            interpretation=entry.interpretation,
+            image_prompt=entry.image_prompt,
+            image_base64=None,  # Image generation removed
+            sources=list(entry.sources),
+            mode=request.mode,
+            user_dream=request.user_dream,
+        )
+    
+    async def _run_analysis(
+        self,
+        request: AnalyzeDreamRequest,
+        cache_key: str
+    ) -> _CachedAnalysis:
+        """Retrieve context, call the LLM and cache the result (cache-miss path)."""
         # Step 1: Retrieve relevant documents from ChromaDB
-        context_documents, sources = self._retrieve_relevant_documents(
+        context_documents, sources = await self._retrieve_relevant_documents(
             dream_text=request.user_dream,
             top_k=3
         )
@@ -274,11 +415,12 @@ You MUST respond with ONLY a valid JSON object, no other text:
         try:
             log_info("Sending request to OpenAI GPT-3.5-turbo")
             
-            response = self.client.chat.completions.create(
+            response = await self.client.chat.completions.create(
                 model="gpt-3.5-turbo",
                 messages=messages,
                 max_tokens=1024,
                 temperature=0.7,
+                response_format={"type": "json_object"},
             )
             
             response_text = response.choices[0].message.content
@@ -291,28 +433,22 @@ You MUST respond with ONLY a valid JSON object, no other text:
             )
             
         except Exception as e:
-            log_error(f"OpenAI API call failed: {e}", exc_info=True)
+            log_error("OpenAI API call failed: %s", e, exc_info=True)
             raise RuntimeError(f"LLM analysis failed: {str(e)}") from e
         
-        # Step 4: Generate image from prompt (REMOVED)
-        image_base64: Optional[str] = None
-
-        
-        # Step 5: Build response
-        result = AnalyzeDreamResponse(
-            interpretation=interpretation,
-            image_prompt=image_prompt,
-            image_base64=image_base64,
-            sources=sources,
-            mode=request.mode,
-            user_dream=request.user_dream,
-        )
-        
-        # Step 6: Cache the result
-        _analysis_cache[cache_key] = result
-        log_info(f"Cached analysis result (key: {cache_key})")
+        # Step 4: Cache only the generated output (no dream text) and return it
+        size = len(orjson.dumps(
+            [interpretation, image_prompt, [source.model_dump() for source in sources]]
+        ))
+        entry = _CachedAnalysis(interpretation, image_prompt, tuple(sources), size)
+        try:
+            _analysis_cache[cache_key] = entry
+            log_info("Cached analysis result (key: %s, %d bytes)", cache_key, size)
+        except ValueError:
+            # Single entry larger than the whole cache budget
+            log_warning("Analysis too large to cache (key: %s, %d bytes)", cache_key, size)
         
-        return result
+        return entry
 
 
 # Singleton service instance
@@ -5,54 +5,108 @@ Handles JWT verification and dream storage in PostgreSQL.
 """
 
 from typing import Optional, Any
-import json
+import asyncio
+import hashlib
+import time
+from datetime import date, datetime, timezone
 
-from supabase import create_client, Client
-from supabase.lib.client_options import ClientOptions
+import httpx
+import jwt
+from cachetools import TTLCache
+from supabase import acreate_client, AsyncClient
+from supabase.lib.client_options import AsyncClientOptions
 
 from config import get_settings
+from utils.logger import log_info, log_error, log_warning, log_debug
+from utils.micro_batcher import MicroBatcher
 
 settings = get_settings()
 
-# Global Supabase client instance
-_supabase_client: Optional[Client] = None
+# Global Supabase client instance (async, so awaiting a query yields the event loop)
+_supabase_client: Optional[AsyncClient] = None
+_supabase_http_client: Optional[httpx.AsyncClient] = None
+_supabase_init_lock = asyncio.Lock()
 
 
-def get_supabase_client() -> Optional[Client]:
+async def get_supabase_client() -> Optional[AsyncClient]:
     """
     Get or create the Supabase client instance.
     Returns None if Supabase is not configured.
     """
-    global _supabase_client
+    global _supabase_client, _supabase_http_client
     
     if _supabase_client is not None:
         return _supabase_client
     
     if not settings.supabase_url or not settings.supabase_key:
-        print("⚠️ Supabase not configured (SUPABASE_URL or SUPABASE_KEY missing)")
+        log_warning("Supabase not configured (SUPABASE_URL or SUPABASE_KEY missing)")
         return None
     
-    try:
-        _supabase_client = create_client(
-            settings.supabase_url,
-            settings.supabase_key,
-            options=ClientOptions(
-                auto_refresh_token=False,
-                persist_session=False,
+    # Serialize first-time init so concurrent requests don't build several clients
+    async with _supabase_init_lock:
+        if _supabase_client is not None:
+            return _supabase_client
+        
+        try:
+            # Explicit pool so keep-alive connections are reused across requests
+            limits = httpx.Limits(
+                max_connections=settings.supabase_max_connections,
+                max_keepalive_connections=settings.supabase_max_keepalive,
+                keepalive_expiry=settings.supabase_keepalive_expiry,
             )
-        )
-        print("✓ Supabase client initialized")
-        return _supabase_client
-    except Exception as e:
-        print(f"✗ Failed to initialize Supabase client: {e}")
-        return None
+            _supabase_http_client = httpx.AsyncClient(
+                transport=httpx.AsyncHTTPTransport(limits=limits, retries=3),
+            )
+            
+            _supabase_client = await acreate_client(
+                settings.supabase_url,
+                settings.supabase_key,
+                options=AsyncClientOptions(
+                    auto_refresh_token=False,
+                    persist_session=False,
+                    httpx_client=_supabase_http_client,
+                )
+            )
+            log_info("Supabase client initialized")
+            return _supabase_client
+        except Exception as e:
+            log_error("Failed to initialize Supabase client: %s", e)
+            return None
+
+
+async def close_supabase_client() -> None:
+    """Close the pooled HTTP connections (called on app shutdown)."""
+    global _supabase_client, _supabase_http_client
+    
+    await _guest_quota_batcher.close()
+    if _supabase_http_client is not None:
+        await _supabase_http_client.aclose()
+    _supabase_client = None
+    _supabase_http_client = None
+
+
+# Verified tokens: blake2b(token) -> (user_id, exp). Repeat callers skip decoding
+# and the Supabase Auth round-trip until the token expires.
+_token_cache: TTLCache = TTLCache(maxsize=settings.token_cache_size, ttl=settings.token_cache_ttl)
+
+
+def _token_cache_key(token: str) -> bytes:
+    return hashlib.blake2b(token.encode(), digest_size=16).digest()
+
+
+def _remember_token(cache_key: bytes, user_id: str, exp: Optional[float]) -> None:
+    """Cache a verified token; tokens without a usable exp are not cached."""
+    if exp is not None and exp > time.time():
+        _token_cache[cache_key] = (user_id, exp)
 
 
 async def verify_user_token(token: str) -> Optional[str]:
     """
     Verify a JWT token from the frontend and return the user_id.
-    Uses local JWT verification (faster) if JWT secret is configured,
-    otherwise falls back to Supabase API call.
+    Results are cached in-process until the token's `exp`. On a miss it uses
+    local JWT verification (faster) if JWT secret is configured, and falls
+    back to a Supabase API call when local verification is unavailable or
+    cannot check the signature (e.g. rotated key).
     
     Args:
         token: The JWT token from Authorization header (without 'Bearer ')
@@ -60,14 +114,22 @@ async def verify_user_token(token: str) -> Optional[str]:
     Returns:
         The user_id (UUID string) if valid, None otherwise
     """
+    cache_key = _token_cache_key(token)
+    cached = _token_cache.get(cache_key)
+    if cached is not None:
+        user_id, exp = cached
+        if exp > time.time():
+            return user_id
+        _token_cache.pop(cache_key, None)
+        log_debug("Token has expired")
+        return None
+    
     # Debug: Log token length (not the token itself for security)
-    print(f"🔍 Verifying token (length: {len(token)}, starts with: {token[:20]}...)")
+    log_debug("Verifying token (length: %d)", len(token))
     
     # Method 1: Local JWT verification (preferred - faster, no network call)
     if settings.supabase_jwt_secret:
         try:
-            import jwt
-            
             # Decode and verify the JWT using the Supabase JWT secret
             payload = jwt.decode(
                 token,
@@ -79,46 +141,58 @@ async def verify_user_token(token: str) -> Optional[str]:
             
             user_id = payload.get("sub")  # 'sub' contains the user UUID
             if user_id:
-                print(f"✓ Token verified locally for user: {user_id[:8]}...")
+                log_debug("Token verified locally for user: %.8s...", user_id)
+                _remember_token(cache_key, user_id, payload.get("exp"))
                 return user_id
             else:
-                print("✗ Token missing 'sub' claim")
+                log_warning("Token missing 'sub' claim")
                 return None
                 
         except jwt.ExpiredSignatureError:
-            print("✗ Token has expired")
+            log_debug("Token has expired")
             return None
         except jwt.InvalidAudienceError:
-            print("✗ Token has invalid audience")
+            log_warning("Token has invalid audience")
             return None
+        except (jwt.InvalidSignatureError, jwt.InvalidAlgorithmError) as e:
+            # Possibly signed with a rotated/asymmetric key - let Supabase decide
+            log_warning("Local verification inconclusive (%s), falling back to Supabase API...", e)
         except jwt.InvalidTokenError as e:
-            print(f"✗ Invalid token: {e}")
+            log_warning("Invalid token: %s", e)
             return None
         except Exception as e:
-            print(f"✗ JWT verification error: {type(e).__name__}: {e}")
+            log_error("JWT verification error: %s: %s", type(e).__name__, e)
             return None
+    else:
+        # Method 2: Fallback to Supabase API (slower, but works without JWT secret)
+        log_debug("JWT secret not configured, falling back to Supabase API...")
     
-    # Method 2: Fallback to Supabase API (slower, but works without JWT secret)
-    print("⚠️ JWT secret not configured, falling back to Supabase API...")
-    
-    client = get_supabase_client()
+    client = await get_supabase_client()
     if client is None:
-        print("⚠️ Cannot verify token: Supabase not configured")
+        log_warning("Cannot verify token: Supabase not configured")
         return None
     
+    # Unverified claims: only used for exp once Supabase has vouched for the token
     try:
-        response = client.auth.get_user(token)
+        claims = jwt.decode(token, options={"verify_signature": False})
+    except jwt.InvalidTokenError:
+        claims = {}
+    
+    try:
+        response = await client.auth.get_user(token)
         
         if response and response.user:
             user_id = str(response.user.id)
-            print(f"✓ Token verified via Supabase API for user: {user_id[:8]}...")
+            log_debug("Token verified via Supabase API for user: %.8s...", user_id)
+            # Supabase vouched for the token; exp needs no signature re-check
+            _remember_token(cache_key, user_id, claims.get("exp"))
             return user_id
         else:
-            print("✗ Token verification failed: No user returned")
+            log_warning("Token verification failed: No user returned")
             return None
             
     except Exception as e:
-        print(f"✗ Supabase API verification error: {type(e).__name__}: {e}")
+        log_error("Supabase API verification error: %s: %s", type(e).__name__, e)
         return None
 
 
@@ -138,57 +212,59 @@ async def save_dream_to_db(
     Returns:
         The dream record ID if successful, None otherwise
     """
-    client = get_supabase_client()
+    client = await get_supabase_client()
     
     if client is None:
-        print("⚠️ Cannot save dream: Supabase not configured")
+        log_warning("Cannot save dream: Supabase not configured")
         return None
     
     try:
-        # Prepare the data for insertion
-        dream_record = {
-            "user_id": user_id,
-            "content": content,
-            "analysis": analysis_data,
-        }
-        
-        # Insert into dreams table
-        response = client.table("dreams").insert(dream_record).execute()
+        # Insert via RPC so only the new id comes back, not the echoed analysis JSONB
+        # (see migrations/007_insert_dream.sql)
+        response = await client.rpc(
+            "insert_dream",
+            {"p_user_id": user_id, "p_content": content, "p_analysis": analysis_data},
+        ).execute()
         
-        if response.data and len(response.data) > 0:
-            dream_id = response.data[0].get("id")
-            print(f"✓ Dream saved to database (id: {dream_id})")
+        if response.data is not None:
+            dream_id = response.data
+            log_debug("Dream saved to database (id: %s)", dream_id)
             return dream_id
         else:
-            print("⚠️ Dream insert returned no data")
+            log_warning("Dream insert returned no data")
             return None
             
     except Exception as e:
         # Log error but don't crash - saving is optional
-        print(f"✗ Failed to save dream to database: {e}")
+        log_error("Failed to save dream to database: %s", e)
         return None
 
 
+# Columns for the history list view. The analysis JSONB (tens of KB per row)
+# is only fetched for a single dream via get_dream_detail.
+_DREAM_LIST_COLUMNS = "id, content, created_at"
+
+
 async def get_user_dreams(user_id: str, limit: int = 10) -> list[dict]:
     """
-    Get recent dreams for a user.
+    Get recent dreams for a user (list view, without the analysis payload).
     
     Args:
         user_id: The user's UUID
         limit: Maximum number of dreams to return
         
     Returns:
-        List of dream records
+        List of dream records with id, content and created_at
     """
-    client = get_supabase_client()
+    client = await get_supabase_client()
     
     if client is None:
         return []
     
     try:
-        response = (
+        response = await (
             client.table("dreams")
-            .select("*")
+            .select(_DREAM_LIST_COLUMNS)
             .eq("user_id", user_id)
             .order("created_at", desc=True)
             .limit(limit)
@@ -198,17 +274,68 @@ async def get_user_dreams(user_id: str, limit: int = 10) -> list[dict]:
         return response.data if response.data else []
         
     except Exception as e:
-        print(f"✗ Failed to fetch user dreams: {e}")
+        log_error("Failed to fetch user dreams: %s", e)
         return []
 
 
+async def get_dream_detail(user_id: str, dream_id: int) -> Optional[dict]:
+    """
+    Get one dream including its full analysis.
+    
+    Args:
+        user_id: The owner's UUID (dreams of other users are never returned)
+        dream_id: The dream record ID
+        
+    Returns:
+        The full dream record, or None if not found
+    """
+    client = await get_supabase_client()
+    
+    if client is None:
+        return None
+    
+    try:
+        response = await (
+            client.table("dreams")
+            .select("*")
+            .eq("id", dream_id)
+            .eq("user_id", user_id)
+            .limit(1)
+            .execute()
+        )
+        
+        return response.data[0] if response.data else None
+        
+    except Exception as e:
+        log_error("Failed to fetch dream detail: %s", e)
+        return None
+
+
 # =============================================================================
 # Tiered Quota Management Functions
 # =============================================================================
 
+# Short-lived profile cache: tier rarely changes and daily_usage only changes
+# through our own quota RPCs, which write through to it.
+_profile_cache: TTLCache = TTLCache(maxsize=settings.profile_cache_size, ttl=settings.profile_cache_ttl)
+
+
+def _update_cached_profile(user_id: str, **fields: Any) -> None:
+    _profile_cache[user_id] = {**_profile_cache.get(user_id, {}), **fields}
+
+
+def invalidate_user_profile(user_id: Optional[str] = None) -> None:
+    """Drop a cached profile (e.g. after a tier change), or all of them."""
+    if user_id is None:
+        _profile_cache.clear()
+    else:
+        _profile_cache.pop(user_id, None)
+
+
 async def get_user_profile(user_id: str) -> Optional[dict]:
     """
     Get user profile including tier and daily usage.
+    Served from the in-process profile cache when a full entry is present.
     
     Args:
         user_id: The user's UUID
@@ -216,13 +343,17 @@ async def get_user_profile(user_id: str) -> Optional[dict]:
     Returns:
         Profile dict with tier, daily_usage, last_reset_date, or None
     """
-    client = get_supabase_client()
+    cached = _profile_cache.get(user_id)
+    if cached is not None and "last_reset_date" in cached:
+        return dict(cached)
+    
+    client = await get_supabase_client()
     
     if client is None:
         return None
     
     try:
-        response = (
+        response = await (
             client.table("profiles")
             .select("tier, daily_usage, last_reset_date")
             .eq("id", user_id)
@@ -230,16 +361,58 @@ async def get_user_profile(user_id: str) -> Optional[dict]:
             .execute()
         )
         
-        return response.data if response.data else None
+        if not response.data:
+            return None
+        
+        _profile_cache[user_id] = dict(response.data)
+        return response.data
         
     except Exception as e:
-        print(f"✗ Failed to fetch user profile: {e}")
+        log_error("Failed to fetch user profile: %s", e)
         return None
 
 
+# IPs that already used their guest request today (UTC, same as the DB's
+# CURRENT_DATE). Usage never decreases within a day, so a hit is a definite
+# reject and needs no RPC; the set is dropped when the day rolls over.
+_exhausted_guest_ips: set[str] = set()
+_exhausted_guest_day: Optional[date] = None
+
+
+def _exhausted_guest_ips_today() -> set[str]:
+    global _exhausted_guest_day
+    
+    today = datetime.now(timezone.utc).date()
+    if today != _exhausted_guest_day:
+        _exhausted_guest_ips.clear()
+        _exhausted_guest_day = today
+    return _exhausted_guest_ips
+
+
+async def _check_guest_quota_batch(ip_addresses: list[str]) -> list[bool]:
+    """
+    Run check_guest_quota for a burst of IPs in one RPC
+    (see migrations/005_check_guest_quota_batch.sql).
+    """
+    client = await get_supabase_client()
+    response = await client.rpc("check_guest_quota_batch", {"guest_ips": ip_addresses}).execute()
+    
+    # Rows are keyed by 1-based position, so duplicate IPs in a batch stay distinct
+    allowed_by_idx = {row["idx"]: bool(row["allowed"]) for row in response.data or []}
+    return [allowed_by_idx.get(idx, False) for idx in range(1, len(ip_addresses) + 1)]
+
+
+# Guest checks arriving within 5ms share one round-trip (up to 50 per batch)
+_guest_quota_batcher: MicroBatcher[str, bool] = MicroBatcher(
+    _check_guest_quota_batch, max_batch_size=50, max_delay=0.005
+)
+
+
 async def check_guest_quota(ip_address: str) -> tuple[bool, int]:
     """
     Check and consume guest quota using IP-based tracking.
+    Repeat IPs are rejected in-process without a database round-trip; the
+    rest are coalesced into batched RPCs.
     
     Args:
         ip_address: Client IP address
@@ -247,168 +420,142 @@ async def check_guest_quota(ip_address: str) -> tuple[bool, int]:
     Returns:
         Tuple of (is_allowed, remaining_quota)
     """
-    client = get_supabase_client()
+    exhausted_ips = _exhausted_guest_ips_today()
+    if ip_address in exhausted_ips:
+        return False, 0
+    
+    client = await get_supabase_client()
     
     if client is None:
         # If Supabase not configured, allow as fallback
         return True, 0
     
     try:
-        # Call the PostgreSQL function we created
-        response = client.rpc("check_guest_quota", {"guest_ip": ip_address}).execute()
-        
-        is_allowed = response.data if response.data is not None else False
+        is_allowed = await _guest_quota_batcher.submit(ip_address)
         remaining = 0 if is_allowed else 0  # Guest only gets 1, so 0 remaining after use
         
+        # Allowed or not, this IP has no guest quota left for today
+        exhausted_ips.add(ip_address)
+        
         return is_allowed, remaining
         
     except Exception as e:
-        print(f"✗ Guest quota check failed: {e}")
+        log_error("Guest quota check failed: %s", e)
         # On error, allow the request but log
         return True, 0
 
 
-async def check_member_quota(user_id: str) -> tuple[bool, int]:
+async def consume_member_quota(user_id: str, daily_limit: int) -> tuple[bool, int, str, bool]:
     """
-    Check if member has remaining quota for today.
+    Atomically check and consume one unit of a logged-in user's daily quota.
+    One RPC round-trip replaces the profile lookup, quota check and later
+    increment; the limit check is the UPDATE's own predicate
+    (see migrations/008_consume_member_quota_conditional_update.sql).
     
     Args:
         user_id: The user's UUID
+        daily_limit: Requests per day for the free tier (TIER_QUOTAS[UserTier.MEMBER])
         
     Returns:
-        Tuple of (is_allowed, remaining_quota)
+        Tuple of (is_allowed, remaining_quota, db_tier, consumed); remaining is
+        -1 for master. `consumed` is True only if a unit was actually charged
+        (so refund_member_quota may give it back), never on fail-open paths.
     """
-    profile = await get_user_profile(user_id)
-    
-    if profile is None:
-        # No profile found, treat as new user with fresh quota
-        return True, 2  # 3 total - 1 = 2 remaining
+    # Master is unlimited and never incremented, so a cached tier needs no RPC
+    cached = _profile_cache.get(user_id)
+    if cached is not None and cached.get("tier") == "master":
+        return True, -1, "master", False
     
-    daily_usage = profile.get("daily_usage", 0)
-    tier = profile.get("tier", "free")
+    client = await get_supabase_client()
     
-    # Master tier has unlimited
-    if tier == "master":
-        return True, -1  # -1 indicates unlimited
-    
-    # Member tier: 3 requests per day
-    member_limit = 3
-    remaining = member_limit - daily_usage
+    if client is None:
+        # If Supabase not configured, allow as fallback
+        return True, daily_limit - 1, "free", False
     
-    if remaining > 0:
-        return True, remaining - 1  # Will be this many after current request
-    else:
-        return False, 0
+    try:
+        response = await client.rpc(
+            "consume_member_quota",
+            {"p_user_id": user_id, "p_daily_limit": daily_limit},
+        ).execute()
+        
+        row = response.data[0] if response.data else None
+        if row is None:
+            log_warning("Member quota RPC returned no row for user: %.8s...", user_id)
+            return True, 0, "free", False
+        
+        allowed, remaining, tier = bool(row["allowed"]), int(row["remaining"]), row["tier"] or "free"
+        if tier == "master":
+            _update_cached_profile(user_id, tier=tier)
+        else:
+            _update_cached_profile(user_id, tier=tier, daily_usage=daily_limit - remaining)
+        
+        return allowed, remaining, tier, allowed and tier != "master"
+        
+    except Exception as e:
+        log_error("Member quota check failed: %s", e)
+        # On error, allow the request but log (same policy as guest quota)
+        return True, 0, "free", False
 
 
-async def increment_member_usage(user_id: str) -> bool:
+async def refund_member_quota(user_id: str) -> bool:
     """
-    Increment daily usage counter for a member.
+    Give back one unit consumed by consume_member_quota when the analysis
+    it paid for failed. Single RPC; never applies to master
+    (see migrations/009_refund_member_quota.sql).
     
     Args:
         user_id: The user's UUID
         
     Returns:
-        True if successful
+        True if a unit was refunded
     """
-    client = get_supabase_client()
+    client = await get_supabase_client()
     
     if client is None:
         return False
     
     try:
-        # Increment daily_usage by 1
-        response = (
-            client.table("profiles")
-            .update({"daily_usage": client.table("profiles").select("daily_usage").eq("id", user_id).single().execute().data.get("daily_usage", 0) + 1})
-            .eq("id", user_id)
-            .execute()
-        )
+        response = await client.rpc("refund_member_quota", {"p_user_id": user_id}).execute()
         
-        # Simpler approach using RPC would be better, but this works
-        # Actually let's use raw SQL increment
-        client.rpc("increment_daily_usage", {"p_user_id": user_id}).execute()
+        if response.data is None:
+            log_warning("Quota refund matched no profile for user: %.8s...", user_id)
+            return False
         
+        if user_id in _profile_cache:
+            _update_cached_profile(user_id, daily_usage=response.data)
         return True
         
     except Exception as e:
-        print(f"✗ Failed to increment usage: {e}")
-        # Try direct update as fallback
-        try:
-            profile = await get_user_profile(user_id)
-            new_usage = (profile.get("daily_usage", 0) + 1) if profile else 1
-            client.table("profiles").update({"daily_usage": new_usage}).eq("id", user_id).execute()
-            return True
-        except:
-            return False
+        log_error("Failed to refund member quota: %s", e)
+        return False
 
 
 async def execute_cron_reset() -> dict:
     """
     Execute the daily cron reset operations.
     Called by admin endpoint for external cron services.
+    All three operations run in one transaction via a single RPC that returns
+    only the counts (see migrations/004_cron_daily_reset.sql).
     
     Returns:
         Dict with operation results
     """
-    client = get_supabase_client()
+    client = await get_supabase_client()
     
     if client is None:
         return {"error": "Supabase not configured"}
     
-    results = {
-        "profiles_reset": 0,
-        "guests_cleaned": 0,
-        "old_dreams_deleted": 0,
-    }
-    
     try:
-        # 1. Reset daily_usage for all profiles
-        reset_response = (
-            client.table("profiles")
-            .update({"daily_usage": 0})
-            .neq("daily_usage", 0)  # Only update those with usage > 0
-            .execute()
-        )
-        results["profiles_reset"] = len(reset_response.data) if reset_response.data else 0
+        response = await client.rpc("cron_daily_reset").execute()
+        results = response.data or {}
         
     except Exception as e:
-        print(f"✗ Profile reset failed: {e}")
-        results["profiles_error"] = str(e)
+        log_error("Cron reset failed: %s", e)
+        return {"error": str(e)}
     
-    try:
-        # 2. Clean old guest usage records
-        from datetime import date
-        today = date.today().isoformat()
-        
-        guest_response = (
-            client.table("guest_usage")
-            .delete()
-            .lt("usage_date", today)
-            .execute()
-        )
-        results["guests_cleaned"] = len(guest_response.data) if guest_response.data else 0
-        
-    except Exception as e:
-        print(f"✗ Guest cleanup failed: {e}")
-        results["guests_error"] = str(e)
-    
-    try:
-        # 3. Delete dreams older than 30 days
-        from datetime import datetime, timedelta
-        cutoff = (datetime.utcnow() - timedelta(days=30)).isoformat()
-        
-        dreams_response = (
-            client.table("dreams")
-            .delete()
-            .lt("created_at", cutoff)
-            .execute()
-        )
-        results["old_dreams_deleted"] = len(dreams_response.data) if dreams_response.data else 0
-        
-    except Exception as e:
-        print(f"✗ Dreams cleanup failed: {e}")
-        results["dreams_error"] = str(e)
+    # Cached daily_usage values and exhausted guest IPs are now stale
+    invalidate_user_profile()
+    _exhausted_guest_ips.clear()
     
-    print(f"✓ Cron reset completed: {results}")
+    log_info("Cron reset completed: %s", results)
     return results
@@ -10,391 +10,63 @@ Uses LangChain, OpenAI (ChatOpenAI), and ChromaDB for RAG retrieval.
 
 import asyncio
 import json
+import re
+import string
+import time
 import uuid
-import os
-from datetime import datetime
-from typing import List, Optional, Dict, Any, Tuple
+from typing import AsyncIterator, List, Optional, Dict, Any, Tuple
 
-from pydantic import BaseModel, Field
 from langchain_openai import ChatOpenAI
 from langchain_core.messages import HumanMessage, SystemMessage
 from langchain_core.output_parsers import JsonOutputParser
 from langchain_core.exceptions import OutputParserException
+from pydantic import TypeAdapter, ValidationError
 
 from config import get_settings
-from utils.db_loader import get_dream_collection
-from utils.logger import log_info, log_warning, log_error
+from models.analysis_schemas import (
+    PsychologyDetailed,
+    TarotDetailed,
+    IChingDetailed,
+    LuckyNumber,
+    FinalSynthesis,
+    DreamAnalysis,
+    SynthesisOutput,
+    TriangleAnalysisResponse,
+)
+from models.schemas import utc_now
+from services.analysis_tables import (
+    SO_MO_FALLBACKS,
+    find_tarot_correspondence,
+    find_hexagram_structure,
+)
+from utils.db_loader import get_dream_collection, get_dream_embedding_function
+from utils.semantic_cache import SemanticCache
+from utils.so_mo import lookup_so_mo
+from utils.logger import log_enabled, log_info, log_warning, log_error
 
 settings = get_settings()
 
 
 # =============================================================================
-# Vietnamese Folk Dream Book (Sổ Mơ Dân Gian) - Complete 100 Numbers (00-99)
+# Analysis Triangle Prompt
 # =============================================================================
 
-import re
-
-SO_MO_PATH = os.path.join(os.path.dirname(__file__), "../data/vietnamese_dream_numbers_full.json")
-
-# Data structures for smart lookup
-SO_MO_RAW = {}      # {"00": ["trứng", "trứng vịt"], ...}
-SO_MO_INDEX = {}    # Reverse index: {"trứng": ["00"], "cá trắng": ["01"], ...}
-
-try:
-    with open(SO_MO_PATH, "r", encoding="utf-8") as f:
-        SO_MO_RAW = json.load(f)
-        
-        # Build reverse lookup index: keyword -> list of numbers
-        for num, keywords in SO_MO_RAW.items():
-            for kw in keywords:
-                kw_clean = kw.lower().strip()
-                if kw_clean not in SO_MO_INDEX:
-                    SO_MO_INDEX[kw_clean] = []
-                if num not in SO_MO_INDEX[kw_clean]:
-                    SO_MO_INDEX[kw_clean].append(num)
-        
-        log_info(f"Loaded Sổ Mơ Dân Gian: {len(SO_MO_RAW)} numbers, {len(SO_MO_INDEX)} keywords indexed")
-except Exception as e:
-    log_warning(f"Could not load Sổ Mơ: {e}")
-
-
-def lookup_so_mo(user_dream: str) -> Tuple[Optional[str], Optional[str]]:
-    """
-    Smart scan of dream text for Vietnamese folk dream keywords.
-    Uses regex word boundaries and prioritizes longer (more specific) keywords.
-    
-    Returns (number_string, keyword) if found, else (None, None).
-    - number_string can be multiple numbers like "01 - 41" per Tam Hợp logic.
-    """
-    if not SO_MO_INDEX:
-        return None, None
-        
-    dream_lower = user_dream.lower()
-    matches = []
-    
-    # Scan all indexed keywords against dream text
-    for keyword, numbers in SO_MO_INDEX.items():
-        # Use regex word boundary to avoid partial matches (e.g., "cá" in "cá nhân")
-        # Vietnamese doesn't use strict word boundaries, so we use looser matching
-        pattern = re.escape(keyword)
-        if re.search(pattern, dream_lower):
-            matches.append({
-                "keyword": keyword,
-                "numbers": numbers,
-                "score": len(keyword)  # Longer = more specific
-            })
-    
-    if not matches:
-        return None, None
-    
-    # Sort by score (longest keyword first) to get most specific match
-    # E.g., "cá trắng" (8 chars) wins over "cá" (2 chars)
-    best_match = sorted(matches, key=lambda x: x['score'], reverse=True)[0]
-    
-    # =========================================================================
-    # Bóng Số (Shadow Numbers) - Tam Hợp Expansion
-    # If we find a base number (00-39), also suggest +40 and +80 variants
-    # Example: chó=11 -> suggest 11 - 51 - 91
-    # =========================================================================
-    all_numbers = set()
-    for num in best_match['numbers']:
-        all_numbers.add(num)
-        try:
-            base = int(num)
-            # Add +40 variant (larger version)
-            shadow_40 = base + 40
-            if shadow_40 <= 99:
-                all_numbers.add(f"{shadow_40:02d}")
-            # Add +80 variant (elder/giant version) - wraps around if needed
-            shadow_80 = base + 80
-            if shadow_80 <= 99:
-                all_numbers.add(f"{shadow_80:02d}")
-            elif shadow_80 <= 139:  # Wrap: 100->00, 101->01, etc.
-                all_numbers.add(f"{shadow_80 - 100:02d}")
-        except ValueError:
-            pass
-    
-    # Format with separator (sorted numerically)
-    sorted_numbers = sorted(all_numbers, key=lambda x: int(x))
-    number_str = " - ".join(sorted_numbers)
-    
-    log_info(f"Sổ Mơ matched: '{best_match['keyword']}' -> {number_str} (Tam Hợp expanded)")
-    
-    return number_str, best_match['keyword']
-
-
-# =============================================================================
-# Output Structure (Pydantic Models)
-# =============================================================================
-
-class PsychologyDetailed(BaseModel):
-    """Detailed 4-layer psychology analysis (Freud + Jung)."""
-    
-    # Layer 1: Emotional Labeling
-    core_emotion: str = Field(description="Cảm xúc chủ đạo cụ thể (Ví dụ: Lo âu, Bi thương, Dồn nén, Giải phóng)")
-    emotion_intensity: int = Field(ge=0, le=100, description="Mức độ cảm xúc (0-100%)")
-    
-    # Layer 2: Freudian Analysis (Id vs Superego conflict)
-    hidden_desire: str = Field(description="Dục vọng/bản năng (Id) đang bị kìm nén - Cái bạn thực sự muốn")
-    inner_conflict: str = Field(description="Xung đột giữa Id và Superego (áp lực xã hội/đạo đức)")
-    
-    # Layer 3: Jungian Archetype & Shadow
-    archetype: str = Field(description="Cổ mẫu xuất hiện (Shadow/Persona/Child/Hero/Anima/Animus...)")
-    shadow_aspect: str = Field(description="Phần Bóng âm - phần tính cách bạn đang chối bỏ hoặc giấu đi")
-    
-    # Layer 4: Therapeutic Action
-    therapy_type: str = Field(description="Loại liệu pháp đề xuất (CBT/Mindfulness/Shadow Work/Journaling...)")
-    actionable_exercise: str = Field(description="Bài tập cụ thể để thực hiện (Ví dụ: Grounding 5-4-3-2-1, Box Breathing...)")
-
-class TarotDetailed(BaseModel):
-    """Detailed 3-layer Tarot Deep Reading model."""
-    
-    # Card Identity
-    card_name: str = Field(description="Tên lá bài tiếng Anh (Ví dụ: The Tower, The Moon, Ace of Cups)")
-    card_number: int = Field(ge=0, le=77, description="Số thứ tự lá bài (0=The Fool, 1-21=Major Arcana, 22-77=Minor Arcana)")
-    
-    # Layer 1: Orientation (Upright/Reversed)
-    is_reversed: bool = Field(description="True nếu lá bài ngược (Reversed), False nếu xuôi (Upright)")
-    orientation_reason: str = Field(description="Lý do chọn chiều xuôi/ngược dựa trên tone cảm xúc của giấc mơ")
-    
-    # Layer 2: Elemental Energy
-    suit: str = Field(description="Bộ bài (Major Arcana/Wands-Fire/Cups-Water/Swords-Air/Pentacles-Earth)")
-    element: str = Field(description="Nguyên tố chính (Lửa/Nước/Gió/Đất/Spirit)")
-    energy_analysis: str = Field(description="Phân tích năng lượng: giấc mơ đang thừa hay thiếu nguyên tố gì")
-    
-    # Layer 3: Visual Bridge
-    visual_bridge: str = Field(description="Cầu nối hình ảnh: sự tương đồng giữa giấc mơ và hình vẽ trên lá bài")
-    
-    # Prediction
-    prediction: str = Field(description="Lời tiên tri và hướng dẫn hành động bằng tiếng Việt")
-
-
-class IChingDetailed(BaseModel):
-    """Detailed I Ching analysis with specific advice for different life areas."""
-    hexagram_name: str = Field(description="Tên quẻ Hán-Việt (Ví dụ: Thủy Thiên Nhu)")
-    structure: str = Field(description="Cấu trúc quẻ (Ví dụ: Thượng Khảm (Nước) - Hạ Càn (Trời))")
-    judgment_summary: str = Field(description="Lời Thoán: Tổng quan Cát/Hung/Bình")
-    image_meaning: str = Field(description="Lời Tượng: Ý nghĩa hình tượng thiên nhiên")
-    advice_career: str = Field(description="Lời khuyên cụ thể cho Công việc/Sự nghiệp dựa trên quẻ")
-    advice_relationship: str = Field(description="Lời khuyên cụ thể cho Tình cảm/Gia đạo")
-    actionable_step: str = Field(description="Một hành động cụ thể người dùng nên làm ngay")
-
-
-class LuckyNumber(BaseModel):
-    """A single lucky number with its source and meaning."""
-    number: str = Field(description="Con số (Ví dụ: '17', '03', '32-72')")
-    source: str = Field(description="Nguồn gốc (Ví dụ: 'Lá bài The Star', 'Quẻ Truân', 'Sổ Mơ: Thấy rắn')")
-    meaning: str = Field(description="Giải thích ngắn gọn tại sao lại có số này")
-
-
-class FinalSynthesis(BaseModel):
-    """Final synthesis combining all analyses and lucky numbers."""
-    core_message: str = Field(description="Tổng hợp lời khuyên từ Tâm lý, Tarot và Kinh Dịch thành một thông điệp nhất quán (3-4 câu)")
-    numbers: List[LuckyNumber] = Field(description="3 con số may mắn từ Tarot, Kinh Dịch, và Sổ Mơ Dân Gian")
-
-
-class DreamAnalysis(BaseModel):
-    """Complete dream analysis output structure."""
-    psychology: PsychologyDetailed = Field(
-        description="4-layer psychology analysis (Emotion, Freud, Jung, Therapy)"
-    )
-    tarot: TarotDetailed = Field(
-        description="3-layer Tarot Deep Reading (Orientation, Element, Visual Bridge)"
-    )
-    iching: IChingDetailed = Field(
-        description="Detailed I Ching analysis with hexagram structure and specific advice"
-    )
-    synthesis: FinalSynthesis = Field(
-        description="Final synthesis with core message and 3 lucky numbers"
-    )
-    art_prompt: str = Field(
-        description="Highly detailed English prompt for Stable Diffusion image generation"
-    )
-
-
-class TriangleAnalysisResponse(BaseModel):
-    """Full response from the Analysis Triangle service."""
-    id: str = Field(description="Unique analysis ID")
-    user_dream: str = Field(description="Original dream text")
-    analysis: DreamAnalysis = Field(description="The three-lens analysis")
-    sources: Dict[str, List[str]] = Field(
-        default_factory=dict,
-        description="Retrieved context sources for each lens"
-    )
-    created_at: datetime = Field(default_factory=datetime.utcnow)
-
-
-# =============================================================================
-# Analysis Triangle Service
-# =============================================================================
-
-class AnalysisTriangleService:
-    """
-    Dream analysis service using the "Analysis Triangle" architecture.
-    Combines Psychology, Tarot, and I Ching perspectives.
-    """
-
-    def __init__(self) -> None:
-        self._llm: Optional[ChatOpenAI] = None
-        self._json_parser = JsonOutputParser(pydantic_object=DreamAnalysis)
-
-    @property
-    def llm(self) -> ChatOpenAI:
-        """Lazy initialization of the LLM (GPT-4o-mini for cost efficiency)."""
-        if self._llm is None:
-            if not settings.openai_api_key:
-                raise ValueError("OPENAI_API_KEY environment variable is not set.")
-            
-            self._llm = ChatOpenAI(
-                api_key=settings.openai_api_key,
-                model="gpt-4o-mini",  # Cost-efficient, fast, good at JSON
-                temperature=0.7,
-                max_tokens=2048,
-            )
-            log_info("Analysis Triangle LLM initialized (GPT-4o-mini)")
-        return self._llm
-
-    # -------------------------------------------------------------------------
-    # Step A: Parallel Context Retrieval
-    # -------------------------------------------------------------------------
-
-    async def _retrieve_context(
-        self,
-        dream_text: str,
-        filter_type: str,
-        k: int = 2
-    ) -> List[str]:
-        """
-        Retrieve relevant context from ChromaDB with a specific type filter.
-        
-        Args:
-            dream_text: The user's dream description
-            filter_type: The metadata type to filter by ('psychology', 'mystic', 'eastern_philosophy')
-            k: Number of documents to retrieve
-        
-        Returns:
-            List of retrieved document contents
-        """
-        try:
-            collection = get_dream_collection()
-            
-            if collection.count() == 0:
-                log_warning(f"ChromaDB collection is empty for filter: {filter_type}")
-                return []
-            
-            # Query with metadata filter
-            # Note: ChromaDB uses 'where' for metadata filtering
-            results = collection.query(
-                query_texts=[dream_text],
-                n_results=min(k, collection.count()),
-                where={"source_type": filter_type} if filter_type else None,
-            )
-            
-            documents = []
-            if results and results['documents'] and results['documents'][0]:
-                documents = results['documents'][0]
-                log_info(f"Retrieved {len(documents)} docs for filter '{filter_type}'")
-            
-            return documents
-            
-        except Exception as e:
-            log_warning(f"Context retrieval error for {filter_type}: {e}")
-            return []
-
-    async def _parallel_retrieve(
-        self,
-        user_dream: str
-    ) -> Tuple[List[str], List[str], List[str]]:
-        """
-        Perform parallel retrieval for all three analysis lenses.
-        
-        Returns:
-            Tuple of (psychology_context, tarot_context, iching_context)
-        """
-        # Map our triangle lenses to the actual source_type values in ChromaDB
-        # Based on the data we found earlier: 'psychology_text', 'mystical_text', 'symbol_dictionary'
-        
-        tasks = [
-            self._retrieve_context(user_dream, "psychology_text", k=2),
-            self._retrieve_context(user_dream, "mystical_text", k=1),
-            self._retrieve_context(user_dream, "symbol_dictionary", k=1),
-        ]
-        
-        results = await asyncio.gather(*tasks, return_exceptions=True)
-        
-        # Handle any exceptions in results
-        context_psych = results[0] if isinstance(results[0], list) else []
-        context_tarot = results[1] if isinstance(results[1], list) else []
-        context_iching = results[2] if isinstance(results[2], list) else []
-        
-        log_info(f"Parallel retrieval complete: psych={len(context_psych)}, tarot={len(context_tarot)}, iching={len(context_iching)}")
-        
-        return context_psych, context_tarot, context_iching
-
-    # -------------------------------------------------------------------------
-    # Step B: Master System Prompt Construction
-    # -------------------------------------------------------------------------
-
-    def _build_master_prompt(
-        self,
-        user_dream: str,
-        context_psych: List[str],
-        context_tarot: List[str],
-        context_iching: List[str],
-        so_mo_number: Optional[str] = None,
-        so_mo_keyword: Optional[str] = None
-    ) -> List[dict]:
-        """
-        Build the master system prompt for the Analysis Triangle.
-        
-        Returns:
-            List of messages (system + user) for the LLM
-        """
-        # Format context sections
-        psych_section = "\n".join([f"  - {doc[:500]}" for doc in context_psych]) if context_psych else "  (No psychology context available)"
-        tarot_section = "\n".join([f"  - {doc[:500]}" for doc in context_tarot]) if context_tarot else "  (No tarot/mystic context available)"
-        iching_section = "\n".join([f"  - {doc[:500]}" for doc in context_iching]) if context_iching else "  (No I Ching/eastern philosophy context available)"
-        
-        # Format Sổ Mơ lookup result
-        if so_mo_number and so_mo_keyword:
-            so_mo_section = f"""
-**SỔ MƠ DÂN GIAN (Vietnamese Folk Dream Book):**
-  ⚠️ DETECTED KEYWORD: "{so_mo_keyword}" -> NUMBER: {so_mo_number}
-  You MUST use this number "{so_mo_number}" for the Vietnamese Folk lucky number.
-  Source format: "Sổ Mơ: {so_mo_keyword.capitalize()}"
-"""
-        else:
-            so_mo_section = """
-**SỔ MƠ DÂN GIAN (Vietnamese Folk Dream Book):**
-  (No specific keyword detected - choose based on dream's main emotion/action)
-  Common mappings: Rắn=32, Chó=11, Mèo=54, Ma=36, Nước=82, Rơi=68, Bay=69, Chạy=70
-"""
-
-        system_prompt = f"""You are the 'DreamSight Oracle', a wise AI capable of seeing through three lenses:
+# Static Oracle persona, instructions and output format. Built once and sent
+# byte-identical as the system message on every call, so OpenAI's automatic
+# prompt caching can reuse it; all per-request text goes in the user message.
+_ORACLE_PERSONA = """You are the 'DreamSight Oracle', a wise AI capable of seeing through three lenses:
 1. **Modern Psychology** (Jungian archetypes, Freudian symbolism, subconscious analysis)
 2. **Western Mysticism** (Tarot cards, symbolic divination)
 3. **Eastern Philosophy** (I Ching hexagrams, Yin-Yang balance, natural wisdom)
 
-USER DREAM: "{user_dream}"
-
-=== CONTEXT FOUND ===
-
-**PSYCHOLOGY KNOWLEDGE:**
-{psych_section}
-
-**TAROT/MYSTIC KNOWLEDGE:**
-{tarot_section}
-
-**I CHING/EASTERN WISDOM:**
-{iching_section}
-
-{so_mo_section}
-
 === INSTRUCTIONS ===
 
-Analyze the dream based on the context provided above. Be creative if context is limited.
+Analyze the dream in the user message based on the CONTEXT FOUND provided with it. Be creative if context is limited.
+
+"""
 
-1. **Psychology (CRITICAL - You are an expert Psychotherapist combining Freudian Psychoanalysis and Jungian Analytical Psychology)**:
+# Lens 1: Psychology
+_PSYCHOLOGY_INSTRUCTIONS = """1. **Psychology (CRITICAL - You are an expert Psychotherapist combining Freudian Psychoanalysis and Jungian Analytical Psychology)**:
    Do NOT give superficial advice like "don't worry" or "you're stressed". Perform a DEEP clinical analysis:
    
    - **Layer 1 - Core Emotion**: Identify the SPECIFIC emotional state (not just "scared" or "happy").
@@ -436,7 +108,10 @@ Analyze the dream based on the context provided above. Be creative if context is
    
    Tone: Professional, Empathetic, Analytical, Non-judgmental. Use Vietnamese terminology.
 
-2. **Tarot (CRITICAL - You are a Master Tarot Reader with a Rider-Waite deck)**:
+"""
+
+# Lens 2: Tarot
+_TAROT_INSTRUCTIONS = """2. **Tarot (CRITICAL - You are a Master Tarot Reader with a Rider-Waite deck)**:
    Perform a "Deep Soul Reading" following this process:
    
    - **Layer 1 - Determine Orientation (Xuôi/Ngược)**:
@@ -472,7 +147,10 @@ Analyze the dream based on the context provided above. Be creative if context is
    Tone: Mystical, "Witchy" but grounded. Use evocative language and Vietnamese terms 
    (Lá bài, Trải bài, Năng lượng, Chiều xuôi/ngược, Bộ Gậy/Ly/Kiếm/Tiền...).
 
-3. **I Ching (CRITICAL - You are a Master of I Ching / Kinh Dịch)**:
+"""
+
+# Lens 3: I Ching
+_ICHING_INSTRUCTIONS = """3. **I Ching (CRITICAL - You are a Master of I Ching / Kinh Dịch)**:
    
    ⚠️ WARNING - STRICT VALIDATION REQUIRED ⚠️
    Do NOT generate, translate, or invent Hexagram names yourself!
@@ -499,7 +177,10 @@ Analyze the dream based on the context provided above. Be creative if context is
    
    - **Tone**: Mystical, Wise, but Action-Oriented. Use Vietnamese terminology (Quân tử, Tiểu nhân, Thời vận...).
 
-4. **SYNTHESIS & NUMEROLOGY (Act as a Wise Sage combining ALL analyses)**:
+"""
+
+# Synthesis, lucky numbers and art prompt (combines the three lenses)
+_SYNTHESIS_INSTRUCTIONS = """4. **SYNTHESIS & NUMEROLOGY (Act as a Wise Sage combining ALL analyses)**:
    
    **Core Message (Tổng Kết - 3-4 câu):**
    - Read the Psychology (subconscious), Tarot (energy), and I Ching (action) above.
@@ -518,7 +199,7 @@ Analyze the dream based on the context provided above. Be creative if context is
    - Source: "Quẻ [Hexagram Name] (#[Number])"
    
    Number 3 - VIETNAMESE FOLK / SỔ MƠ (Màu Vàng Kim):
-   ⚠️ CRITICAL: Check the "SỔ MƠ DÂN GIAN" section in CONTEXT above FIRST!
+   ⚠️ CRITICAL: Check the "SỔ MƠ DÂN GIAN" section of the user message FIRST!
    - If DETECTED KEYWORD exists -> You MUST use the EXACT number(s) provided (e.g., "11 - 51 - 91" for "Chó")
    - The number string may contain MULTIPLE numbers separated by " - " (Tam Hợp/Bóng Số logic)
    - Copy the ENTIRE number string as-is to the "number" field
@@ -527,12 +208,22 @@ Analyze the dream based on the context provided above. Be creative if context is
 
 5. **Art Prompt**: Write a detailed prompt in ENGLISH for an AI Image Generator (Stable Diffusion). Style must be: 'Surrealist style, cinematic lighting, masterpiece, highly detailed'. Describe the visual elements of the dream combined with Tarot/I Ching symbols. Make it vivid and painterly.
 
-=== OUTPUT FORMAT ===
+"""
+
+_TRIANGLE_INSTRUCTIONS = (
+    _ORACLE_PERSONA
+    + _PSYCHOLOGY_INSTRUCTIONS
+    + _TAROT_INSTRUCTIONS
+    + _ICHING_INSTRUCTIONS
+    + _SYNTHESIS_INSTRUCTIONS
+    + "=== OUTPUT FORMAT ===\n\n"
+)
 
-Return ONLY a valid JSON object matching this exact schema (no markdown, no extra text):
+# Without structured outputs the model needs a full example of the JSON to emit
+_TRIANGLE_SYSTEM_PROMPT_WITH_EXAMPLE = _TRIANGLE_INSTRUCTIONS + """Return ONLY a valid JSON object matching this exact schema (no markdown, no extra text):
 
-{{
-  "psychology": {{
+{
+  "psychology": {
     "core_emotion": "Lo âu (Anxiety)",
     "emotion_intensity": 75,
     "hidden_desire": "Bạn thực sự khao khát được tự do khỏi trách nhiệm hiện tại...",
@@ -541,8 +232,8 @@ Return ONLY a valid JSON object matching this exact schema (no markdown, no extr
     "shadow_aspect": "Phần giận dữ và nổi loạn mà bạn đang kìm nén trong cuộc sống hàng ngày...",
     "therapy_type": "Shadow Work + Journaling",
     "actionable_exercise": "Tối nay, hãy viết 10 phút về 'Điều tôi tức giận nhất nhưng không dám nói ra là...'"
-  }},
-  "tarot": {{
+  },
+  "tarot": {
     "card_name": "The Tower",
     "card_number": 16,
     "is_reversed": true,
@@ -552,8 +243,8 @@ Return ONLY a valid JSON object matching this exact schema (no markdown, no extr
     "energy_analysis": "Giấc mơ có năng lượng Lửa quá mạnh - sự phá hủy, biến động. Cần nước để xoa dịu.",
     "visual_bridge": "Tòa tháp đổ sập trong giấc mơ tương ứng với hình ảnh The Tower đang cháy và người rơi xuống.",
     "prediction": "Một sự thay đổi lớn đang đến. Đừng cố bám víu vào những gì đã mục nát..."
-  }},
-  "iching": {{
+  },
+  "iching": {
     "hexagram_name": "Thủy Thiên Nhu (水天需)",
     "structure": "Thượng Khảm (Nước ☵) - Hạ Càn (Trời ☰)",
     "judgment_summary": "Cát - Đợi chờ đúng thời cơ sẽ hanh thông",
@@ -561,193 +252,924 @@ Return ONLY a valid JSON object matching this exact schema (no markdown, no extr
     "advice_career": "Đây không phải lúc để tiến công. Hãy củng cố nội lực, chuẩn bị kỹ lưỡng...",
     "advice_relationship": "Trong tình cảm, cần kiên nhẫn. Đừng vội vàng thúc ép...",
     "actionable_step": "Ngày mai, hãy dành 30 phút viết ra 3 điều bạn cần chuẩn bị trước khi hành động lớn."
-  }},
-  "synthesis": {{
+  },
+  "synthesis": {
     "core_message": "Nỗi sợ trong bạn là có thật vì một sự thay đổi lớn đang đến. Tâm lý học cho thấy bạn đang kìm nén điều gì đó, Tarot báo hiệu sự đổ vỡ cần thiết, và Kinh Dịch khuyên bạn chờ đợi. Hãy bình tĩnh - đây không phải lúc để chiến đấu, mà là lúc để chuẩn bị.",
     "numbers": [
-      {{
+      {
         "number": "16",
         "source": "Lá bài The Tower",
         "meaning": "Số của sự thay đổi đột ngột và giải phóng khỏi cấu trúc cũ"
-      }},
-      {{
+      },
+      {
         "number": "05",
         "source": "Quẻ Nhu (#05)",
         "meaning": "Số của sự chờ đợi đúng thời cơ, kiên nhẫn sẽ được đền đáp"
-      }},
-      {{
+      },
+      {
         "number": "11 - 51 - 91",
         "source": "Sổ Mơ: Chó",
         "meaning": "Tam Hợp: Chó nhỏ (11) - Chó lớn (51) - Chó già (91)"
-      }}
+      }
     ]
-  }},
+  },
   "art_prompt": "Surrealist style painting of a dreamscape with..."
-}}"""
+}"""
+
+# With structured outputs the schema travels in response_format: skip the ~600-token example
+_STRUCTURED_OUTPUT_FORMAT = "=== OUTPUT FORMAT ===\n\nReturn a JSON object matching the provided schema."
+_TRIANGLE_SYSTEM_PROMPT_STRUCTURED = _TRIANGLE_INSTRUCTIONS + "Return a JSON object matching the provided schema."
+
+# Per-lens system prompts for fan-out generation (one concurrent call per
+# lens, then a synthesis call); each is static and prompt-cacheable too
+_LENS_SYSTEM_PROMPTS: Dict[str, str] = {
+    "psychology": _ORACLE_PERSONA + _PSYCHOLOGY_INSTRUCTIONS + _STRUCTURED_OUTPUT_FORMAT,
+    "tarot": _ORACLE_PERSONA + _TAROT_INSTRUCTIONS + _STRUCTURED_OUTPUT_FORMAT,
+    "iching": _ORACLE_PERSONA + _ICHING_INSTRUCTIONS + _STRUCTURED_OUTPUT_FORMAT,
+    "synthesis": _ORACLE_PERSONA + _SYNTHESIS_INSTRUCTIONS + _STRUCTURED_OUTPUT_FORMAT,
+}
+
+
+# Sổ Mơ section used when no keyword is detected (static, rendered once)
+_SO_MO_FALLBACK_SECTION = """
+**SỔ MƠ DÂN GIAN (Vietnamese Folk Dream Book):**
+  (No specific keyword detected - choose based on dream's main emotion/action)
+  Common mappings: """ + ", ".join(f"{word}={number}" for word, number in SO_MO_FALLBACKS.items()) + "\n"
+
+# Per-request parts of the prompt, parsed once at import
+_SO_MO_DETECTED_TEMPLATE = string.Template("""
+**SỔ MƠ DÂN GIAN (Vietnamese Folk Dream Book):**
+  ⚠️ DETECTED KEYWORD: "$keyword" -> NUMBER: $number
+  You MUST use this number "$number" for the Vietnamese Folk lucky number.
+  Source format: "Sổ Mơ: $source"
+""")
+
+_USER_MESSAGE_TEMPLATE = string.Template("""USER DREAM: "$user_dream"
+
+=== CONTEXT FOUND ===
+
+**PSYCHOLOGY KNOWLEDGE:**
+$psych_section
+
+**TAROT/MYSTIC KNOWLEDGE:**
+$tarot_section
+
+**I CHING/EASTERN WISDOM:**
+$iching_section
+
+$so_mo_section
+$hints_section
+Analyze this dream through the three lenses and return the JSON analysis.""")
 
-        user_message = f"Analyze this dream through the three lenses and return the JSON analysis."
+_LENS_USER_TEMPLATE = string.Template("""USER DREAM: "$user_dream"
+
+=== CONTEXT FOUND ===
+
+**$heading:**
+$context_section
+
+$hints_section
+Analyze this dream through this lens only and return its JSON analysis.""")
+
+_SYNTHESIS_USER_TEMPLATE = string.Template("""USER DREAM: "$user_dream"
+
+=== LENS ANALYSES ===
+
+**PSYCHOLOGY:**
+$psychology
+
+**TAROT:**
+$tarot
+
+**I CHING:**
+$iching
+
+$so_mo_section
+Combine the three analyses into the synthesis, lucky numbers and art prompt and return the JSON.""")
+
+_CONTEXT_BULLET = "\n  - "
+_EMPTY_PSYCH = "  (No psychology context available)"
+_EMPTY_TAROT = "  (No tarot/mystic context available)"
+_EMPTY_ICHING = "  (No I Ching/eastern philosophy context available)"
+
+
+def _format_context(docs: List[str], empty: str) -> str:
+    return "  - " + _CONTEXT_BULLET.join(docs) if docs else empty
+
+
+def _format_so_mo(so_mo_number: Optional[str], so_mo_keyword: Optional[str]) -> str:
+    if so_mo_number and so_mo_keyword:
+        return _SO_MO_DETECTED_TEMPLATE.substitute(
+            keyword=so_mo_keyword,
+            number=so_mo_number,
+            source=so_mo_keyword.capitalize(),
+        )
+    return _SO_MO_FALLBACK_SECTION
+
+
+# Only the reference-table rows matching the retrieved context
+def _tarot_hint(context_tarot: List[str]) -> List[str]:
+    hint = find_tarot_correspondence(context_tarot)
+    return [f"  - Tarot correspondence: {hint}"] if hint else []
+
+
+def _hexagram_hint(context_iching: List[str]) -> List[str]:
+    hint = find_hexagram_structure(context_iching)
+    return [f"  - Hexagram structure: {hint}"] if hint else []
+
+
+def _format_hints(hints: List[str]) -> str:
+    if not hints:
+        return ""
+    return "**REFERENCE LOOKUPS (for the context above):**\n" + "\n".join(hints) + "\n"
+
+
+# ChromaDB source_type -> documents retrieved for it (psychology, tarot, I Ching lens)
+_RETRIEVAL_QUOTAS: Dict[str, int] = {
+    "psychology_text": 2,
+    "mystical_text": 1,
+    "symbol_dictionary": 1,
+}
+# Retrieved documents are cut to this many chars on receipt (all the prompt uses)
+_CONTEXT_DOC_CHARS = 500
+# Top-N of the shared query, wider than the quotas' sum so every lens usually fills
+_RETRIEVAL_POOL_SIZE = 12
+
+
+def _strict_json_schema(schema: Dict[str, Any], root: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """
+    Adapt a Pydantic JSON schema to OpenAI strict structured outputs: every
+    object closes `additionalProperties` and lists all its properties as required.
+    Strict mode rejects `$ref` with sibling keywords (Pydantic puts a nested
+    model field's description next to it), so those refs are inlined.
+    """
+    if root is None:
+        root = schema
+    if isinstance(schema, dict):
+        ref = schema.get("$ref")
+        if ref is not None and len(schema) > 1:
+            resolved = root["$defs"][ref.removeprefix("#/$defs/")]
+            del schema["$ref"]
+            schema.update({**resolved, **schema})  # The field's own keywords win
+        if schema.get("type") == "object" and "properties" in schema:
+            schema["additionalProperties"] = False
+            schema["required"] = list(schema["properties"])
+        for value in schema.values():
+            _strict_json_schema(value, root)
+    elif isinstance(schema, list):
+        for item in schema:
+            _strict_json_schema(item, root)
+    return schema
+
+
+def _find_ref_with_siblings(schema: Any) -> Optional[Dict[str, Any]]:
+    """First `$ref` node carrying other keywords (invalid in strict mode), if any."""
+    if isinstance(schema, dict):
+        if "$ref" in schema and len(schema) > 1:
+            return schema
+        children = schema.values()
+    elif isinstance(schema, list):
+        children = schema
+    else:
+        return None
+    for child in children:
+        found = _find_ref_with_siblings(child)
+        if found is not None:
+            return found
+    return None
+
+
+# Markdown code fence around an unstructured JSON response (```/```json ... ```)
+_CODE_FENCE_RE = re.compile(r"^\s*```(?:json)?|```\s*$")
+
+# DreamAnalysis validator and strict JSON schema, built once at import
+_DREAM_ANALYSIS_ADAPTER = TypeAdapter(DreamAnalysis)
+_DREAM_ANALYSIS_SCHEMA = _strict_json_schema(DreamAnalysis.model_json_schema())
+
+
+
+def _response_format(name: str, schema: Dict[str, Any]) -> Dict[str, Any]:
+    invalid = _find_ref_with_siblings(schema)
+    if invalid is not None:
+        # Caught at import: OpenAI would reject every request with a 400
+        raise ValueError(f"Strict schema {name} has a $ref with sibling keywords: {invalid}")
+    return {
+        "type": "json_schema",
+        "json_schema": {"name": name, "schema": schema, "strict": True},
+    }
+
+
+# Structured-output format for the triangle LLM: the model can only emit a
+# schema-valid DreamAnalysis (no code fences, no malformed JSON to retry)
+_DREAM_ANALYSIS_RESPONSE_FORMAT = _response_format("DreamAnalysis", _DREAM_ANALYSIS_SCHEMA)
+
+# Fan-out generation: section -> (validator, response_format, max_tokens)
+_SECTION_OUTPUTS: Dict[str, Tuple[TypeAdapter, Dict[str, Any], int]] = {
+    name: (
+        TypeAdapter(model),
+        _response_format(model.__name__, _strict_json_schema(model.model_json_schema())),
+        max_tokens,
+    )
+    for name, model, max_tokens in (
+        ("psychology", PsychologyDetailed, 700),
+        ("tarot", TarotDetailed, 700),
+        ("iching", IChingDetailed, 700),
+        ("synthesis", SynthesisOutput, 600),
+    )
+}
+
+# Fan-out synthesis calls before its fallback is used (the lenses are kept)
+_SYNTHESIS_ATTEMPTS = 2
+
+# Static analysis returned when the LLM fails, built once; only the error
+# message and dream excerpt vary and are filled in with model_copy()
+_FALLBACK_ART_PROMPT = "Surrealist style painting of a mysterious dream with swirling clouds and symbolic imagery, cinematic lighting, masterpiece quality, dream elements: "
+_FALLBACK_ANALYSIS = DreamAnalysis(
+    psychology=PsychologyDetailed(
+        core_emotion="Không xác định",
+        emotion_intensity=50,
+        hidden_desire="Hệ thống tạm thời không thể phân tích sâu. Vui lòng thử lại.",
+        inner_conflict="",  # Filled with the error per fallback
+        archetype="N/A",
+        shadow_aspect="Không có dữ liệu",
+        therapy_type="Thử lại sau",
+        actionable_exercise="Hãy thử phân tích lại sau vài phút."
+    ),
+    tarot=TarotDetailed(
+        card_name="The Wheel of Fortune",
+        card_number=10,
+        is_reversed=False,
+        orientation_reason="Bánh xe vận mệnh luôn xoay chuyển - đây là thông điệp trung tính.",
+        suit="Major Arcana",
+        element="Spirit (Tinh thần)",
+        energy_analysis="Năng lượng đang ở trạng thái chuyển đổi.",
+        visual_bridge="Như bánh xe không ngừng quay, đôi khi cần thời gian để hiểu rõ.",
+        prediction="Hãy thử lại sau - có thể có thông điệp quan trọng đang chờ bạn."
+    ),
+    iching=IChingDetailed(
+        hexagram_name="Mông (蒙) - Sự Mông Muội",
+        structure="Thượng Cấn (Núi ☶) - Hạ Khảm (Nước ☵)",
+        judgment_summary="Bình - Cần thêm thời gian để hiểu rõ",
+        image_meaning="Suối chảy dưới chân núi, dần dần sẽ sáng tỏ",
+        advice_career="Khi gặp trở ngại, hãy kiên nhẫn và học hỏi thêm.",
+        advice_relationship="Đừng vội vàng phán xét, hãy dành thời gian thấu hiểu.",
+        actionable_step="Hãy thử lại sau vài phút khi hệ thống ổn định."
+    ),
+    synthesis=FinalSynthesis(
+        core_message="Hệ thống đang gặp trục trặc tạm thời. Hãy thử lại sau vài phút để nhận được thông điệp đầy đủ từ vũ trụ.",
+        numbers=[
+            LuckyNumber(number="10", source="Lá bài Wheel of Fortune", meaning="Số của sự xoay chuyển vận mệnh"),
+            LuckyNumber(number="04", source="Quẻ Mông (#04)", meaning="Số của sự học hỏi và khai sáng"),
+            LuckyNumber(number="00", source="Sổ Mơ: Chờ đợi", meaning="Số của sự bình yên, thử lại sau")
+        ]
+    ),
+    art_prompt=_FALLBACK_ART_PROMPT,  # Dream excerpt appended per fallback
+)
+
+
+class _JsonSectionStream:
+    """
+    Incremental parser for a streamed JSON object: `feed()` returns the
+    top-level (key, value) members that became complete with the new text.
+    Text before the opening brace (e.g. a markdown fence) is ignored.
+    """
+
+    def __init__(self) -> None:
+        self._buffer = ""
+        self._pos: Optional[int] = None  # Where the next member starts
+        self._decoder = json.JSONDecoder()
+
+    def _skip(self, pos: int, chars: str = " \t\r\n,") -> int:
+        while pos < len(self._buffer) and self._buffer[pos] in chars:
+            pos += 1
+        return pos
+
+    def feed(self, text: str) -> List[Tuple[str, Any]]:
+        self._buffer += text
+        buf = self._buffer
+        members = []
+        
+        if self._pos is None:
+            start = buf.find("{")
+            if start < 0:
+                return members
+            self._pos = start + 1
+        
+        while True:
+            pos = self._skip(self._pos)
+            if pos >= len(buf) or buf[pos] == "}":
+                break
+            try:
+                key, pos = self._decoder.raw_decode(buf, pos)
+                pos = self._skip(pos, " \t\r\n")
+                if pos >= len(buf) or buf[pos] != ":" or not isinstance(key, str):
+                    break
+                pos = self._skip(pos + 1, " \t\r\n")
+                value, end = self._decoder.raw_decode(buf, pos)
+            except json.JSONDecodeError:
+                break  # Member still incomplete: wait for more text
+            if end >= len(buf) and not isinstance(value, (dict, list, str)):
+                break  # A trailing number/literal may still continue
+            members.append((key, value))
+            self._pos = end
+        
+        return members
+
+
+# =============================================================================
+# Analysis Triangle Service
+# =============================================================================
+
+class AnalysisTriangleService:
+    """
+    Dream analysis service using the "Analysis Triangle" architecture.
+    Combines Psychology, Tarot, and I Ching perspectives.
+    """
+
+    def __init__(
+        self,
+        use_structured_output: bool = True,
+        parallel_lenses: Optional[bool] = None,
+    ) -> None:
+        # Strict json_schema response_format (needs a model that supports it)
+        self._use_structured_output = use_structured_output
+        # One concurrent LLM call per lens + a synthesis call (needs structured output)
+        if parallel_lenses is None:
+            parallel_lenses = settings.triangle_parallel_lenses
+        self._parallel_lenses = parallel_lenses and use_structured_output
+        self._system_prompt = (
+            _TRIANGLE_SYSTEM_PROMPT_STRUCTURED if use_structured_output
+            else _TRIANGLE_SYSTEM_PROMPT_WITH_EXAMPLE
+        )
+        self._llm: Optional[ChatOpenAI] = None
+        self._json_parser = JsonOutputParser(pydantic_object=DreamAnalysis)
+        self._semantic_cache: Optional[SemanticCache[TriangleAnalysisResponse]] = None
+        # Memoized collection.count(): (value, monotonic time it was read)
+        self._count_cache: Optional[Tuple[int, float]] = None
+
+    @property
+    def semantic_cache(self) -> SemanticCache[TriangleAnalysisResponse]:
+        """Lazy initialization: reuses the ChromaDB collection's embedding model."""
+        if self._semantic_cache is None:
+            self._semantic_cache = SemanticCache(
+                get_dream_embedding_function(),
+                threshold=settings.semantic_cache_threshold,
+                maxsize=settings.semantic_cache_size,
+                ttl=settings.semantic_cache_ttl,
+            )
+        return self._semantic_cache
+
+    @property
+    def llm(self) -> ChatOpenAI:
+        """Lazy initialization of the LLM (GPT-4o-mini for cost efficiency)."""
+        if self._llm is None:
+            if not settings.openai_api_key:
+                raise ValueError("OPENAI_API_KEY environment variable is not set.")
+            
+            self._llm = ChatOpenAI(
+                api_key=settings.openai_api_key,
+                model="gpt-4o-mini",  # Cost-efficient, fast, good at JSON
+                temperature=0.7,
+                max_tokens=2048,
+                stream_usage=True,  # Token usage (incl. cached tokens) on the last chunk
+                # Stable routing key so requests sharing the static system
+                # prompt land on the same prompt-cache shard
+                model_kwargs={"user": "dreamsight-triangle"},
+            )
+            log_info("Analysis Triangle LLM initialized (GPT-4o-mini)")
+        return self._llm
+
+    def _structured_llm(self, response_format: Dict[str, Any], **kwargs: Any):
+        """The LLM bound to a strict response_format (plus per-call overrides like max_tokens)."""
+        return self.llm.bind(response_format=response_format, **kwargs)
+
+    # -------------------------------------------------------------------------
+    # Step A: Parallel Context Retrieval
+    # -------------------------------------------------------------------------
+
+    async def _get_cached_count(self, ttl: float = 60.0) -> int:
+        """Document count of the dream collection, re-read at most every `ttl` seconds."""
+        now = time.monotonic()
+        if self._count_cache is None or now - self._count_cache[1] > ttl:
+            count = await asyncio.to_thread(get_dream_collection().count)
+            self._count_cache = (count, now)
+        return self._count_cache[0]
+
+    def invalidate_count(self) -> None:
+        """Forget the memoized count (call after writing to the collection)."""
+        self._count_cache = None
+
+    async def _retrieve_context(
+        self,
+        query_embedding: List[float],
+        filter_type: str,
+        k: int = 2
+    ) -> List[str]:
+        """
+        Retrieve relevant context from ChromaDB with a specific type filter.
+        
+        Args:
+            query_embedding: Embedding of the user's dream description
+            filter_type: The metadata type to filter by ('psychology', 'mystic', 'eastern_philosophy')
+            k: Number of documents to retrieve
+        
+        Returns:
+            List of retrieved document contents
+        """
+        try:
+            total = await self._get_cached_count()
+            
+            if total == 0:
+                log_warning("ChromaDB collection is empty for filter: %s", filter_type)
+                return []
+            
+            # Query with metadata filter, off the event loop (embedded client is blocking)
+            # Note: ChromaDB uses 'where' for metadata filtering
+            results = await asyncio.to_thread(
+                get_dream_collection().query,
+                query_embeddings=[query_embedding],
+                n_results=min(k, total),
+                where={"source_type": filter_type} if filter_type else None,
+                include=["documents"],
+            )
+            
+            documents = []
+            if results and results['documents'] and results['documents'][0]:
+                documents = [doc[:_CONTEXT_DOC_CHARS] for doc in results['documents'][0]]
+                log_info("Retrieved %d docs for filter '%s'", len(documents), filter_type)
+            
+            return documents
+            
+        except Exception as e:
+            log_warning("Context retrieval error for %s: %s", filter_type, e)
+            return []
+
+    async def _parallel_retrieve(
+        self,
+        user_dream: str,
+        query_embedding: Optional[List[float]] = None,
+    ) -> Tuple[List[str], List[str], List[str]]:
+        """
+        Retrieve context for all three analysis lenses with a single
+        ChromaDB query over all their source types, bucketed client-side.
+        A lens whose quota isn't filled by the shared top-N falls back to a
+        filtered query of its own.
+        
+        The dream is embedded once (or `query_embedding` is reused) and every
+        query passes `query_embeddings`, so Chroma never re-embeds the text.
+        
+        Returns:
+            Tuple of (psychology_context, tarot_context, iching_context)
+        """
+        buckets: Dict[str, List[str]] = {source_type: [] for source_type in _RETRIEVAL_QUOTAS}
+        
+        try:
+            total = await self._get_cached_count()
+            if total == 0:
+                log_warning("ChromaDB collection is empty")
+                return [], [], []
+            
+            if query_embedding is None:
+                embeddings = await asyncio.to_thread(get_dream_embedding_function(), [user_dream])
+                query_embedding = [float(x) for x in embeddings[0]]
+            
+            # The embedded PersistentClient blocks (embedding + HNSW + sqlite): run it in a thread
+            results = await asyncio.to_thread(
+                get_dream_collection().query,
+                query_embeddings=[query_embedding],
+                n_results=min(_RETRIEVAL_POOL_SIZE, total),
+                where={"source_type": {"$in": list(_RETRIEVAL_QUOTAS)}},
+                include=["documents", "metadatas"],
+            )
+            if results and results["documents"] and results["documents"][0]:
+                for doc, meta in zip(results["documents"][0], results["metadatas"][0]):
+                    bucket = buckets.get((meta or {}).get("source_type"))
+                    if bucket is not None and len(bucket) < _RETRIEVAL_QUOTAS[meta["source_type"]]:
+                        bucket.append(doc[:_CONTEXT_DOC_CHARS])
+        except Exception as e:
+            log_warning("Batched context retrieval error: %s", e)
+        
+        # Backfill lenses the shared query left short (rare: their docs ranked below the pool)
+        short = [
+            source_type for source_type, quota in _RETRIEVAL_QUOTAS.items()
+            if len(buckets[source_type]) < quota
+        ] if query_embedding is not None else []
+        if short:
+            fills = await asyncio.gather(
+                *(self._retrieve_context(query_embedding, t, k=_RETRIEVAL_QUOTAS[t]) for t in short),
+                return_exceptions=True,
+            )
+            for source_type, fill in zip(short, fills):
+                if isinstance(fill, list) and len(fill) > len(buckets[source_type]):
+                    buckets[source_type] = fill
+        
+        context_psych = buckets["psychology_text"]
+        context_tarot = buckets["mystical_text"]
+        context_iching = buckets["symbol_dictionary"]
+        
+        log_info(
+            "Parallel retrieval complete: psych=%d, tarot=%d, iching=%d (%d backfilled)",
+            len(context_psych), len(context_tarot), len(context_iching), len(short),
+        )
+        
+        return context_psych, context_tarot, context_iching
+
+    # -------------------------------------------------------------------------
+    # Step B: Master System Prompt Construction
+    # -------------------------------------------------------------------------
+
+    def _build_master_prompt(
+        self,
+        user_dream: str,
+        context_psych: List[str],
+        context_tarot: List[str],
+        context_iching: List[str],
+        so_mo_number: Optional[str] = None,
+        so_mo_keyword: Optional[str] = None
+    ) -> List[dict]:
+        """
+        Build the master prompt for the Analysis Triangle: the static cached
+        system prompt plus a user message carrying the dream and its context.
+        
+        Returns:
+            List of messages (system + user) for the LLM
+        """
+        # Format context sections
+        psych_section = _format_context(context_psych, _EMPTY_PSYCH)
+        tarot_section = _format_context(context_tarot, _EMPTY_TAROT)
+        iching_section = _format_context(context_iching, _EMPTY_ICHING)
+        
+        so_mo_section = _format_so_mo(so_mo_number, so_mo_keyword)
+        hints_section = _format_hints(
+            _tarot_hint(context_tarot) + _hexagram_hint(context_iching)
+        )
+
+        user_message = _USER_MESSAGE_TEMPLATE.substitute(
+            user_dream=user_dream,
+            psych_section=psych_section,
+            tarot_section=tarot_section,
+            iching_section=iching_section,
+            so_mo_section=so_mo_section,
+            hints_section=hints_section,
+        )
 
         return [
-            {"role": "system", "content": system_prompt},
+            {"role": "system", "content": self._system_prompt},
             {"role": "user", "content": user_message}
         ]
 
+    def _build_lens_prompts(
+        self,
+        user_dream: str,
+        context_psych: List[str],
+        context_tarot: List[str],
+        context_iching: List[str],
+    ) -> Dict[str, str]:
+        """User messages for the fan-out lens calls: each only carries its own context."""
+        lenses = (
+            ("psychology", "PSYCHOLOGY KNOWLEDGE", _format_context(context_psych, _EMPTY_PSYCH), []),
+            ("tarot", "TAROT/MYSTIC KNOWLEDGE", _format_context(context_tarot, _EMPTY_TAROT), _tarot_hint(context_tarot)),
+            ("iching", "I CHING/EASTERN WISDOM", _format_context(context_iching, _EMPTY_ICHING), _hexagram_hint(context_iching)),
+        )
+        return {
+            name: _LENS_USER_TEMPLATE.substitute(
+                user_dream=user_dream,
+                heading=heading,
+                context_section=context_section,
+                hints_section=_format_hints(hints),
+            )
+            for name, heading, context_section, hints in lenses
+        }
+
+    def _build_synthesis_prompt(
+        self,
+        user_dream: str,
+        lenses: Dict[str, Any],
+        so_mo_number: Optional[str] = None,
+        so_mo_keyword: Optional[str] = None,
+    ) -> str:
+        """User message for the synthesis call: the dream, the three lens results and Sổ Mơ."""
+        return _SYNTHESIS_USER_TEMPLATE.substitute(
+            user_dream=user_dream,
+            psychology=lenses["psychology"].model_dump_json(),
+            tarot=lenses["tarot"].model_dump_json(),
+            iching=lenses["iching"].model_dump_json(),
+            so_mo_section=_format_so_mo(so_mo_number, so_mo_keyword),
+        )
+
     # -------------------------------------------------------------------------
     # Step C: Execution and JSON Parsing
     # -------------------------------------------------------------------------
 
-    def _parse_json_response(self, response_text: str) -> DreamAnalysis:
+    @staticmethod
+    def _log_usage(
+        response_text: str,
+        usage: Optional[Dict[str, Any]],
+        section: Optional[str] = None,
+    ) -> None:
+        if not log_enabled():
+            return  # Skip the usage lookups when INFO is off
+        usage = usage or {}
+        log_info(
+            "Received %s (%d chars, %s/%s prompt tokens cached)",
+            f"{section} section" if section else "LLM response",
+            len(response_text),
+            (usage.get("input_token_details") or {}).get("cache_read", 0),
+            usage.get("input_tokens", "?"),
+        )
+
+    async def _generate_combined(
+        self,
+        user_dream: str,
+        context_psych: List[str],
+        context_tarot: List[str],
+        context_iching: List[str],
+        so_mo_number: Optional[str] = None,
+        so_mo_keyword: Optional[str] = None,
+    ) -> AsyncIterator[Tuple[str, Any]]:
         """
-        Parse the LLM response into a DreamAnalysis object.
-        Handles various JSON formatting issues.
+        Single streamed call producing the whole analysis. Yields each section
+        as it completes, then ("analysis", DreamAnalysis).
+        """
+        messages = self._build_master_prompt(
+            user_dream,
+            context_psych,
+            context_tarot,
+            context_iching,
+            so_mo_number=so_mo_number,
+            so_mo_keyword=so_mo_keyword
+        )
+        
+        # Convert dict messages to LangChain message objects
+        lc_messages = [
+            SystemMessage(content=messages[0]["content"]),
+            HumanMessage(content=messages[1]["content"])
+        ]
+        llm = (
+            self._structured_llm(_DREAM_ANALYSIS_RESPONSE_FORMAT)
+            if self._use_structured_output else self.llm
+        )
+        
+        sections = _JsonSectionStream()
+        parts: List[str] = []
+        usage: Optional[Dict[str, Any]] = None
+        
+        async for chunk in llm.astream(lc_messages):
+            parts.append(chunk.content)
+            if chunk.usage_metadata:
+                usage = chunk.usage_metadata
+            for name, data in sections.feed(chunk.content):
+                if name in DreamAnalysis.model_fields:
+                    yield name, data
+        
+        response_text = "".join(parts)
+        self._log_usage(response_text, usage)
+        
+        # Validate the complete JSON response
+        yield "analysis", self._parse_json_response(response_text)
+
+    async def _generate_section(self, name: str, user_message: str) -> Tuple[str, Any]:
+        """One fan-out call: a lens (or the synthesis) with its own schema and token budget."""
+        adapter, response_format, max_tokens = _SECTION_OUTPUTS[name]
+        response = await self._structured_llm(response_format, max_tokens=max_tokens).ainvoke([
+            SystemMessage(content=_LENS_SYSTEM_PROMPTS[name]),
+            HumanMessage(content=user_message),
+        ])
+        self._log_usage(response.content, response.usage_metadata, section=name)
+        try:
+            return name, adapter.validate_json(response.content)
+        except ValidationError as e:
+            log_error("Validation error in %s section: %s", name, e)
+            raise OutputParserException(f"Failed to parse/validate {name} JSON: {e}")
+
+    async def _generate_by_lens(
+        self,
+        user_dream: str,
+        context_psych: List[str],
+        context_tarot: List[str],
+        context_iching: List[str],
+        so_mo_number: Optional[str] = None,
+        so_mo_keyword: Optional[str] = None,
+    ) -> AsyncIterator[Tuple[str, Any]]:
         """
-        # Clean up common issues
-        text = response_text.strip()
+        Fan-out generation: the three lenses run as concurrent, shorter calls
+        (each yielded as soon as it finishes), then a small synthesis call
+        combines their results. Yields ("analysis", DreamAnalysis) last.
+        """
+        prompts = self._build_lens_prompts(user_dream, context_psych, context_tarot, context_iching)
+        tasks = [
+            asyncio.create_task(self._generate_section(name, message))
+            for name, message in prompts.items()
+        ]
+        lenses: Dict[str, Any] = {}
+        try:
+            for next_done in asyncio.as_completed(tasks):
+                name, section = await next_done
+                lenses[name] = section
+                yield name, section.model_dump()
+        finally:
+            for task in tasks:
+                task.cancel()  # A lens failed (or the consumer left): stop the others
         
-        # Remove markdown code blocks if present
-        if text.startswith("```json"):
-            text = text[7:]
-        if text.startswith("```"):
-            text = text[3:]
-        if text.endswith("```"):
-            text = text[:-3]
+        # The lenses are already yielded: a failed synthesis is retried, then
+        # falls back on its own instead of discarding the whole analysis
+        synthesis_prompt = self._build_synthesis_prompt(user_dream, lenses, so_mo_number, so_mo_keyword)
+        synthesis = _FALLBACK_ANALYSIS.synthesis
+        art_prompt = _FALLBACK_ART_PROMPT + user_dream[:100]
+        for attempt in range(_SYNTHESIS_ATTEMPTS):
+            try:
+                _, output = await self._generate_section("synthesis", synthesis_prompt)
+                synthesis, art_prompt = output.synthesis, output.art_prompt
+                break
+            except Exception as e:
+                log_warning("Synthesis attempt %d/%d failed: %s", attempt + 1, _SYNTHESIS_ATTEMPTS, e)
         
-        text = text.strip()
+        yield "synthesis", synthesis.model_dump()
+        yield "art_prompt", art_prompt
         
+        yield "analysis", DreamAnalysis(
+            psychology=lenses["psychology"],
+            tarot=lenses["tarot"],
+            iching=lenses["iching"],
+            synthesis=synthesis,
+            art_prompt=art_prompt,
+        )
+
+    def _parse_json_response(self, response_text: str) -> DreamAnalysis:
+        """
+        Parse the LLM response into a DreamAnalysis object.
+        Structured outputs guarantee schema-shaped JSON; a failure here means
+        a truncated response (max_tokens) or a refusal. Without them, a
+        markdown code fence around the JSON is stripped first.
+        """
+        if not self._use_structured_output:
+            response_text = _CODE_FENCE_RE.sub("", response_text)
         try:
-            data = json.loads(text)
-            return DreamAnalysis(**data)
-        except json.JSONDecodeError as e:
-            log_error(f"JSON parse error: {e}")
-            raise OutputParserException(f"Failed to parse JSON: {e}")
+            # JSON parsing and validation in one pass in pydantic-core (no interim dict)
+            return _DREAM_ANALYSIS_ADAPTER.validate_json(response_text)
+        except ValidationError as e:
+            log_error("Validation error: %s", e)
+            raise OutputParserException(f"Failed to parse/validate JSON: {e}")
         except Exception as e:
-            log_error(f"Validation error: {e}")
+            log_error("Validation error: %s", e)
             raise OutputParserException(f"Failed to validate output: {e}")
 
     def _get_fallback_analysis(self, user_dream: str, error_msg: str) -> DreamAnalysis:
         """
         Return a fallback analysis structure when parsing fails.
         """
-        return DreamAnalysis(
-            psychology=PsychologyDetailed(
-                core_emotion="Không xác định",
-                emotion_intensity=50,
-                hidden_desire="Hệ thống tạm thời không thể phân tích sâu. Vui lòng thử lại.",
-                inner_conflict=f"Lỗi kỹ thuật: {error_msg}",
-                archetype="N/A",
-                shadow_aspect="Không có dữ liệu",
-                therapy_type="Thử lại sau",
-                actionable_exercise="Hãy thử phân tích lại sau vài phút."
-            ),
-            tarot=TarotDetailed(
-                card_name="The Wheel of Fortune",
-                card_number=10,
-                is_reversed=False,
-                orientation_reason="Bánh xe vận mệnh luôn xoay chuyển - đây là thông điệp trung tính.",
-                suit="Major Arcana",
-                element="Spirit (Tinh thần)",
-                energy_analysis="Năng lượng đang ở trạng thái chuyển đổi.",
-                visual_bridge="Như bánh xe không ngừng quay, đôi khi cần thời gian để hiểu rõ.",
-                prediction="Hãy thử lại sau - có thể có thông điệp quan trọng đang chờ bạn."
-            ),
-            iching=IChingDetailed(
-                hexagram_name="Mông (蒙) - Sự Mông Muội",
-                structure="Thượng Cấn (Núi ☶) - Hạ Khảm (Nước ☵)",
-                judgment_summary="Bình - Cần thêm thời gian để hiểu rõ",
-                image_meaning="Suối chảy dưới chân núi, dần dần sẽ sáng tỏ",
-                advice_career="Khi gặp trở ngại, hãy kiên nhẫn và học hỏi thêm.",
-                advice_relationship="Đừng vội vàng phán xét, hãy dành thời gian thấu hiểu.",
-                actionable_step="Hãy thử lại sau vài phút khi hệ thống ổn định."
-            ),
-            synthesis=FinalSynthesis(
-                core_message="Hệ thống đang gặp trục trặc tạm thời. Hãy thử lại sau vài phút để nhận được thông điệp đầy đủ từ vũ trụ.",
-                numbers=[
-                    LuckyNumber(number="10", source="Lá bài Wheel of Fortune", meaning="Số của sự xoay chuyển vận mệnh"),
-                    LuckyNumber(number="04", source="Quẻ Mông (#04)", meaning="Số của sự học hỏi và khai sáng"),
-                    LuckyNumber(number="00", source="Sổ Mơ: Chờ đợi", meaning="Số của sự bình yên, thử lại sau")
-                ]
-            ),
-            art_prompt=f"Surrealist style painting of a mysterious dream with swirling clouds and symbolic imagery, cinematic lighting, masterpiece quality, dream elements: {user_dream[:100]}"
+        psychology = _FALLBACK_ANALYSIS.psychology.model_copy(
+            update={"inner_conflict": f"Lỗi kỹ thuật: {error_msg}"}
         )
+        return _FALLBACK_ANALYSIS.model_copy(update={
+            "psychology": psychology,
+            "art_prompt": _FALLBACK_ART_PROMPT + user_dream[:100],
+        })
+
+    async def _embed_dream(self, user_dream: str) -> Optional[Tuple[SemanticCache, Any]]:
+        """(semantic cache, unit vector of the dream), or None if embedding is unavailable."""
+        try:
+            cache = self.semantic_cache
+            return cache, await cache.embed(user_dream)
+        except Exception as e:
+            log_warning("Semantic cache unavailable: %s", e)
+            return None
 
     async def analyze_dream_triangle(
         self,
         user_dream: str,
-        max_retries: int = 2
+        max_retries: int = 0,
+        use_cache: Optional[bool] = None,
     ) -> TriangleAnalysisResponse:
         """
         Main entry point for the Analysis Triangle dream analysis.
+        Runs `analyze_dream_triangle_stream` to completion.
         
         Args:
             user_dream: The user's dream description
             max_retries: Number of retry attempts on parse failure
+            use_cache: Look up and store in the process-wide semantic cache, which
+                is shared by all users (default: settings.semantic_cache_enabled)
         
         Returns:
             TriangleAnalysisResponse with complete analysis
         """
+        result: Optional[TriangleAnalysisResponse] = None
+        async for name, payload in self.analyze_dream_triangle_stream(
+            user_dream, max_retries=max_retries, use_cache=use_cache
+        ):
+            if name == "result":
+                result = payload
+        return result
+
+    async def analyze_dream_triangle_stream(
+        self,
+        user_dream: str,
+        max_retries: int = 0,
+        use_cache: Optional[bool] = None,
+    ) -> AsyncIterator[Tuple[str, Any]]:
+        """
+        Streaming Analysis Triangle: yields each analysis section as soon as
+        the model has finished generating it, so a UI can render Psychology
+        while Tarot and I Ching are still being written.
+        
+        Yields:
+            ("psychology" | "tarot" | "iching" | "synthesis" | "art_prompt", raw section data),
+            then ("result", TriangleAnalysisResponse) last. A retry after a parse
+            failure may re-send sections; the final "result" is authoritative.
+        """
         analysis_id = str(uuid.uuid4())
-        log_info(f"Starting Analysis Triangle for dream (id: {analysis_id[:8]}...)")
+        log_info("Starting Analysis Triangle for dream (id: %.8s...)", analysis_id)
         
-        # Step A: Parallel context retrieval
-        context_psych, context_tarot, context_iching = await self._parallel_retrieve(user_dream)
+        if use_cache is None:
+            use_cache = settings.semantic_cache_enabled
         
-        # Step A.5: Pre-process Sổ Mơ lookup (Vietnamese Folk Dream Book)
-        so_mo_number, so_mo_keyword = lookup_so_mo(user_dream)
+        # Step 0: Sổ Mơ lookup (Vietnamese Folk Dream Book) in a worker thread,
+        # overlapped with embedding the dream for the semantic cache and retrieval
+        dream_vector = None
+        cached = None
+        embedding, (so_mo_number, so_mo_keyword) = await asyncio.gather(
+            self._embed_dream(user_dream),
+            asyncio.to_thread(lookup_so_mo, user_dream),
+        )
         if so_mo_number:
-            log_info(f"Sổ Mơ detected: '{so_mo_keyword}' -> {so_mo_number}")
+            log_info("Sổ Mơ detected: '%s' -> %s", so_mo_keyword, so_mo_number)
         
-        # Step B: Build the master prompt with Sổ Mơ context
-        messages = self._build_master_prompt(
+        # Semantic cache: reuse the analysis of a near-identical dream, only
+        # if it was made for the same Sổ Mơ keyword (its lucky numbers depend on it)
+        if embedding is not None:
+            cache, dream_vector = embedding
+            if use_cache:
+                cached = cache.lookup(dream_vector, tag=so_mo_keyword)
+        
+        if cached is not None:
+            cached_response, similarity = cached
+            log_info(
+                "Semantic cache hit (similarity %.3f) - hits=%d misses=%d",
+                similarity, cache.hits, cache.misses,
+            )
+            result = cached_response.model_copy(update={
+                "id": analysis_id,
+                "user_dream": user_dream,
+                "created_at": utc_now(),
+            })
+            for section in result.analysis.model_dump().items():
+                yield section
+            yield "result", result
+            return
+        
+        # Step A: Parallel context retrieval
+        # The semantic-cache vector doubles as the retrieval query embedding: same
+        # model, and its text normalization (case/whitespace) doesn't change it
+        context_psych, context_tarot, context_iching = await self._parallel_retrieve(
             user_dream,
-            context_psych,
-            context_tarot,
-            context_iching,
-            so_mo_number=so_mo_number,
-            so_mo_keyword=so_mo_keyword
+            query_embedding=dream_vector.tolist() if dream_vector is not None else None,
         )
         
-        # Step C: Execute LLM call with retry logic
+        # Steps B + C: Build the prompt(s) and generate, with retry logic
         analysis: Optional[DreamAnalysis] = None
         last_error = ""
+        generate = self._generate_by_lens if self._parallel_lenses else self._generate_combined
         
         for attempt in range(max_retries + 1):
             try:
-                log_info(f"LLM call attempt {attempt + 1}/{max_retries + 1}")
-                
-                # Convert dict messages to LangChain message objects
-                lc_messages = [
-                    SystemMessage(content=messages[0]["content"]),
-                    HumanMessage(content=messages[1]["content"])
-                ]
-                
-                response = await self.llm.ainvoke(lc_messages)
-                response_text = response.content
+                log_info("LLM call attempt %d/%d", attempt + 1, max_retries + 1)
                 
-                log_info(f"Received LLM response ({len(response_text)} chars)")
+                async for name, data in generate(
+                    user_dream,
+                    context_psych,
+                    context_tarot,
+                    context_iching,
+                    so_mo_number=so_mo_number,
+                    so_mo_keyword=so_mo_keyword,
+                ):
+                    if name == "analysis":
+                        analysis = data
+                    else:
+                        yield name, data
                 
-                # Parse the JSON response
-                analysis = self._parse_json_response(response_text)
                 log_info("Successfully parsed Analysis Triangle response")
                 break  # Success, exit retry loop
                 
             except OutputParserException as e:
                 last_error = str(e)
-                log_warning(f"Parse attempt {attempt + 1} failed: {e}")
+                log_warning("Parse attempt %d failed: %s", attempt + 1, e)
                 if attempt < max_retries:
                     await asyncio.sleep(1)  # Brief delay before retry
                     
             except Exception as e:
                 last_error = str(e)
-                log_error(f"LLM call failed: {e}")
+                log_error("LLM call failed: %s", e)
                 break  # Don't retry on LLM errors
         
-        # Use fallback if all attempts failed
-        if analysis is None:
+        # Use fallback if all attempts failed (never cached)
+        succeeded = analysis is not None
+        if not succeeded:
             log_warning("Using fallback analysis due to parsing failures")
             analysis = self._get_fallback_analysis(user_dream, last_error)
         
-        # Build and return the complete response
-        return TriangleAnalysisResponse(
+        # Build the complete response
+        result = TriangleAnalysisResponse(
             id=analysis_id,
             user_dream=user_dream,
             analysis=analysis,
@@ -756,15 +1178,41 @@ Return ONLY a valid JSON object matching this exact schema (no markdown, no extr
                 "tarot": [doc[:200] + "..." for doc in context_tarot],
                 "iching": [doc[:200] + "..." for doc in context_iching],
             },
-            created_at=datetime.utcnow()
+            created_at=utc_now()
         )
+        
+        # A fan-out analysis whose synthesis fell back is not worth reusing
+        if succeeded and analysis.synthesis is _FALLBACK_ANALYSIS.synthesis:
+            succeeded = False
+        
+        if use_cache and succeeded and dream_vector is not None:
+            self.semantic_cache.store(dream_vector, result, tag=so_mo_keyword)
+            log_info(
+                "Semantic cache miss stored - hits=%d misses=%d",
+                self.semantic_cache.hits, self.semantic_cache.misses,
+            )
+        
+        yield "result", result
 
 
 # =============================================================================
 # Singleton Service Instance
 # =============================================================================
 
-analysis_triangle_service = AnalysisTriangleService()
+_analysis_triangle_service: Optional[AnalysisTriangleService] = None
+
+
+def get_analysis_triangle_service() -> AnalysisTriangleService:
+    """
+    Get the Analysis Triangle service singleton, created on first use so that
+    importing this module stays free of setup work.
+    """
+    global _analysis_triangle_service
+    
+    if _analysis_triangle_service is None:
+        _analysis_triangle_service = AnalysisTriangleService()
+    
+    return _analysis_triangle_service
 
 
 # =============================================================================
@@ -781,4 +1229,4 @@ async def analyze_dream_triangle(user_dream: str) -> TriangleAnalysisResponse:
     Returns:
         TriangleAnalysisResponse with complete three-lens analysis
     """
-    return await analysis_triangle_service.analyze_dream_triangle(user_dream)
+    return await get_analysis_triangle_service().analyze_dream_triangle(user_dream)
@@ -4,52 +4,359 @@ Handles extraction of dream_knowledge_db.zip and ChromaDB initialization.
 Checks if extraction is needed to prevent overwriting on every restart.
 """
 
+import contextlib
+import io
+import mmap
 import os
+import queue
+import struct
+import sys
+import threading
 import zipfile
+import zlib
 import shutil
+import sqlite3
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
-from typing import Optional
-
-import chromadb
-from chromadb.config import Settings as ChromaSettings
+from typing import TYPE_CHECKING, Any, Dict, List, Optional, Sequence
 
 from config import get_settings
+from utils.logger import log_info, log_warning, log_error
+
+try:
+    # ISA-L's SIMD inflate (optional, several times faster than zlib on x86)
+    from isal import isal_zlib
+except ImportError:
+    isal_zlib = None
+
+if TYPE_CHECKING:
+    # chromadb is imported lazily (onnxruntime etc. make it slow to import)
+    import chromadb
 
 settings = get_settings()
 
 # Global ChromaDB client instance
-_chroma_client: Optional[chromadb.Client] = None
-_dream_collection: Optional[chromadb.Collection] = None
+_chroma_client: Optional["chromadb.ClientAPI"] = None
+_dream_collection: Optional["chromadb.Collection"] = None
+
+
+# Settings are fixed at import, so the paths are built once
+PROJECT_ROOT = Path(__file__).parent.parent.parent
+ZIP_PATH = PROJECT_ROOT / settings.dream_knowledge_zip
+EXTRACTION_PATH = Path(settings.chroma_db_path)
 
 
 def get_project_root() -> Path:
     """Get the project root directory (parent of backend folder)."""
-    return Path(__file__).parent.parent.parent
+    return PROJECT_ROOT
 
 
 def get_zip_path() -> Path:
     """Get the path to the dream knowledge zip file."""
-    return get_project_root() / settings.dream_knowledge_zip
+    return ZIP_PATH
 
 
 def get_extraction_path() -> Path:
     """Get the path where the zip will be extracted."""
-    return Path(settings.chroma_db_path)
+    return EXTRACTION_PATH
+
+
+def _has_entries(directory: Path) -> bool:
+    """True if the directory holds anything; stops at the first entry."""
+    with os.scandir(directory) as entries:
+        return any(True for _ in entries)
+
+
+# Written into the extraction folder after a complete extract; holds the zip fingerprint
+EXTRACT_STAMP_NAME = ".extracted.stamp"
+# Present while an extract is running; left behind if it was interrupted
+EXTRACT_PARTIAL_NAME = ".extract.partial"
+# Stamp content for pre-existing data kept as-is; never equals a zip fingerprint
+ADOPTED_STAMP = "adopted"
+
+
+def get_zip_fingerprint(zip_path: Path) -> str:
+    """Cheap identity of the zip (size + mtime) - no hashing of the archive."""
+    stat = zip_path.stat()
+    return f"{stat.st_size}:{int(stat.st_mtime)}"
+
+
+def write_extract_stamp(extraction_path: Path, fingerprint: str) -> None:
+    # Write then rename, so an interrupted extract never looks complete
+    stamp_path = extraction_path / EXTRACT_STAMP_NAME
+    tmp_path = stamp_path.with_name(f"{EXTRACT_STAMP_NAME}.{os.getpid()}.tmp")
+    tmp_path.write_text(fingerprint, encoding="utf-8")
+    os.replace(tmp_path, stamp_path)
 
 
 def is_already_extracted() -> bool:
     """
     Check if the database has already been extracted.
-    Returns True if the extraction folder exists and contains data.
+    With the zip present, the extract stamp must match its fingerprint, so a
+    partial extract or a newer zip triggers re-extraction. Data without any
+    stamp (shipped in the repo, or extracted before stamps existed) is kept
+    as-is under ADOPTED_STAMP - unverified, never certified as matching the
+    zip; delete the folder to re-extract. Without the zip, any existing data counts.
     """
     extraction_path = get_extraction_path()
     
     if not extraction_path.exists():
         return False
     
+    zip_path = get_zip_path()
+    if zip_path.exists():
+        if (extraction_path / EXTRACT_PARTIAL_NAME).exists():
+            return False
+        try:
+            stamp = (extraction_path / EXTRACT_STAMP_NAME).read_text(encoding="utf-8")
+        except FileNotFoundError:
+            if not _has_entries(extraction_path):
+                return False
+            write_extract_stamp(extraction_path, ADOPTED_STAMP)
+            stamp = ADOPTED_STAMP
+        except OSError:
+            return False
+        
+        stamp = stamp.strip()
+        if stamp == ADOPTED_STAMP:
+            log_warning(
+                "Using pre-existing ChromaDB data at %s as-is (not verified against %s); "
+                "delete the folder to re-extract",
+                extraction_path, zip_path,
+            )
+            return True
+        return stamp == get_zip_fingerprint(zip_path)
+    
     # Check if the folder contains ChromaDB data
-    chroma_files = list(extraction_path.glob("*"))
-    return len(chroma_files) > 0
+    return _has_entries(extraction_path)
+
+
+# Read/write chunk for zip extraction: feeds zlib large blocks instead of the
+# small default buffer of ZipFile.extractall
+EXTRACT_BUFFER_SIZE = 256 * 1024
+
+
+# Zip local file header: fixed 30 bytes, then file name and extra field
+_LOCAL_HEADER = struct.Struct("<4s2B4HL2L2H")
+_LOCAL_HEADER_SIGNATURE = b"PK\x03\x04"
+
+
+def _member_data_offset(fd: int, info: zipfile.ZipInfo) -> Optional[int]:
+    """Offset of the member's (compressed) bytes, or None if its local header is invalid."""
+    fields = _LOCAL_HEADER.unpack(os.pread(fd, _LOCAL_HEADER.size, info.header_offset))
+    if fields[0] != _LOCAL_HEADER_SIGNATURE:
+        return None
+    return info.header_offset + _LOCAL_HEADER.size + fields[-2] + fields[-1]
+
+
+def _preallocate(fd: int, size: int) -> None:
+    """Reserve a member's full size before writing it, so its extents are laid out contiguously."""
+    if size <= 0 or not hasattr(os, "posix_fallocate"):
+        return
+    try:
+        os.posix_fallocate(fd, 0, size)
+    except OSError:
+        pass  # Filesystem rejects preallocation: the writes still extend the file
+
+
+def _copy_stored_member(zip_path: str, info: zipfile.ZipInfo, destination: Path) -> bool:
+    """
+    Copy an uncompressed (STORED) member straight from the archive with
+    os.copy_file_range, so the bytes never pass through userspace, then
+    check its CRC-32 from the (still page-cached) copy.
+    Returns False when not applicable (compressed, encrypted, or unavailable).
+    """
+    if (
+        info.compress_type != zipfile.ZIP_STORED
+        or info.flag_bits & 0x1  # Encrypted
+        or not hasattr(os, "copy_file_range")
+    ):
+        return False
+    
+    src_fd = os.open(zip_path, os.O_RDONLY)
+    try:
+        offset = _member_data_offset(src_fd, info)
+        if offset is None:
+            return False
+        
+        dst_fd = os.open(destination, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o644)
+        try:
+            _preallocate(dst_fd, info.file_size)
+            remaining = info.file_size
+            while remaining:
+                copied = os.copy_file_range(src_fd, dst_fd, remaining, offset_src=offset)
+                if copied == 0:
+                    raise zipfile.BadZipFile(f"Truncated member in archive: {info.filename}")
+                offset += copied
+                remaining -= copied
+        finally:
+            os.close(dst_fd)
+        
+        crc = 0
+        with open(destination, 'rb', buffering=0) as copied_file:
+            while chunk := copied_file.read(EXTRACT_BUFFER_SIZE):
+                crc = zlib.crc32(chunk, crc)
+        if crc != info.CRC:
+            raise zipfile.BadZipFile(f"Bad CRC-32 for member in archive: {info.filename}")
+    except OSError:
+        return False  # e.g. unsupported filesystem: use the buffered path
+    finally:
+        os.close(src_fd)
+    return True
+
+
+def _inflate_member_isal(zip_path: str, info: zipfile.ZipInfo, destination: Path) -> bool:
+    """
+    Inflate a DEFLATE member from its raw bytes with ISA-L, checking its CRC-32
+    in the same pass. Output is bounded to EXTRACT_BUFFER_SIZE per call.
+    Returns False when not applicable (isal missing, other method, encrypted).
+    """
+    if isal_zlib is None or info.compress_type != zipfile.ZIP_DEFLATED or info.flag_bits & 0x1:
+        return False
+    
+    src_fd = os.open(zip_path, os.O_RDONLY)
+    try:
+        offset = _member_data_offset(src_fd, info)
+        if offset is None:
+            return False
+        
+        decompressor = isal_zlib.decompressobj(-15)  # Raw DEFLATE stream, as in zip
+        crc = 0
+        size = 0
+        remaining = info.compress_size
+        with open(destination, 'wb', buffering=0) as dst:
+            _preallocate(dst.fileno(), info.file_size)
+            while remaining:
+                chunk = os.pread(src_fd, min(EXTRACT_BUFFER_SIZE, remaining), offset)
+                if not chunk:
+                    raise zipfile.BadZipFile(f"Truncated member in archive: {info.filename}")
+                offset += len(chunk)
+                remaining -= len(chunk)
+                while chunk:
+                    data = decompressor.decompress(chunk, EXTRACT_BUFFER_SIZE)
+                    crc = isal_zlib.crc32(data, crc)
+                    size += len(data)
+                    dst.write(data)
+                    chunk = decompressor.unconsumed_tail
+            data = decompressor.flush()
+            crc = isal_zlib.crc32(data, crc)
+            size += len(data)
+            dst.write(data)
+    except isal_zlib.error as e:
+        raise zipfile.BadZipFile(f"Corrupt member in archive: {info.filename} ({e})") from e
+    finally:
+        os.close(src_fd)
+    
+    if crc != info.CRC or size != info.file_size:
+        raise zipfile.BadZipFile(f"Bad CRC-32 for member in archive: {info.filename}")
+    return True
+
+
+# Members at least this large are inflated on a helper thread while the
+# previous chunk is written, overlapping DEFLATE with disk writes (zlib path)
+PIPELINE_MIN_MEMBER_SIZE = 16 * 1024 * 1024
+
+
+def _pipelined_copy(src: zipfile.ZipExtFile, dst: io.BufferedWriter) -> None:
+    """
+    Copy `src` to `dst` with reading (inflating) and writing overlapped: a
+    producer thread fills a 2-slot queue of EXTRACT_BUFFER_SIZE chunks, which
+    caps memory at a few chunks. Producer errors (e.g. a bad CRC) are re-raised here.
+    """
+    chunks: queue.Queue = queue.Queue(maxsize=2)
+    stop = threading.Event()
+    
+    def produce() -> None:
+        try:
+            while not stop.is_set() and (chunk := src.read(EXTRACT_BUFFER_SIZE)):
+                chunks.put(chunk)
+            chunks.put(None)
+        except BaseException as e:
+            chunks.put(e)
+    
+    producer = threading.Thread(target=produce, name="zip-inflate", daemon=True)
+    producer.start()
+    try:
+        while (chunk := chunks.get()) is not None:
+            if isinstance(chunk, BaseException):
+                raise chunk
+            dst.write(chunk)
+    except BaseException:
+        # Unblock a producer waiting on the full queue before leaving
+        stop.set()
+        while producer.is_alive():
+            try:
+                chunks.get(timeout=0.1)
+            except queue.Empty:
+                pass
+        raise
+    producer.join()
+
+
+def _extract_member(zip_ref: zipfile.ZipFile, info: zipfile.ZipInfo, extraction_path: Path) -> None:
+    """Stream one zip member to disk through large buffers."""
+    root = extraction_path.resolve()
+    destination = (root / info.filename).resolve()
+    # Same protection as extractall: never write outside the extraction folder
+    if root != destination and root not in destination.parents:
+        raise zipfile.BadZipFile(f"Unsafe path in archive: {info.filename}")
+    
+    if info.is_dir():
+        destination.mkdir(parents=True, exist_ok=True)
+        return
+    
+    destination.parent.mkdir(parents=True, exist_ok=True)
+    if _copy_stored_member(zip_ref.filename, info, destination):
+        return
+    if _inflate_member_isal(zip_ref.filename, info, destination):
+        return
+    # ZipExtFile checks the member's CRC-32 on the bytes it inflates and raises
+    # BadZipFile at EOF on a mismatch, so this copy is verified in the same pass
+    with zip_ref.open(info, 'r') as src, open(destination, 'wb', buffering=EXTRACT_BUFFER_SIZE) as dst:
+        _preallocate(dst.fileno(), info.file_size)
+        if info.file_size >= PIPELINE_MIN_MEMBER_SIZE:
+            _pipelined_copy(src, dst)
+            return
+        reader = io.BufferedReader(src, buffer_size=EXTRACT_BUFFER_SIZE)
+        shutil.copyfileobj(reader, dst, length=EXTRACT_BUFFER_SIZE)
+
+
+def _extract_all(zip_path: Path, extraction_path: Path) -> None:
+    """
+    Extract every member, inflating files concurrently (zlib releases the GIL).
+    ZipFile handles aren't safe for concurrent reads, so each worker thread
+    opens its own.
+    """
+    with zipfile.ZipFile(zip_path, 'r') as zip_ref:
+        members = zip_ref.infolist()
+        # Directories first (cheap, serial), so workers only write files
+        for info in members:
+            if info.is_dir():
+                _extract_member(zip_ref, info, extraction_path)
+    
+    files = [info for info in members if not info.is_dir()]
+    if not files:
+        return
+    
+    local = threading.local()
+    opened: list[zipfile.ZipFile] = []
+    opened_lock = threading.Lock()
+    
+    def extract(info: zipfile.ZipInfo) -> None:
+        zip_ref = getattr(local, "zip_ref", None)
+        if zip_ref is None:
+            zip_ref = local.zip_ref = zipfile.ZipFile(zip_path, 'r')
+            with opened_lock:
+                opened.append(zip_ref)
+        _extract_member(zip_ref, info, extraction_path)
+    
+    try:
+        with ThreadPoolExecutor(max_workers=min(len(files), os.cpu_count() or 1)) as pool:
+            # list() re-raises the first worker exception
+            list(pool.map(extract, files))
+    finally:
+        for zip_ref in opened:
+            zip_ref.close()
 
 
 def extract_database() -> bool:
@@ -62,36 +369,134 @@ def extract_database() -> bool:
     
     # Check if already extracted
     if is_already_extracted():
-        print(f"✓ Database already extracted at: {extraction_path}")
+        log_info("Database already extracted at: %s", extraction_path)
         return True
     
     # Check if zip file exists
     if not zip_path.exists():
-        print(f"✗ Warning: {settings.dream_knowledge_zip} not found at {zip_path}")
-        print("  Creating empty ChromaDB database...")
+        log_warning(
+            "%s not found at %s - creating empty ChromaDB database",
+            settings.dream_knowledge_zip, zip_path,
+        )
         extraction_path.mkdir(parents=True, exist_ok=True)
         return True
     
+    # Stale or partial extract (stamp mismatched or partial marker left): start from a clean folder
+    if extraction_path.exists() and _has_entries(extraction_path):
+        log_info("Removing outdated extraction at: %s", extraction_path)
+        shutil.rmtree(extraction_path)
+    
     # Create extraction directory
     extraction_path.mkdir(parents=True, exist_ok=True)
     
     # Extract the zip file
-    print(f"→ Extracting {settings.dream_knowledge_zip} to {extraction_path}...")
+    log_info("Extracting %s to %s...", settings.dream_knowledge_zip, extraction_path)
     
     try:
-        with zipfile.ZipFile(zip_path, 'r') as zip_ref:
-            zip_ref.extractall(extraction_path)
-        print(f"✓ Successfully extracted database to: {extraction_path}")
+        fingerprint = get_zip_fingerprint(zip_path)
+        partial_marker = extraction_path / EXTRACT_PARTIAL_NAME
+        partial_marker.touch()
+        _extract_all(zip_path, extraction_path)
+        write_extract_stamp(extraction_path, fingerprint)
+        partial_marker.unlink()
+        log_info("Successfully extracted database to: %s", extraction_path)
+        snapshot_pristine_database()
         return True
     except zipfile.BadZipFile as e:
-        print(f"✗ Error: Invalid zip file - {e}")
+        log_error("Invalid zip file: %s", e)
         return False
     except Exception as e:
-        print(f"✗ Error extracting database: {e}")
+        log_error("Error extracting database: %s", e, exc_info=True)
+        return False
+
+
+# Copy-on-write clone of a fresh extract, restored by reset_database instead of re-extracting
+PRISTINE_SUFFIX = ".pristine"
+_FICLONE = 0x40049409  # linux/fs.h: _IOW(0x94, 9, int)
+
+
+def get_pristine_path() -> Path:
+    """Get the path of the pristine snapshot next to the extraction folder."""
+    return EXTRACTION_PATH.with_name(EXTRACTION_PATH.name + PRISTINE_SUFFIX)
+
+
+def _reflink_tree(source: Path, destination: Path) -> bool:
+    """
+    Clone `source` into `destination` with FICLONE reflinks, which only copy
+    metadata (btrfs, XFS, ZFS 2.2+). Returns False, leaving nothing behind,
+    where reflinks are unsupported - never falls back to a full data copy.
+    """
+    if sys.platform != "linux":
         return False
+    import fcntl
+    
+    try:
+        for dirpath, _, filenames in os.walk(source):
+            target_dir = destination / os.path.relpath(dirpath, source)
+            target_dir.mkdir(parents=True, exist_ok=True)
+            for filename in filenames:
+                with open(os.path.join(dirpath, filename), 'rb') as src, open(target_dir / filename, 'wb') as dst:
+                    fcntl.ioctl(dst.fileno(), _FICLONE, src.fileno())
+    except OSError:
+        shutil.rmtree(destination, ignore_errors=True)
+        return False
+    return True
+
+
+def snapshot_pristine_database() -> bool:
+    """
+    Reflink the just-extracted database into the pristine snapshot (replacing
+    an older one). Returns False if the filesystem can't reflink.
+    """
+    pristine_path = get_pristine_path()
+    if pristine_path.exists():
+        shutil.rmtree(pristine_path)
+    if not _reflink_tree(EXTRACTION_PATH, pristine_path):
+        return False
+    log_info("Pristine database snapshot created at: %s", pristine_path)
+    return True
+
+
+# Chroma data files worth having in the page cache before the first query
+PREFETCH_PATTERNS = ("*.sqlite3", "*.bin", "*.parquet")
+
+
+def prefetch_database(max_bytes: Optional[int] = None) -> int:
+    """
+    Fault the Chroma sqlite/HNSW files into the OS page cache (Linux
+    MAP_POPULATE) so the first query doesn't pay for page-by-page reads.
+    Stops at `max_bytes` so small containers don't evict hotter pages.
+    Returns the number of bytes prefetched.
+    """
+    if max_bytes is None:
+        max_bytes = settings.chroma_prefetch_max_bytes
+    populate = getattr(mmap, "MAP_POPULATE", None)
+    if sys.platform != "linux" or populate is None or max_bytes <= 0:
+        return 0
+    
+    extraction_path = get_extraction_path()
+    prefetched = 0
+    for pattern in PREFETCH_PATTERNS:
+        for path in extraction_path.rglob(pattern):
+            size = path.stat().st_size
+            if size == 0 or prefetched + size > max_bytes:
+                continue
+            try:
+                fd = os.open(path, os.O_RDONLY)
+                try:
+                    # Mapping with MAP_POPULATE reads every page; they stay cached after unmap
+                    mmap.mmap(fd, 0, flags=mmap.MAP_SHARED | populate, prot=mmap.PROT_READ).close()
+                finally:
+                    os.close(fd)
+                prefetched += size
+            except (OSError, ValueError) as e:
+                log_warning("Could not prefetch %s: %s", path, e)
+    
+    log_info("Prefetched %.1f MiB of ChromaDB data into the page cache", prefetched / (1024 * 1024))
+    return prefetched
 
 
-def get_chroma_client() -> chromadb.Client:
+def get_chroma_client() -> "chromadb.ClientAPI":
     """
     Get or create the ChromaDB client instance.
     Uses persistent storage at the configured path.
@@ -99,6 +504,9 @@ def get_chroma_client() -> chromadb.Client:
     global _chroma_client
     
     if _chroma_client is None:
+        import chromadb
+        from chromadb.config import Settings as ChromaSettings
+        
         extraction_path = get_extraction_path()
         
         _chroma_client = chromadb.PersistentClient(
@@ -108,12 +516,63 @@ def get_chroma_client() -> chromadb.Client:
                 allow_reset=True,
             )
         )
-        print(f"✓ ChromaDB client initialized at: {extraction_path}")
+        log_info("ChromaDB client initialized at: %s", extraction_path)
     
     return _chroma_client
 
 
-def get_dream_collection() -> chromadb.Collection:
+# Sidecar next to the Chroma folder: collection doc counts keyed on the
+# Chroma manifest's mtime, so worker starts skip the count() scan
+DREAM_COLLECTION_NAME = "dream_knowledge"
+CACHE_META_NAME = "cache_meta.sqlite"
+
+
+def _cache_meta_path() -> Path:
+    return get_extraction_path().parent / CACHE_META_NAME
+
+
+def _chroma_manifest_mtime() -> Optional[int]:
+    try:
+        return (get_extraction_path() / "chroma.sqlite3").stat().st_mtime_ns
+    except OSError:
+        return None
+
+
+def _collection_count(collection: "chromadb.Collection") -> int:
+    """
+    Document count of `collection`, from the sidecar when the Chroma data is
+    unchanged since it was recorded; otherwise counted and recorded.
+    """
+    manifest_mtime = _chroma_manifest_mtime()
+    if manifest_mtime is None:
+        return collection.count()
+    
+    try:
+        # closing() closes the connection; its own `with` only commits/rolls back
+        with contextlib.closing(sqlite3.connect(_cache_meta_path())) as db, db:
+            db.execute(
+                "CREATE TABLE IF NOT EXISTS collection_meta "
+                "(name TEXT PRIMARY KEY, count INTEGER NOT NULL, manifest_mtime INTEGER NOT NULL)"
+            )
+            row = db.execute(
+                "SELECT count FROM collection_meta WHERE name = ? AND manifest_mtime = ?",
+                (collection.name, manifest_mtime),
+            ).fetchone()
+            if row is not None:
+                return row[0]
+            
+            count = collection.count()
+            db.execute(
+                "INSERT OR REPLACE INTO collection_meta (name, count, manifest_mtime) VALUES (?, ?, ?)",
+                (collection.name, count, manifest_mtime),
+            )
+            return count
+    except sqlite3.Error as e:
+        log_warning("Collection metadata cache unavailable: %s", e)
+        return collection.count()
+
+
+def get_dream_collection() -> "chromadb.Collection":
     """
     Get or create the dream knowledge collection.
     """
@@ -124,42 +583,88 @@ def get_dream_collection() -> chromadb.Collection:
         
         # Get or create the dreams collection
         _dream_collection = client.get_or_create_collection(
-            name="dream_knowledge",
+            name=DREAM_COLLECTION_NAME,
             metadata={"description": "Dream symbols and interpretations"}
         )
-        print(f"✓ Dream collection loaded with {_dream_collection.count()} documents")
+        log_info("Dream collection loaded with %d documents", _collection_count(_dream_collection))
     
     return _dream_collection
 
 
+# Rows per collection.add() call: large batches amortize Chroma's per-call
+# serialization; raise it until memory pressure appears
+BULK_ADD_BATCH_SIZE = 5000
+
+
+def bulk_add(
+    collection: "chromadb.Collection",
+    ids: Sequence[str],
+    documents: Sequence[str],
+    metadatas: Optional[Sequence[Dict[str, Any]]] = None,
+    embeddings: Optional[Sequence[Sequence[float]]] = None,
+    batch_size: int = BULK_ADD_BATCH_SIZE,
+) -> int:
+    """
+    Add documents to `collection` in batches of `batch_size` rows (clamped to
+    the client's maximum batch size). `embeddings` may be a NumPy array, whose
+    slices are views. Returns the number of rows added.
+    """
+    max_batch_size = getattr(getattr(collection, "_client", None), "max_batch_size", None)
+    if max_batch_size:
+        batch_size = min(batch_size, max_batch_size)
+    
+    for start in range(0, len(ids), batch_size):
+        end = start + batch_size
+        batch: Dict[str, List[Any]] = {"ids": ids[start:end], "documents": documents[start:end]}
+        if metadatas is not None:
+            batch["metadatas"] = metadatas[start:end]
+        if embeddings is not None:
+            batch["embeddings"] = embeddings[start:end]
+        collection.add(**batch)
+    
+    return len(ids)
+
+
+def get_dream_embedding_function():
+    """
+    Embedding function of the dream collection, so other components embed text
+    with the same model without loading it a second time.
+    """
+    collection = get_dream_collection()
+    embedding_function = getattr(collection, "_embedding_function", None)
+    if embedding_function is None:
+        from chromadb.utils import embedding_functions
+        embedding_function = embedding_functions.DefaultEmbeddingFunction()
+    return embedding_function
+
+
 def initialize_database() -> bool:
     """
     Initialize the database by extracting zip (if needed) and loading ChromaDB.
     This is the main entry point called during application startup.
     """
-    print("\n" + "="*50)
-    print("Initializing Dream Knowledge Database")
-    print("="*50)
+    log_info("Initializing Dream Knowledge Database")
     
     # Step 1: Extract database if needed
     if not extract_database():
-        print("✗ Failed to initialize database")
+        log_error("Failed to initialize database")
         return False
     
-    # Step 2: Initialize ChromaDB client and collection
+    # Step 2: Warm the page cache, then initialize ChromaDB client and collection
+    prefetch_database()
     try:
         get_dream_collection()
-        print("="*50 + "\n")
         return True
     except Exception as e:
-        print(f"✗ Error initializing ChromaDB: {e}")
+        log_error("Error initializing ChromaDB: %s", e, exc_info=True)
         return False
 
 
 def reset_database() -> bool:
     """
     Reset the database by removing the extraction folder.
-    The next call to initialize_database will re-extract from zip.
+    It is restored from the pristine snapshot when one exists (reflinks, no
+    re-extract); otherwise the next call to initialize_database re-extracts from zip.
     """
     global _chroma_client, _dream_collection
     
@@ -169,7 +674,11 @@ def reset_database() -> bool:
         shutil.rmtree(extraction_path)
         _chroma_client = None
         _dream_collection = None
-        print(f"✓ Database reset. Removed: {extraction_path}")
+        log_info("Database reset. Removed: %s", extraction_path)
+        
+        pristine_path = get_pristine_path()
+        if pristine_path.exists() and _reflink_tree(pristine_path, extraction_path):
+            log_info("Database restored from pristine snapshot: %s", pristine_path)
         return True
     
     return False
@@ -3,10 +3,17 @@ Structured Logging Configuration
 Outputs to both console (dev) and file (production).
 """
 
+import atexit
 import logging
+import queue
+import re
+import struct
 import sys
-from logging.handlers import RotatingFileHandler
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler, WatchedFileHandler
 from pathlib import Path
+from typing import Callable, Dict, Optional
+
+from config import get_settings
 
 # Log file configuration
 LOG_FILE = Path(__file__).parent.parent / "app.log"
@@ -14,11 +21,126 @@ LOG_FORMAT = "%(asctime)s - %(levelname)s - %(name)s - %(message)s"
 LOG_DATE_FORMAT = "%Y-%m-%d %H:%M:%S"
 LOG_MAX_BYTES = 5 * 1024 * 1024  # 5 MB
 LOG_BACKUP_COUNT = 3
+# Binary log file (LOG_FILE_FORMAT=binary); decode with scripts/decode_binary_log.py
+BINARY_LOG_FILE = LOG_FILE.with_name("app.log.bin")
+# Record header: timestamp (µs since epoch), level, logger-name id, message byte length
+BINARY_RECORD_HEADER = struct.Struct("<QBHH")
+# Level value of the record that announces a logger name (its message) for an id
+BINARY_NAME_RECORD = 0
+
+
+_FORMAT_FIELD_RE = re.compile(r"%\((\w+)\)s")
+# Fields the base Formatter computes instead of reading off the record
+_FORMAT_FIELD_EXPRESSIONS = {
+    "asctime": "self.formatTime(record, self.datefmt)",
+    "message": "record.getMessage()",
+}
+
+
+def _compile_format(fmt: str) -> Optional[Callable[[logging.Formatter, logging.LogRecord], str]]:
+    """
+    Compile a %-style format of plain `%(field)s` specs into a single f-string
+    function (formatter, record) -> str. Returns None for any other spec
+    (width, precision, `%d`...), which the regular Formatter handles.
+    """
+    pieces = []
+    position = 0
+    for match in [*_FORMAT_FIELD_RE.finditer(fmt), None]:
+        literal = fmt[position:match.start() if match else len(fmt)]
+        if "%" in literal:
+            return None
+        pieces.append(literal.replace("{", "{{").replace("}", "}}"))
+        if match:
+            field = match.group(1)
+            pieces.append("{" + _FORMAT_FIELD_EXPRESSIONS.get(field, f"record.{field}") + "}")
+            position = match.end()
+    
+    source = f"def format(self, record):\n    return f{''.join(pieces)!r}\n"
+    namespace: Dict[str, Callable] = {}
+    exec(compile(source, f"<log format {fmt!r}>", "exec"), namespace)
+    return namespace["format"]
+
+
+class CachedTimeFormatter(logging.Formatter):
+    """
+    Formatter that renders `%(asctime)s` once per second: LOG_DATE_FORMAT has
+    no sub-second fields, so records within the same second share the string.
+    Plain formats like LOG_FORMAT run as a function compiled at construction.
+    """
+    
+    def __init__(self, *args, **kwargs) -> None:
+        super().__init__(*args, **kwargs)
+        # (second, formatted timestamp), swapped as one tuple so threads see a consistent pair
+        self._time_cache = (-1, "")
+        self._compiled_format = _compile_format(self._fmt) if isinstance(self._style, logging.PercentStyle) else None
+    
+    def formatTime(self, record: logging.LogRecord, datefmt: Optional[str] = None) -> str:
+        second = int(record.created)
+        cached_second, formatted = self._time_cache
+        if second != cached_second:
+            formatted = super().formatTime(record, datefmt)
+            self._time_cache = (second, formatted)
+        return formatted
+    
+    def format(self, record: logging.LogRecord) -> str:
+        # Tracebacks and stack info are appended by the base implementation
+        if self._compiled_format is None or record.exc_info or record.exc_text or record.stack_info:
+            return super().format(record)
+        return self._compiled_format(self, record)
+
+
+class BinaryRotatingHandler(RotatingFileHandler):
+    """
+    Rotating file handler that writes BINARY_RECORD_HEADER + UTF-8 message per
+    record instead of formatted text: no format string, no timestamp rendering.
+    Each file announces a logger name once, before its first use, so files
+    decode independently after rotation.
+    """
+    
+    def __init__(self, filename: Path, maxBytes: int = 0, backupCount: int = 0) -> None:
+        self._name_ids: Dict[str, int] = {}
+        super().__init__(filename, maxBytes=maxBytes, backupCount=backupCount)
+    
+    def _open(self):
+        return open(self.baseFilename, "ab")
+    
+    def doRollover(self) -> None:
+        super().doRollover()
+        self._name_ids.clear()  # The new file needs its own name records
+    
+    def emit(self, record: logging.LogRecord) -> None:
+        try:
+            # Records come through QueueHandler.prepare, any traceback already in the message
+            data = record.getMessage().encode("utf-8")[:0xFFFF]
+            timestamp = int(record.created * 1_000_000)
+            
+            if self.stream is None:
+                self.stream = self._open()
+            if self.maxBytes > 0 and self.stream.tell() + BINARY_RECORD_HEADER.size + len(data) >= self.maxBytes:
+                self.doRollover()
+            
+            chunks = []
+            name_id = self._name_ids.get(record.name)
+            if name_id is None:
+                name_id = self._name_ids[record.name] = len(self._name_ids)
+                name = record.name.encode("utf-8")[:0xFFFF]
+                chunks.append(BINARY_RECORD_HEADER.pack(timestamp, BINARY_NAME_RECORD, name_id, len(name)))
+                chunks.append(name)
+            chunks.append(BINARY_RECORD_HEADER.pack(timestamp, record.levelno, name_id, len(data)))
+            chunks.append(data)
+            self.stream.write(b"".join(chunks))
+            self.flush()
+        except RecursionError:
+            raise
+        except Exception:
+            self.handleError(record)
 
 
 def setup_logger(name: str = "dreamsight", level: int = logging.INFO) -> logging.Logger:
     """
     Create and configure a logger with console and file handlers.
+    The handlers run on a background QueueListener thread: callers only
+    enqueue the record, never wait on console/disk writes.
     
     Args:
         name: Logger name (default: "dreamsight")
@@ -36,51 +158,101 @@ def setup_logger(name: str = "dreamsight", level: int = logging.INFO) -> logging
     logger.setLevel(level)
     
     # Formatter
-    formatter = logging.Formatter(LOG_FORMAT, datefmt=LOG_DATE_FORMAT)
+    formatter = CachedTimeFormatter(LOG_FORMAT, datefmt=LOG_DATE_FORMAT)
     
     # Console Handler (for development)
     console_handler = logging.StreamHandler(sys.stdout)
     console_handler.setLevel(logging.DEBUG)
     console_handler.setFormatter(formatter)
-    logger.addHandler(console_handler)
+    handlers = [console_handler]
+    file_handler_error = None
     
-    # File Handler with rotation (for production history)
+    # File Handler with rotation (for production history). Handlers only run on
+    # the listener thread, so the rollover rename cascade never blocks a request.
+    # With external rotation (logrotate), just reopen the file once it is moved.
+    settings = get_settings()
     try:
-        file_handler = RotatingFileHandler(
-            LOG_FILE,
-            maxBytes=LOG_MAX_BYTES,
-            backupCount=LOG_BACKUP_COUNT,
-            encoding="utf-8",
-        )
+        if settings.log_file_format == "binary":
+            file_handler = BinaryRotatingHandler(
+                BINARY_LOG_FILE,
+                maxBytes=LOG_MAX_BYTES,
+                backupCount=LOG_BACKUP_COUNT,
+            )
+        elif settings.log_external_rotation:
+            file_handler = WatchedFileHandler(LOG_FILE, encoding="utf-8")
+        else:
+            file_handler = RotatingFileHandler(
+                LOG_FILE,
+                maxBytes=LOG_MAX_BYTES,
+                backupCount=LOG_BACKUP_COUNT,
+                encoding="utf-8",
+            )
         file_handler.setLevel(logging.INFO)
         file_handler.setFormatter(formatter)
-        logger.addHandler(file_handler)
+        handlers.append(file_handler)
     except Exception as e:
-        logger.warning(f"Could not create file handler: {e}")
+        file_handler_error = e
+    
+    log_queue: queue.SimpleQueue = queue.SimpleQueue()
+    listener = QueueListener(log_queue, *handlers, respect_handler_level=True)
+    listener.start()
+    atexit.register(listener.stop)  # Flush queued records on shutdown
+    logger.addHandler(QueueHandler(log_queue))
+    logger.listener = listener  # Keep a reference alongside the logger
+    
+    if file_handler_error is not None:
+        logger.warning("Could not create file handler: %s", file_handler_error)
     
     return logger
 
 
 # Global logger instance
-logger = setup_logger()
+logger = setup_logger(level=logging.getLevelName(get_settings().log_level.upper()))
 
 
 # Convenience functions
-def log_info(message: str) -> None:
+# Extra positional args are %-formatted lazily, only if the record is emitted
+def log_info(message: str, *args) -> None:
     """Log INFO level message."""
-    logger.info(message)
+    logger.info(message, *args)
 
 
-def log_error(message: str, exc_info: bool = False) -> None:
+def log_error(message: str, *args, exc_info: bool = False) -> None:
     """Log ERROR level message."""
-    logger.error(message, exc_info=exc_info)
+    logger.error(message, *args, exc_info=exc_info)
 
 
-def log_warning(message: str) -> None:
+def log_warning(message: str, *args) -> None:
     """Log WARNING level message."""
-    logger.warning(message)
+    logger.warning(message, *args)
 
 
-def log_debug(message: str) -> None:
+def _log_debug(message: str, *args) -> None:
     """Log DEBUG level message."""
-    logger.debug(message)
+    logger.debug(message, *args)
+
+
+def _log_discard(message: str, *args) -> None:
+    """Stand-in for log_debug while DEBUG is disabled."""
+
+
+# Bound once for the configured level: below DEBUG the hot-path log_debug calls
+# are a bare no-op instead of a wrapper + isEnabledFor lookup each time
+log_debug = _log_debug if logger.isEnabledFor(logging.DEBUG) else _log_discard
+
+
+def refresh_log_levels(level: Optional[int] = None) -> None:
+    """
+    Optionally set a new logger level, then rebind log_debug to match it.
+    Names already imported via `from utils.logger import log_debug` keep the
+    binding made at import; look it up on the module to follow level changes.
+    """
+    global log_debug
+    if level is not None:
+        logger.setLevel(level)
+    log_debug = _log_debug if logger.isEnabledFor(logging.DEBUG) else _log_discard
+
+
+def log_enabled(level: int = logging.INFO) -> bool:
+    """True if a record at `level` would be emitted (guard for costly log arguments)."""
+    return logger.isEnabledFor(level)
@@ -0,0 +1,112 @@
+"""
+Async Micro-Batcher
+Coalesces concurrent single-item calls arriving within a short window into
+one batched call of a blocking or async function (DataLoader pattern).
+"""
+
+import asyncio
+from typing import Awaitable, Callable, Generic, List, Optional, Set, Tuple, TypeVar, Union
+
+T = TypeVar("T")
+R = TypeVar("R")
+
+
+class MicroBatcher(Generic[T, R]):
+    """
+    Collects items submitted concurrently and runs `batch_fn` once per batch.
+
+    `batch_fn` takes a list of items and returns a list of results in the same
+    order. A blocking function runs in a worker thread; a coroutine function
+    (e.g. one batched network call) is awaited on the event loop. A batch is
+    flushed when it holds `max_batch_size` items or `max_delay` seconds after
+    its first item arrived; with no batch in flight it is flushed at once, so
+    a lone caller never waits. Each batch runs as its own task, so collection
+    never blocks on a slow call. The worker task starts lazily on first submit.
+    """
+
+    def __init__(
+        self,
+        batch_fn: Callable[[List[T]], Union[List[R], Awaitable[List[R]]]],
+        max_batch_size: int = 16,
+        max_delay: float = 0.01,
+    ) -> None:
+        self._batch_fn = batch_fn
+        self._is_async = asyncio.iscoroutinefunction(batch_fn)
+        self._max_batch_size = max_batch_size
+        self._max_delay = max_delay
+        self._queue: Optional[asyncio.Queue] = None
+        self._worker: Optional[asyncio.Task] = None
+        # Batches being processed (strong references keep the tasks alive)
+        self._dispatches: Set[asyncio.Task] = set()
+
+    async def submit(self, item: T) -> R:
+        """Queue an item and wait for its result from the next batch."""
+        if self._worker is None or self._worker.done():
+            self._queue = asyncio.Queue()
+            self._worker = asyncio.create_task(self._run(self._queue))
+
+        future = asyncio.get_running_loop().create_future()
+        self._queue.put_nowait((item, future))
+        return await future
+
+    async def close(self) -> None:
+        """Stop the worker and in-flight batches (pending submitters are cancelled)."""
+        if self._worker is not None:
+            self._worker.cancel()
+            try:
+                await self._worker
+            except asyncio.CancelledError:
+                pass
+            self._worker = None
+        
+        for task in list(self._dispatches):
+            task.cancel()
+        await asyncio.gather(*self._dispatches, return_exceptions=True)
+
+        # Release callers whose items never made it into a batch
+        while self._queue is not None and not self._queue.empty():
+            _, future = self._queue.get_nowait()
+            future.cancel()
+
+    async def _run(self, queue: asyncio.Queue) -> None:
+        while True:
+            batch: List[Tuple[T, asyncio.Future]] = [await queue.get()]
+
+            # Under load, give concurrent callers a short window to join this batch
+            if queue.empty() and self._dispatches:
+                await asyncio.sleep(self._max_delay)
+            while len(batch) < self._max_batch_size and not queue.empty():
+                batch.append(queue.get_nowait())
+
+            # Skip callers that gave up (e.g. client disconnected) while queued
+            batch = [(item, future) for item, future in batch if not future.done()]
+            if not batch:
+                continue
+
+            task = asyncio.create_task(self._dispatch(batch))
+            self._dispatches.add(task)
+            task.add_done_callback(self._dispatches.discard)
+
+    async def _dispatch(self, batch: List[Tuple[T, asyncio.Future]]) -> None:
+        """Run `batch_fn` for one batch and resolve its callers' futures."""
+        try:
+            items = [item for item, _ in batch]
+            if self._is_async:
+                results = await self._batch_fn(items)
+            else:
+                results = await asyncio.to_thread(self._batch_fn, items)
+            if len(results) != len(batch):
+                raise RuntimeError(f"batch_fn returned {len(results)} results for {len(batch)} items")
+        except asyncio.CancelledError:
+            for _, future in batch:
+                future.cancel()
+            raise
+        except Exception as exc:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(exc)
+            return
+
+        for (_, future), result in zip(batch, results):
+            if not future.done():
+                future.set_result(result)
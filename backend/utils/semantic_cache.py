@@ -0,0 +1,107 @@
+"""
+Semantic Response Cache
+Reuses a previous result when a new query's embedding is within a cosine
+similarity threshold of a cached one with the same tag (in-process, LRU + TTL).
+"""
+
+import asyncio
+import time
+from collections import OrderedDict
+from typing import Callable, Generic, Hashable, List, Optional, Sequence, Tuple, TypeVar
+
+import numpy as np
+
+V = TypeVar("V")
+
+
+class SemanticCache(Generic[V]):
+    """
+    Nearest-neighbour cache over normalized text embeddings.
+
+    `embed_fn` is a blocking function mapping a list of texts to a list of
+    vectors (e.g. a ChromaDB embedding function); it runs in a worker thread.
+    Lookups are a brute-force dot product over at most `maxsize` unit vectors,
+    which is well under a millisecond at the sizes used here.
+    An entry only matches lookups with an equal `tag`, for facts the result
+    depends on that embedding similarity doesn't capture.
+    """
+
+    def __init__(
+        self,
+        embed_fn: Callable[[List[str]], Sequence[Sequence[float]]],
+        threshold: float = 0.92,
+        maxsize: int = 512,
+        ttl: float = 24 * 3600,
+    ) -> None:
+        self._embed_fn = embed_fn
+        self._threshold = threshold
+        self._maxsize = maxsize
+        self._ttl = ttl
+        self._next_key = 0
+        # key -> (unit vector, value, expires_at, tag); order = LRU
+        self._entries: "OrderedDict[int, Tuple[np.ndarray, V, float, Hashable]]" = OrderedDict()
+        # Stacked vectors (and tags) of `_entries`, rebuilt lazily after writes
+        self._matrix: Optional[np.ndarray] = None
+        self._keys: List[int] = []
+        self._tags: List[Hashable] = []
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def normalize_text(text: str) -> str:
+        return " ".join(text.lower().split())
+
+    async def embed(self, text: str) -> np.ndarray:
+        """Embed `text` (normalized) as a unit vector."""
+        vectors = await asyncio.to_thread(self._embed_fn, [self.normalize_text(text)])
+        vector = np.asarray(vectors[0], dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def lookup(self, vector: np.ndarray, tag: Hashable = None) -> Optional[Tuple[V, float]]:
+        """Return (value, similarity) of the closest live entry with `tag` above the threshold."""
+        self._expire()
+        if not self._entries:
+            self.misses += 1
+            return None
+
+        if self._matrix is None:
+            self._keys = list(self._entries)
+            self._matrix = np.stack([self._entries[key][0] for key in self._keys])
+            self._tags = [self._entries[key][3] for key in self._keys]
+
+        similarities = self._matrix @ vector
+        similarities[[entry_tag != tag for entry_tag in self._tags]] = -np.inf
+        best = int(np.argmax(similarities))
+        similarity = float(similarities[best])
+        if similarity < self._threshold:
+            self.misses += 1
+            return None
+
+        key = self._keys[best]
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return self._entries[key][1], similarity
+
+    def store(self, vector: np.ndarray, value: V, tag: Hashable = None) -> None:
+        """Add an entry, evicting the least recently used one when full."""
+        self._entries[self._next_key] = (vector, value, time.monotonic() + self._ttl, tag)
+        self._next_key += 1
+        while len(self._entries) > self._maxsize:
+            self._entries.popitem(last=False)
+        self._matrix = None
+
+    def clear(self) -> None:
+        self._entries.clear()
+        self._matrix = None
+
+    def stats(self) -> dict:
+        return {"size": len(self._entries), "hits": self.hits, "misses": self.misses}
+
+    def _expire(self) -> None:
+        now = time.monotonic()
+        expired = [key for key, (_, _, expires_at, _) in self._entries.items() if expires_at <= now]
+        for key in expired:
+            del self._entries[key]
+        if expired:
+            self._matrix = None
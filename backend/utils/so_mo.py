@@ -0,0 +1,165 @@
+"""
+Sổ Mơ Dân Gian (Vietnamese Folk Dream Book) Lookup
+Builds the keyword automaton from the JSON source, or loads a prebuilt pickle
+of it (see scripts/build_so_mo_automaton.py) so workers skip parsing and indexing.
+"""
+
+import functools
+import os
+import pickle
+import unicodedata
+from typing import Dict, List, Optional, Tuple
+
+import ahocorasick
+import orjson
+
+from utils.logger import log_info, log_warning
+
+DATA_DIR = os.path.join(os.path.dirname(__file__), "../data")
+SO_MO_PATH = os.path.join(DATA_DIR, "vietnamese_dream_numbers_full.json")
+SO_MO_AUTOMATON_PATH = os.path.join(DATA_DIR, "so_mo_automaton.pkl")
+
+
+def _normalize_so_mo_text(text: str) -> str:
+    """
+    Canonical form shared by index keys and dream text: NFC-composed, lowercase.
+    Input may arrive decomposed (NFD, e.g. from macOS/iOS keyboards), which
+    would otherwise never match the precomposed keywords. Diacritics are kept:
+    they distinguish words in Vietnamese ("cá" fish vs "cà" eggplant).
+    """
+    return unicodedata.normalize("NFC", text).lower()
+
+
+def _expand_tam_hop(numbers: List[str]) -> str:
+    """
+    Bóng Số (Shadow Numbers) - Tam Hợp Expansion.
+    For a base number (00-39), also suggest +40 and +80 variants and format
+    them sorted numerically. Example: chó=11 -> "11 - 51 - 91"
+    """
+    all_numbers = set()
+    for num in numbers:
+        all_numbers.add(num)
+        try:
+            base = int(num)
+            # Add +40 variant (larger version)
+            shadow_40 = base + 40
+            if shadow_40 <= 99:
+                all_numbers.add(f"{shadow_40:02d}")
+            # Add +80 variant (elder/giant version) - wraps around if needed
+            shadow_80 = base + 80
+            if shadow_80 <= 99:
+                all_numbers.add(f"{shadow_80:02d}")
+            elif shadow_80 <= 139:  # Wrap: 100->00, 101->01, etc.
+                all_numbers.add(f"{shadow_80 - 100:02d}")
+        except ValueError:
+            pass
+
+    # Format with separator (sorted numerically)
+    return " - ".join(sorted(all_numbers, key=lambda x: int(x)))
+
+
+def build_so_mo_automaton() -> ahocorasick.Automaton:
+    """
+    Parse the JSON dream book and build the keyword automaton.
+
+    Values are (keyword length, -index order, keyword, Tam Hợp number string):
+    the longest keyword wins and ties keep the index order. The number string
+    is static, so it is formatted once here rather than per request.
+    """
+    with open(SO_MO_PATH, "rb") as f:
+        so_mo_raw: Dict[str, List[str]] = orjson.loads(f.read())  # {"00": ["trứng", "trứng vịt"], ...}
+
+    # Build reverse lookup index: keyword -> list of numbers
+    index: Dict[str, List[str]] = {}
+    for num, keywords in so_mo_raw.items():
+        for kw in keywords:
+            kw_clean = _normalize_so_mo_text(kw).strip()
+            if kw_clean not in index:
+                index[kw_clean] = []
+            if num not in index[kw_clean]:
+                index[kw_clean].append(num)
+
+    automaton = ahocorasick.Automaton()
+    for rank, (keyword, numbers) in enumerate(index.items()):
+        automaton.add_word(keyword, (len(keyword), -rank, keyword, _expand_tam_hop(numbers)))
+    if index:
+        automaton.make_automaton()
+
+    log_info("Built Sổ Mơ Dân Gian automaton: %d numbers, %d keywords indexed", len(so_mo_raw), len(index))
+    return automaton
+
+
+def _write_automaton(automaton: ahocorasick.Automaton, path: str) -> None:
+    # Write then rename, so a worker starting concurrently never reads a partial file
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    automaton.save(tmp_path, pickle.dumps)
+    os.replace(tmp_path, path)
+
+
+def save_so_mo_automaton(path: str = SO_MO_AUTOMATON_PATH) -> ahocorasick.Automaton:
+    """Build the automaton and write it to `path` for other processes to load."""
+    automaton = build_so_mo_automaton()
+    _write_automaton(automaton, path)
+    return automaton
+
+
+def load_so_mo_automaton() -> ahocorasick.Automaton:
+    """
+    Load the prebuilt automaton if it is at least as new as the JSON source,
+    otherwise build it in-process (and persist it for the next worker).
+    Returns an empty automaton if the dream book cannot be loaded.
+    """
+    try:
+        if os.path.getmtime(SO_MO_AUTOMATON_PATH) >= os.path.getmtime(SO_MO_PATH):
+            automaton = ahocorasick.load(SO_MO_AUTOMATON_PATH, pickle.loads)
+            log_info("Loaded prebuilt Sổ Mơ automaton: %d keywords", len(automaton))
+            return automaton
+    except OSError:
+        pass  # No (or unreadable) prebuilt file: build from JSON below
+    except Exception as e:
+        log_warning("Could not load prebuilt Sổ Mơ automaton, rebuilding: %s", e)
+
+    try:
+        automaton = build_so_mo_automaton()
+    except Exception as e:
+        log_warning("Could not load Sổ Mơ: %s", e)
+        return ahocorasick.Automaton()
+
+    try:
+        _write_automaton(automaton, SO_MO_AUTOMATON_PATH)
+    except Exception as e:
+        log_warning("Could not persist Sổ Mơ automaton: %s", e)
+    return automaton
+
+
+SO_MO_AUTOMATON = load_so_mo_automaton()
+
+
+def lookup_so_mo(user_dream: str) -> Tuple[Optional[str], Optional[str]]:
+    """
+    Smart scan of dream text for Vietnamese folk dream keywords.
+    Single Aho-Corasick pass; prioritizes longer (more specific) keywords.
+    Results are memoized on the normalized text (whitespace collapsed).
+
+    Returns (number_string, keyword) if found, else (None, None).
+    - number_string can be multiple numbers like "01 - 41" per Tam Hợp logic.
+    """
+    if len(SO_MO_AUTOMATON) == 0:
+        return None, None
+
+    return _lookup_normalized(" ".join(_normalize_so_mo_text(user_dream).split()))
+
+
+@functools.lru_cache(maxsize=4096)
+def _lookup_normalized(dream_lower: str) -> Tuple[Optional[str], Optional[str]]:
+    # Vietnamese doesn't use strict word boundaries, so any substring occurrence
+    # counts. Longest keyword wins: "cá trắng" (8 chars) beats "cá" (2 chars)
+    best = max((value for _, value in SO_MO_AUTOMATON.iter(dream_lower)), default=None)
+    if best is None:
+        return None, None
+
+    _, _, keyword, number_str = best
+
+    log_info("Sổ Mơ matched: '%s' -> %s (Tam Hợp expanded)", keyword, number_str)
+
+    return number_str, keyword